@@ -0,0 +1,120 @@
+"""
+Planificateur de génération des chapitres
+Lance la génération des chapitres en parallèle (avec une limite de concurrence)
+et les réassemble dans l'ordre de la table des matières.
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+DEFAULT_CHAPTER_CONCURRENCY = int(os.getenv("CHAPTER_GENERATION_CONCURRENCY", 4))
+
+
+def build_transition_contexts(
+    toc: List[Dict[str, Any]],
+    summaries: Optional[Dict[int, str]] = None
+) -> List[Dict[str, str]]:
+    """
+    Pre-compute the previous/next chapter hints for every TOC entry
+
+    The TOC (title, description) is enough, so every prompt can be built before
+    any chapter has been generated. When the summary of an already written
+    chapter is known (resume), it replaces the TOC description.
+
+    Args:
+        summaries: optional TOC index -> extractive summary of the written chapter
+
+    Returns:
+        list of {"transition_context": str, "next_chapter_hint": str}, one per TOC entry
+    """
+    contexts = []
+    previous_chapter_summary = ""
+
+    for idx, chapter in enumerate(toc):
+        # Contexte du chapitre précédent pour transitions
+        transition_context = ""
+        if idx > 0 and previous_chapter_summary:
+            transition_context = f"\n\nLIEN AVEC LE CHAPITRE PRÉCÉDENT :\n{previous_chapter_summary}\n→ Commence par une transition naturelle qui fait le pont entre ces idées."
+
+        # Contexte du chapitre suivant
+        next_chapter_hint = ""
+        if idx < len(toc) - 1:
+            next_chap = toc[idx + 1]
+            next_chapter_hint = f"\n\nPRÉPARATION POUR LA SUITE :\nLe prochain chapitre abordera : {next_chap['title']}\n→ Termine par une phrase qui crée le lien avec ce sujet."
+
+        contexts.append({
+            "transition_context": transition_context,
+            "next_chapter_hint": next_chapter_hint
+        })
+
+        # Résumé du chapitre pour le chapitre suivant
+        if chapter.get('type', 'chapter') == 'chapter':
+            summary = (summaries or {}).get(idx)
+            if summary:
+                previous_chapter_summary = f"Chapitre précédent '{chapter['title']}' : {summary}"
+            else:
+                previous_chapter_summary = f"Chapitre précédent '{chapter['title']}' : {chapter['description'][:100]}..."
+
+    return contexts
+
+
+class ChapterScheduler:
+    """Fan out chapter generation under a concurrency limit"""
+
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = max(1, concurrency or DEFAULT_CHAPTER_CONCURRENCY)
+
+    async def run(
+        self,
+        toc: List[Dict[str, Any]],
+        generate_chapter: Callable[[Dict[str, Any], Dict[str, str]], Awaitable[Dict[str, Any]]],
+        on_chapter: Optional[Callable[[int, Dict[str, Any]], Awaitable[None]]] = None,
+        indices: Optional[List[int]] = None,
+        fail_fast: bool = True,
+        summaries: Optional[Dict[int, str]] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Generate TOC entries concurrently
+
+        Args:
+            toc: table of contents entries
+            generate_chapter: coroutine (chapter, transition) -> chapter_data
+            on_chapter: optional coroutine (index, chapter_data) called as soon as a chapter is ready
+            indices: TOC indices to generate (all by default); transitions still use the whole TOC
+            fail_fast: cancel the remaining chapters on the first error, otherwise let
+                them finish (so they can be checkpointed) before raising
+            summaries: summaries of chapters already written, used for transitions
+
+        Returns:
+            dict of TOC index -> chapter_data, in TOC order
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        transitions = build_transition_contexts(toc, summaries)
+        if indices is None:
+            indices = list(range(len(toc)))
+
+        async def worker(idx: int) -> Dict[str, Any]:
+            async with semaphore:
+                chapter_data = await generate_chapter(toc[idx], transitions[idx])
+            if on_chapter:
+                await on_chapter(idx, chapter_data)
+            return chapter_data
+
+        tasks = [asyncio.create_task(worker(idx)) for idx in indices]
+        try:
+            if fail_fast:
+                results = await asyncio.gather(*tasks)
+            else:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                errors = [result for result in results if isinstance(result, BaseException)]
+                if errors:
+                    raise errors[0]
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return dict(zip(indices, results))
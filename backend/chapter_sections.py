@@ -0,0 +1,51 @@
+"""
+Découpage des chapitres en sections
+Un chapitre généré est une ouverture suivie de sections "🔹 Titre" : ce module
+le découpe en sections et le réassemble à l'identique, pour ne réécrire que
+certaines sections.
+"""
+
+import re
+from typing import Any, Dict, List
+
+
+SECTION_MARKER = "🔹"
+
+_SECTION_START_RE = re.compile(rf"^(?=[ \t]*{SECTION_MARKER})", re.MULTILINE)
+
+
+def split_sections(content: str) -> List[Dict[str, Any]]:
+    """
+    Split chapter content on its "🔹" headings
+
+    Returns:
+        list of {"index", "title", "text"}; the opening (text before the first
+        heading, title None) is index 0 when present. Joining the texts gives the
+        original content back.
+    """
+    sections = []
+    for text in _SECTION_START_RE.split(content or ""):
+        if not text:
+            continue
+        first_line = text.lstrip().split("\n", 1)[0]
+        title = first_line.replace(SECTION_MARKER, "", 1).strip() if first_line.startswith(SECTION_MARKER) else None
+        sections.append({"index": len(sections), "title": title, "text": text})
+    return sections
+
+
+def join_sections(sections: List[Dict[str, Any]]) -> str:
+    return "".join(section["text"] for section in sections)
+
+
+def replace_section_text(section: Dict[str, Any], new_text: str) -> str:
+    """
+    Fit a rewritten section in place of the original one
+
+    Keeps the original heading if the model dropped it, and the original trailing
+    whitespace so the following section stays separated the same way.
+    """
+    new_text = new_text.strip()
+    if section["title"] and not new_text.startswith(SECTION_MARKER):
+        new_text = f"{SECTION_MARKER} {section['title']}\n\n{new_text}"
+    trailing = section["text"][len(section["text"].rstrip()):]
+    return new_text + trailing
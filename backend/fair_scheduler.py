@@ -0,0 +1,132 @@
+"""
+Ordonnanceur équitable des appels aux fournisseurs
+Répartit les créneaux de concurrence entre utilisateurs (files par utilisateur,
+file équitable pondérée) et entre classes de priorité : les appels interactifs
+(TOC, régénération...) passent avant les générations de masse (contenu,
+illustrations) et disposent de créneaux réservés.
+"""
+
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+# Priorité par défaut des appels faits dans le contexte courant (les jobs passent en "bulk")
+current_priority: ContextVar[str] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+def parse_user_weights(spec: Optional[str]) -> Dict[str, float]:
+    """Parse "user_a=2,user_b=0.5" into per-user scheduling weights (1 for unlisted users)"""
+    weights = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        user_id, weight = item.split("=", 1)
+        weights[user_id.strip()] = max(0.01, float(weight))
+    return weights
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of provider slots across users and priority classes
+
+    Interactive waiters are always served before bulk ones, and `reserved` slots
+    are kept for interactive calls so they never wait behind long bulk calls.
+    Within a class, users are served by start-time fair queuing: each user gets a
+    share of the slots proportional to their weight, however many calls they queue.
+    """
+
+    def __init__(self, capacity: int, reserved: int = 0, user_weights: Optional[Dict[str, float]] = None):
+        self.capacity = max(1, capacity)
+        self.reserved = min(max(0, reserved), self.capacity - 1)
+        self.user_weights: Dict[str, float] = dict(user_weights or {})
+        self._in_use = {priority: 0 for priority in PRIORITIES}
+        self._queues: Dict[str, List[Tuple[float, int, asyncio.Future]]] = {priority: [] for priority in PRIORITIES}
+        self._virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        self._user_tags: Dict[str, Dict[str, float]] = {priority: {} for priority in PRIORITIES}
+        # Appels en file ou en cours par utilisateur : l'étiquette d'un utilisateur inactif est oubliée
+        self._user_calls: Dict[str, Dict[str, int]] = {priority: {} for priority in PRIORITIES}
+        self._sequence = itertools.count()
+
+    def _can_run(self, priority: str) -> bool:
+        in_use = sum(self._in_use.values())
+        if priority == PRIORITY_INTERACTIVE:
+            return in_use < self.capacity
+        return in_use < self.capacity - self.reserved
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._can_run(priority):
+                start_tag, _, waiter = heapq.heappop(queue)
+                if waiter.done():
+                    continue  # attente annulée
+                self._virtual_time[priority] = start_tag
+                self._in_use[priority] += 1
+                waiter.set_result(None)
+
+    async def acquire(self, user_id: Optional[str], priority: str = PRIORITY_INTERACTIVE):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        user_key = user_id or ""
+        weight = self.user_weights.get(user_key, 1.0)
+
+        # Étiquette de départ : l'utilisateur ne peut pas prendre d'avance sur le temps virtuel
+        tags = self._user_tags[priority]
+        start_tag = max(self._virtual_time[priority], tags.get(user_key, 0.0))
+        tags[user_key] = start_tag + 1.0 / weight
+        calls = self._user_calls[priority]
+        calls[user_key] = calls.get(user_key, 0) + 1
+
+        waiter = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._queues[priority], (start_tag, next(self._sequence), waiter))
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Créneau accordé au moment de l'annulation : le rendre
+                self.release(user_id, priority)
+            else:
+                self._end_call(user_key, priority)
+            raise
+
+    def release(self, user_id: Optional[str], priority: str):
+        self._in_use[priority] -= 1
+        self._end_call(user_id or "", priority)
+        self._dispatch()
+
+    def _end_call(self, user_key: str, priority: str):
+        calls = self._user_calls[priority]
+        calls[user_key] -= 1
+        if not calls[user_key]:
+            # Utilisateur sans appel en file ni en cours : son étiquette ne dépasse le
+            # temps virtuel que d'un appel au plus, l'oublier ne lui donne pas d'avance notable
+            del calls[user_key]
+            self._user_tags[priority].pop(user_key, None)
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str], priority: str = PRIORITY_INTERACTIVE):
+        await self.acquire(user_id, priority)
+        try:
+            yield
+        finally:
+            self.release(user_id, priority)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "reserved_interactive": self.reserved,
+            "in_use": dict(self._in_use),
+            "queued": {
+                priority: sum(1 for _, _, waiter in queue if not waiter.done())
+                for priority, queue in self._queues.items()
+            }
+        }
@@ -0,0 +1,248 @@
+"""
+Images des livres
+Les images (couverture, illustrations) ne sont stockées que dans GridFS ; les
+documents des livres ne gardent que leur identifiant. Le client les charge par
+une URL signée (HMAC de l'identifiant, de l'utilisateur et d'une expiration),
+utilisable directement dans une balise <img> qui ne peut pas envoyer l'en-tête
+Authorization.
+Un fichier GridFS ne change jamais : il est servi avec un ETag fort et mis en
+cache par le navigateur jusqu'à l'expiration de son URL, et ses miniatures
+(?w=320) sont calculées une seule fois puis conservées dans GridFS.
+"""
+
+import asyncio
+import base64
+import copy
+import hashlib
+import hmac
+import io
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+
+IMAGE_URL_SECRET = os.getenv("IMAGE_URL_SECRET") or os.getenv("JWT_SECRET_KEY")
+if not IMAGE_URL_SECRET:
+    # Sans secret, n'importe qui pourrait calculer la signature d'une image
+    raise RuntimeError("IMAGE_URL_SECRET (or JWT_SECRET_KEY) must be set to sign image URLs")
+
+# Durée de validité des URLs, arrondie à la fenêtre supérieure : une même image
+# garde la même URL (et son cache navigateur) pendant toute une fenêtre
+IMAGE_URL_TTL_SECONDS = int(os.getenv("IMAGE_URL_TTL_SECONDS", 7 * 24 * 3600))
+IMAGE_URL_WINDOW_SECONDS = int(os.getenv("IMAGE_URL_WINDOW_SECONDS", 24 * 3600))
+
+# Largeurs de miniatures servies : une liste fermée borne le nombre de dérivés stockés
+THUMBNAIL_WIDTHS = tuple(int(width) for width in os.getenv("THUMBNAIL_WIDTHS", "160,320,640,1024").split(","))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 2))
+
+
+# Redimensionnement (CPU) hors de la boucle d'événements
+_thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+_pending_thumbnails: Dict[Tuple[str, int], asyncio.Future] = {}
+
+
+def image_url_expiry(now: Optional[float] = None) -> int:
+    """Expiry timestamp of the URLs signed now, rounded up to IMAGE_URL_WINDOW_SECONDS"""
+    expires = (now if now is not None else time.time()) + IMAGE_URL_TTL_SECONDS
+    return math.ceil(expires / IMAGE_URL_WINDOW_SECONDS) * IMAGE_URL_WINDOW_SECONDS
+
+
+def sign_image_id(image_id: str, user_id: str, expires: int) -> str:
+    payload = f"{image_id}|{user_id}|{expires}"
+    digest = hmac.new(IMAGE_URL_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return digest[:32]
+
+
+def verify_image_signature(
+    image_id: str,
+    user_id: Optional[str],
+    expires: Optional[int],
+    signature: Optional[str],
+    now: Optional[float] = None
+) -> bool:
+    """True for an unexpired URL signed by image_url (malformed signatures are rejected, never raised)"""
+    if not user_id or not expires or not signature or not re.fullmatch(r"[0-9a-f]{32}", signature):
+        return False
+    if expires < (now if now is not None else time.time()):
+        return False
+    return hmac.compare_digest(sign_image_id(image_id, user_id, expires), signature)
+
+
+def image_cache_control(expires: int, now: Optional[float] = None) -> str:
+    """Browser cache of an image: the file never changes, but its URL stops working at `expires`"""
+    max_age = max(0, int(expires - (now if now is not None else time.time())))
+    return f"private, max-age={max_age}, immutable"
+
+
+def image_url(image_id: Optional[str], user_id: str) -> Optional[str]:
+    """URL of a GridFS image signed for one user, relative to the API root"""
+    if not image_id:
+        return None
+    expires = image_url_expiry()
+    return f"/api/images/{image_id}?u={user_id}&exp={expires}&sig={sign_image_id(image_id, user_id, expires)}"
+
+
+def image_etag(image_id: str, width: Optional[int] = None) -> str:
+    """Strong ETag of a stored image or of one of its thumbnails"""
+    return f'"{image_id}-w{width}"' if width else f'"{image_id}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Les validateurs faibles (W/"...") sont acceptés pour If-None-Match
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def parse_range(range_header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive byte range of a single-range "bytes=" header
+
+    Returns None when there is no usable Range header (the whole file is sent);
+    raises ValueError when the range cannot be satisfied.
+    """
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header or "")
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffixe : les N derniers octets
+        start, end = max(0, length - int(last)), length - 1
+    else:
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+    if start >= length or start > end:
+        raise ValueError(f"Range not satisfiable for {length} bytes")
+    return start, end
+
+
+async def iter_file(stream, start: int = 0, end: Optional[int] = None):
+    """Yield the GridFS chunks of an open file between two byte offsets (inclusive)"""
+    end = stream.length - 1 if end is None else end
+    remaining = end - start + 1
+    if start:
+        stream.seek(start)
+    while remaining > 0:
+        chunk = await stream.readchunk()
+        if not chunk:
+            break
+        chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _resize(data: bytes, width: int) -> Tuple[bytes, str]:
+    """Resize an image to a maximum width, keeping its format: (bytes, content type)"""
+    with Image.open(io.BytesIO(data)) as image:
+        image_format = image.format or "PNG"
+        image.thumbnail((width, width * 10), Image.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        options = {"quality": 85} if image_format in ("JPEG", "WEBP") else {}
+        output = io.BytesIO()
+        image.save(output, format=image_format, optimize=True, **options)
+    return output.getvalue(), Image.MIME.get(image_format, "image/png")
+
+
+async def thumbnail_id(repository, image_id: str, width: int) -> Optional[str]:
+    """
+    GridFS id of the `width` thumbnail of an image, computed on first request
+
+    Concurrent first requests in this process share the same computation.
+
+    Returns:
+        the thumbnail id, or None if the original image does not exist
+    """
+    existing = await repository.find_file({"metadata.thumbnail_of": image_id, "metadata.width": width})
+    if existing:
+        return str(existing["_id"])
+
+    key = (image_id, width)
+    pending = _pending_thumbnails.get(key)
+    if pending:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_event_loop().create_future()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _pending_thumbnails[key] = future
+    try:
+        original = await repository.get_file(image_id)
+        if original is None:
+            thumbnail = None
+        else:
+            data, content_type = await asyncio.get_event_loop().run_in_executor(
+                _thumbnail_executor, _resize, original["data"], width
+            )
+            stored_id = await repository.put_file(
+                data,
+                filename=f"{original['filename']}.w{width}",
+                content_type=content_type,
+                metadata={
+                    "ebook_id": original["metadata"].get("ebook_id"),
+                    "thumbnail_of": image_id,
+                    "width": width
+                }
+            )
+            thumbnail = str(stored_id)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(thumbnail)
+        return thumbnail
+    finally:
+        _pending_thumbnails.pop(key, None)
+
+
+def with_image_urls(document: Optional[Dict[str, Any]], user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Copy of an ebook, illustration result or chapter illustration plan with the
+    URL signed for user_id of each stored image added (cover.cover_image_url,
+    images[].image_url)
+    """
+    if not isinstance(document, dict):
+        return document
+    document = copy.deepcopy(document)
+    cover = document.get("cover")
+    if isinstance(cover, dict) and cover.get("cover_image_id"):
+        cover["cover_image_url"] = image_url(cover["cover_image_id"], user_id)
+    chapters = document.get("illustrations") if isinstance(document.get("illustrations"), list) else [document]
+    for chapter_illust in chapters:
+        for image in (chapter_illust or {}).get("images") or []:
+            if isinstance(image, dict) and image.get("image_id"):
+                image["image_url"] = image_url(image["image_id"], user_id)
+    return document
+
+
+async def hydrate_images(ebook: Dict[str, Any], repository) -> Dict[str, Any]:
+    """
+    Copy of an ebook with the image bytes loaded back as base64 for the exporter
+
+    Images that can no longer be read are left out, as if they were never generated.
+    """
+    ebook = copy.deepcopy(ebook)
+
+    async def load(image_id: Optional[str]) -> Optional[str]:
+        if not image_id:
+            return None
+        stored = await repository.get_file(image_id)
+        return base64.b64encode(stored["data"]).decode("utf-8") if stored else None
+
+    cover = ebook.get("cover")
+    if isinstance(cover, dict) and not cover.get("cover_image_base64"):
+        cover["cover_image_base64"] = await load(cover.get("cover_image_id"))
+    for chapter_illust in ebook.get("illustrations") or []:
+        for image in chapter_illust.get("images") or []:
+            if not image.get("image_base64"):
+                image["image_base64"] = await load(image.get("image_id"))
+    return ebook
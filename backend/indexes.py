@@ -0,0 +1,166 @@
+"""
+Index MongoDB
+Création idempotente au démarrage des index dont dépendent les requêtes de
+l'application (dont les index TTL qui purgent sessions, cache et baux expirés),
+et rapport d'utilisation des index pour vérifier les plans de requête :
+
+    python indexes.py ensure
+    python indexes.py report
+"""
+
+import asyncio
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+from repository import Repository
+
+
+# (collection, clés, options) ; le nom explicite rend la création idempotente
+INDEXES = [
+    ("users", [("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+    ("users", [("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+    ("user_sessions", [("session_token", ASCENDING)], {"name": "session_token_unique", "unique": True}),
+    # Les sessions sont supprimées par le serveur dès leur date d'expiration
+    ("user_sessions", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    # Ordre exact de la liste paginée (created_at puis _id) : pas de tri en mémoire
+    ("ebooks", [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "user_id_created_at_id"}),
+    ("fs.files", [("metadata.ebook_id", ASCENDING)], {"name": "metadata_ebook_id"}),
+    ("fs.files", [("metadata.thumbnail_of", ASCENDING), ("metadata.width", ASCENDING)], {"name": "metadata_thumbnail_of_width"}),
+    ("jobs", [("user_id", ASCENDING), ("created_at", DESCENDING)], {"name": "user_id_created_at"}),
+    ("jobs", [("status", ASCENDING), ("updated_at", ASCENDING)], {"name": "status_updated_at"}),
+    ("jobs", [("status", ASCENDING), ("heartbeat_at", ASCENDING)], {"name": "status_heartbeat_at"}),
+    ("llm_cache", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    ("locks", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0})
+]
+
+# Index remplacés par un index plus complet dont ils sont le préfixe
+OBSOLETE_INDEXES = [
+    ("ebooks", "user_id_created_at")
+]
+
+EBOOK_LIST_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+# Requêtes représentatives dont le plan est vérifié par le rapport
+REPORT_QUERIES = [
+    ("users", {"email": "someone@example.com"}, None),
+    ("users", {"username": "someone"}, None),
+    ("user_sessions", {"session_token": "token"}, None),
+    # Première page et page suivante de GET /api/ebooks/list
+    ("ebooks", {"user_id": "user_0"}, EBOOK_LIST_SORT),
+    ("ebooks", {"user_id": "user_0", "$or": [
+        {"created_at": {"$lt": "2024-01-01T00:00:00"}},
+        {"created_at": "2024-01-01T00:00:00", "_id": {"$lt": "ebook_0"}}
+    ]}, EBOOK_LIST_SORT),
+    ("fs.files", {"metadata.ebook_id": "ebook_0"}, None),
+    ("fs.files", {"metadata.thumbnail_of": "0", "metadata.width": 320}, None),
+    ("jobs", {"status": {"$in": ["queued", "running"]}, "updated_at": {"$lt": "0"}}, None),
+    ("jobs", {"status": {"$in": ["queued", "running"]}, "heartbeat_at": {"$lt": "0"}}, None)
+]
+
+
+async def ensure_indexes(db) -> List[Dict[str, Any]]:
+    """
+    Create the INDEXES that do not exist yet and drop the OBSOLETE_INDEXES
+
+    A failing index (duplicate values already stored under a unique key, options
+    conflicting with an existing index...) is reported and skipped so that the
+    application still starts; so is an unreachable server, after the first
+    failed attempt.
+
+    Returns:
+        list of {"collection", "name", "status": created|dropped|failed, "error"?}
+    """
+    results = []
+    for collection, keys, options in INDEXES:
+        result = {"collection": collection, "name": options["name"]}
+        try:
+            await db[collection].create_index(keys, **options)
+            result["status"] = "created"
+        except ConnectionFailure as e:
+            # Serveur injoignable : inutile d'attendre le même délai pour chaque index
+            print(f"Could not reach MongoDB to create indexes: {e}")
+            results.append({**result, "status": "failed", "error": str(e)})
+            return results
+        except PyMongoError as e:
+            print(f"Could not create index {collection}.{options['name']}: {e}")
+            result.update(status="failed", error=str(e))
+        results.append(result)
+    for collection, name in OBSOLETE_INDEXES:
+        result = {"collection": collection, "name": name}
+        try:
+            await db[collection].drop_index(name)
+            result["status"] = "dropped"
+        except PyMongoError as e:
+            if getattr(e, "code", None) == 27:  # IndexNotFound : déjà supprimé
+                continue
+            print(f"Could not drop index {collection}.{name}: {e}")
+            result.update(status="failed", error=str(e))
+        results.append(result)
+    return results
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Stages of a winning plan, outermost first (FETCH, IXSCAN, COLLSCAN...)"""
+    stages = []
+    while plan:
+        name = plan.get("stage")
+        if plan.get("indexName"):
+            name = f"{name}({plan['indexName']})"
+        stages.append(name)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+async def index_report(db) -> Dict[str, Any]:
+    """Usage counters of every index and winning plans of REPORT_QUERIES"""
+    usage = {}
+    for collection in sorted({collection for collection, _, _ in INDEXES}):
+        stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(length=None)
+        usage[collection] = {
+            stat["name"]: {"ops": stat["accesses"]["ops"], "since": stat["accesses"]["since"].isoformat()}
+            for stat in stats
+        }
+
+    plans = []
+    for collection, query, sort in REPORT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        plans.append({
+            "collection": collection,
+            "query": query,
+            "sort": sort,
+            "plan": stages,
+            "uses_index": not any(stage.startswith("COLLSCAN") for stage in stages),
+            "in_memory_sort": any(stage.startswith("SORT") for stage in stages)
+        })
+
+    return {"usage": usage, "plans": plans}
+
+
+async def _main(command: str):
+    load_dotenv()
+    repository = Repository(os.getenv("MONGO_URL"))
+    try:
+        if command == "ensure":
+            output = await ensure_indexes(repository.db)
+        else:
+            output = await index_report(repository.db)
+        print(json.dumps(output, indent=2, ensure_ascii=False, default=str))
+    finally:
+        repository.close()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command not in ("ensure", "report"):
+        sys.exit("Usage: python indexes.py [ensure|report]")
+    asyncio.run(_main(command))
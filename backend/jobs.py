@@ -0,0 +1,289 @@
+"""
+Moteur de tâches en arrière-plan
+Exécute les générations longues hors de la requête HTTP, suit leur
+progression dans la collection MongoDB `jobs` et permet de les annuler.
+Chaque worker renouvelle le battement de cœur (heartbeat_at) de ses tâches ;
+une tâche dont le battement a expiré (worker arrêté ou redémarré) est marquée
+en échec par le balayage périodique de n'importe quel worker.
+"""
+
+import asyncio
+import os
+import socket
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fair_scheduler import PRIORITY_BULK, current_priority
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_STALE_MINUTES = int(os.getenv("JOB_STALE_MINUTES", 30))
+JOB_CANCEL_POLL_SECONDS = float(os.getenv("JOB_CANCEL_POLL_SECONDS", 2.0))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+JOB_HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("JOB_HEARTBEAT_TIMEOUT_SECONDS", 120))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobContext:
+    """Handle given to a job runner to report its progress"""
+
+    def __init__(self, manager: "JobManager", job_id: str):
+        self.manager = manager
+        self.job_id = job_id
+
+    async def _update(self, fields: Dict[str, Any]):
+        fields["updated_at"] = _now()
+        await self.manager.collection.update_one({"_id": self.job_id}, {"$set": fields})
+
+    async def set_steps(self, steps: List[str]):
+        """Declare the steps of the job (all pending)"""
+        await self._update({
+            "progress.total": len(steps),
+            "progress.completed": 0,
+            "progress.steps": {name: {"status": "pending"} for name in steps}
+        })
+
+    async def start_step(self, name: str):
+        await self._update({
+            f"progress.steps.{name}.status": "running",
+            f"progress.steps.{name}.started_at": _now()
+        })
+
+    async def complete_step(self, name: str, partial: Any = None):
+        """Mark a step as done and optionally expose its partial result"""
+        fields = {
+            f"progress.steps.{name}.status": "completed",
+            f"progress.steps.{name}.completed_at": _now()
+        }
+        if partial is not None:
+            fields[f"partial_results.{name}"] = partial
+        fields["updated_at"] = _now()
+        await self.manager.collection.update_one(
+            {"_id": self.job_id},
+            {"$set": fields, "$inc": {"progress.completed": 1}}
+        )
+
+    async def fail_step(self, name: str, error: str):
+        await self._update({
+            f"progress.steps.{name}.status": "failed",
+            f"progress.steps.{name}.error": error
+        })
+
+    async def skip_step(self, name: str, reason: str, status: str = "skipped"):
+        """Mark a step that will not run (skipped on request, blocked by a failed dependency...)"""
+        await self._update({
+            f"progress.steps.{name}.status": status,
+            f"progress.steps.{name}.reason": reason
+        })
+
+
+class JobManager:
+    """In-process job engine backed by a MongoDB collection"""
+
+    def __init__(self, collection, workers: int = JOB_WORKERS):
+        self.collection = collection
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._workers = asyncio.Semaphore(workers)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._maintenance: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start renewing this worker's jobs and sweeping the interrupted ones"""
+        if not self._maintenance:
+            self._maintenance = asyncio.create_task(self._maintain())
+
+    def stop(self):
+        if self._maintenance:
+            self._maintenance.cancel()
+            self._maintenance = None
+
+    async def _maintain(self):
+        while True:
+            try:
+                await self._heartbeat()
+                await self.recover()
+            except Exception as e:
+                print(f"Job maintenance failed: {e}")
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+
+    async def _heartbeat(self):
+        """Renew the heartbeat of the jobs queued or running in this process"""
+        if self._tasks:
+            await self.collection.update_many(
+                {"_id": {"$in": list(self._tasks)}, "owner": self.owner},
+                {"$set": {"heartbeat_at": _now()}}
+            )
+
+    async def submit(
+        self,
+        kind: str,
+        user_id: str,
+        runner: Callable[[JobContext], Awaitable[Any]],
+        ebook_id: Optional[str] = None
+    ) -> str:
+        """
+        Register a job and schedule it on the event loop
+
+        Args:
+            kind: job type (generate_content, generate_illustrations, ...)
+            user_id: owner of the job
+            runner: coroutine (job context) -> JSON-serialisable result
+            ebook_id: ebook the job works on, if any
+
+        Returns:
+            str: job id
+        """
+        job_id = f"job_{uuid.uuid4().hex}"
+        await self.collection.insert_one({
+            "_id": job_id,
+            "kind": kind,
+            "user_id": user_id,
+            "ebook_id": ebook_id,
+            "status": "queued",
+            "owner": self.owner,
+            "heartbeat_at": _now(),
+            "progress": {"total": 0, "completed": 0, "steps": {}},
+            "partial_results": {},
+            "result": None,
+            "error": None,
+            "created_at": _now(),
+            "updated_at": _now()
+        })
+
+        task = asyncio.create_task(self._execute(job_id, runner))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return job_id
+
+    async def _execute(self, job_id: str, runner: Callable[[JobContext], Awaitable[Any]]):
+        # Les appels LLM d'un job passent après les requêtes interactives
+        current_priority.set(PRIORITY_BULK)
+        try:
+            async with self._workers:
+                if await self._cancel_requested(job_id):
+                    raise asyncio.CancelledError()
+                await self.collection.update_one(
+                    {"_id": job_id},
+                    {"$set": {"status": "running", "started_at": _now(), "updated_at": _now()}}
+                )
+                watcher = asyncio.create_task(self._watch_cancel(job_id, asyncio.current_task()))
+                try:
+                    result = await runner(JobContext(self, job_id))
+                finally:
+                    watcher.cancel()
+                await self.collection.update_one(
+                    {"_id": job_id},
+                    {"$set": {
+                        "status": "completed",
+                        "result": result,
+                        "completed_at": _now(),
+                        "updated_at": _now()
+                    }}
+                )
+        except asyncio.CancelledError:
+            if not await self._cancel_requested(job_id):
+                # Arrêt du serveur : son battement expire et recover() la marque en échec
+                raise
+            print(f"Job {job_id} cancelled")
+            await self._mark_cancelled(job_id)
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            traceback.print_exc()
+            detail = getattr(e, "detail", None) or str(e)
+            await self.collection.update_one(
+                {"_id": job_id},
+                {"$set": {
+                    "status": "failed",
+                    "error": detail,
+                    "completed_at": _now(),
+                    "updated_at": _now()
+                }}
+            )
+
+    async def _cancel_requested(self, job_id: str) -> bool:
+        return bool(await self.collection.find_one({"_id": job_id, "cancel_requested": True}, {"_id": 1}))
+
+    async def _watch_cancel(self, job_id: str, task: asyncio.Task):
+        """Cancel the job task when another worker flags the job as cancelled"""
+        while True:
+            await asyncio.sleep(JOB_CANCEL_POLL_SECONDS)
+            if await self._cancel_requested(job_id):
+                task.cancel()
+                return
+
+    async def _mark_cancelled(self, job_id: str):
+        """Close a cancelled job, keeping the list of steps that did complete"""
+        job = await self.collection.find_one({"_id": job_id}, {"progress": 1})
+        steps = (job or {}).get("progress", {}).get("steps", {})
+        fields = {
+            f"progress.steps.{name}.status": "cancelled"
+            for name, step in steps.items()
+            if step.get("status") in ("pending", "running")
+        }
+        fields.update({
+            "status": "cancelled",
+            "result": {
+                "cancelled": True,
+                "completed_steps": [name for name, step in steps.items() if step.get("status") == "completed"]
+            },
+            "completed_at": _now(),
+            "updated_at": _now()
+        })
+        await self.collection.update_one({"_id": job_id}, {"$set": fields})
+
+    async def cancel(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Request the cancellation of a queued or running job
+
+        The job task is cancelled right away when it runs in this process (its
+        pending provider calls are abandoned and their concurrency slots released),
+        otherwise by its own worker within JOB_CANCEL_POLL_SECONDS.
+
+        Returns:
+            the job document, or None if the user has no such job
+        """
+        job = await self.collection.find_one({"_id": job_id, "user_id": user_id})
+        if not job:
+            return None
+        if job["status"] in ("queued", "running"):
+            await self.collection.update_one(
+                {"_id": job_id},
+                {"$set": {"cancel_requested": True, "updated_at": _now()}}
+            )
+            task = self._tasks.get(job_id)
+            if task:
+                task.cancel()
+        return await self.collection.find_one({"_id": job_id})
+
+    async def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": job_id, "user_id": user_id})
+
+    async def recover(self):
+        """Flag jobs left queued/running by a dead process (expired heartbeat) as interrupted"""
+        now = datetime.now(timezone.utc)
+        expired_before = (now - timedelta(seconds=JOB_HEARTBEAT_TIMEOUT_SECONDS)).isoformat()
+        stale_before = (now - timedelta(minutes=JOB_STALE_MINUTES)).isoformat()
+        result = await self.collection.update_many(
+            {
+                "status": {"$in": ["queued", "running"]},
+                "_id": {"$nin": list(self._tasks)},
+                "$or": [
+                    {"heartbeat_at": {"$lt": expired_before}},
+                    # Tâches enregistrées avant l'introduction du battement de cœur
+                    {"heartbeat_at": {"$exists": False}, "updated_at": {"$lt": stale_before}}
+                ]
+            },
+            {"$set": {
+                "status": "failed",
+                "error": "Interrupted by server restart",
+                "completed_at": _now(),
+                "updated_at": _now()
+            }}
+        )
+        if result.modified_count:
+            print(f"Flagged {result.modified_count} interrupted job(s) as failed")
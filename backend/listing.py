@@ -0,0 +1,30 @@
+"""
+Pagination de la liste des livres
+Curseur opaque (base64 de [created_at, _id]) du dernier livre d'une page : la
+page suivante reprend strictement après lui dans l'ordre (created_at, _id)
+décroissant, sans saut ni doublon quand des livres sont créés entre deux pages.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, Optional, Tuple
+
+
+def encode_list_cursor(ebook: Dict[str, Any]) -> str:
+    key = json.dumps([ebook.get("created_at"), ebook["_id"]])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_list_cursor(cursor: str) -> Tuple[Optional[str], str]:
+    """(created_at, _id) of a cursor made by encode_list_cursor; ValueError if it was not"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != 2:
+        raise ValueError("Invalid cursor")
+    created_at, ebook_id = key
+    if not isinstance(ebook_id, str) or not isinstance(created_at, (str, type(None))):
+        raise ValueError("Invalid cursor")
+    return created_at, ebook_id
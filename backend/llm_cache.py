@@ -0,0 +1,99 @@
+"""
+Cache des réponses LLM
+Les complétions sont indexées par hash(modèle, message système, prompt) :
+un LRU en mémoire borné en taille, adossé à une collection MongoDB partagée
+entre les workers et persistante entre les redémarrages.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512))
+
+
+class LlmResponseCache:
+    """Content-addressed cache of LLM completions"""
+
+    def __init__(
+        self,
+        collection,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES
+    ):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def make_key(model: str, system_message: str, prompt: str) -> str:
+        payload = "\x1f".join([model, system_message, prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached completion, or None on a miss"""
+        entry = self._entries.get(key)
+        if entry:
+            expires_at, response = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return response
+            del self._entries[key]
+
+        doc = await self.collection.find_one({"_id": key})
+        if doc and doc["expires_at"].replace(tzinfo=timezone.utc) > datetime.now(timezone.utc):
+            self._remember(key, doc["response"], doc["expires_at"].replace(tzinfo=timezone.utc).timestamp())
+            self.mongo_hits += 1
+            return doc["response"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, model: str, response: str):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        self._remember(key, response, expires_at.timestamp())
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {
+                "model": model,
+                "response": response,
+                "created_at": datetime.now(timezone.utc),
+                "expires_at": expires_at
+            }},
+            upsert=True
+        )
+
+    def record_bypass(self):
+        self.bypassed += 1
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.mongo_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds
+        }
@@ -0,0 +1,553 @@
+"""
+Passerelle LLM centralisée
+Point d'entrée unique vers les fournisseurs de texte et d'images : connexions
+HTTP mutualisées, partage équitable de la concurrence entre utilisateurs et
+priorités, reprises avec backoff exponentiel sur 429/5xx, délais par tentative
+et échéance globale par appel, requêtes de secours (hedging) contre la traîne de
+latence et configuration des modèles en un seul endroit.
+"""
+
+import asyncio
+import math
+import os
+import random
+import re
+import time
+import uuid
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+import litellm
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+from emergentintegrations.llm.openai.image_generation import OpenAIImageGeneration
+
+from fair_scheduler import PRIORITY_INTERACTIVE, FairScheduler, current_priority, parse_user_weights
+from llm_cache import LlmResponseCache
+from prompts import template_for_prompt
+
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+IMAGE_MODEL = os.getenv("IMAGE_MODEL", "gpt-image-1")
+# URL du proxy par lequel passe LlmChat pour les clés Emergent. Sans elle, une clé
+# Emergent ne peut pas streamer : stream() sert alors une complétion entière.
+LLM_API_BASE = os.getenv("LLM_API_BASE")
+# "false" désactive le streaming token par token (stream() sert une complétion entière)
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+LLM_STREAM_CHUNK_TIMEOUT_SECONDS = float(os.getenv("LLM_STREAM_CHUNK_TIMEOUT_SECONDS", 60))
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+# Plafonds par utilisateur et par classe : les travaux de masse d'un utilisateur
+# (génération du contenu) ne bloquent pas ses propres appels interactifs
+LLM_MAX_CONCURRENCY_PER_USER = int(os.getenv("LLM_MAX_CONCURRENCY_PER_USER", 4))
+LLM_MAX_INTERACTIVE_PER_USER = int(os.getenv("LLM_MAX_INTERACTIVE_PER_USER", 2))
+IMAGE_MAX_CONCURRENCY = int(os.getenv("IMAGE_MAX_CONCURRENCY", 4))
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", 4))
+IMAGE_INTERACTIVE_RESERVED = int(os.getenv("IMAGE_INTERACTIVE_RESERVED", 1))
+# Poids d'ordonnancement par utilisateur ("user_a=2,user_b=0.5"), 1 par défaut
+LLM_USER_WEIGHTS = parse_user_weights(os.getenv("LLM_USER_WEIGHTS"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 180))
+IMAGE_TIMEOUT_SECONDS = float(os.getenv("IMAGE_TIMEOUT_SECONDS", 300))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 1.0))
+LLM_CALL_DEADLINE_SECONDS = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", 420))
+IMAGE_CALL_DEADLINE_SECONDS = float(os.getenv("IMAGE_CALL_DEADLINE_SECONDS", 600))
+
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() == "true"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", 0.9))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_BUDGET_RATIO = float(os.getenv("LLM_HEDGE_BUDGET_RATIO", 0.2))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", 200))
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, provider 5xx, timeouts and connection errors are worth retrying"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    message = str(error).lower()
+    if re.search(r"\b(429|500|502|503|504)\b", message):
+        return True
+    return any(hint in message for hint in ("rate limit", "timeout", "timed out", "overloaded", "temporarily unavailable"))
+
+
+class LatencyTracker:
+    """Recent provider latencies per prompt class (chapter, toc, ...)"""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, prompt_class: str, seconds: float):
+        self._samples.setdefault(prompt_class, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, prompt_class: str, q: float = LLM_HEDGE_QUANTILE) -> Optional[float]:
+        """Observed latency quantile, None until LLM_HEDGE_MIN_SAMPLES calls were seen"""
+        samples = self._samples.get(prompt_class)
+        if not samples or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            prompt_class: {
+                "samples": len(samples),
+                "p50": round(sorted(samples)[len(samples) // 2], 2),
+                "hedge_after": self.quantile(prompt_class)
+            }
+            for prompt_class, samples in self._samples.items()
+        }
+
+
+class PromptCacheStats:
+    """Prompt tokens served from the provider's prefix cache, per prompt template"""
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, int]] = {}
+
+    def record(self, kwargs: Dict[str, Any], completion_response: Any, start_time: Any = None, end_time: Any = None):
+        """litellm success callback: read the usage block of every completion"""
+        try:
+            usage = getattr(completion_response, "usage", None)
+            if not usage:
+                return
+            details = getattr(usage, "prompt_tokens_details", None)
+            # OpenAI : prompt_tokens_details.cached_tokens ; Anthropic : cache_read_input_tokens
+            cached = getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", None) or 0
+
+            messages = {message.get("role"): message.get("content") for message in kwargs.get("messages") or []}
+            system_message, prompt = messages.get("system"), messages.get("user")
+            template = template_for_prompt(
+                system_message if isinstance(system_message, str) else None,
+                prompt if isinstance(prompt, str) else None
+            )
+
+            entry = self._templates.setdefault(template, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            entry["cached_tokens"] += cached
+        except Exception as e:
+            print(f"Could not record prompt cache usage: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        templates = {
+            name: {**entry, "cached_ratio": round(entry["cached_tokens"] / entry["prompt_tokens"], 4) if entry["prompt_tokens"] else 0.0}
+            for name, entry in self._templates.items()
+        }
+        prompt_tokens = sum(entry["prompt_tokens"] for entry in self._templates.values())
+        cached_tokens = sum(entry["cached_tokens"] for entry in self._templates.values())
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_ratio": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+            "templates": templates
+        }
+
+
+class HedgeBudget:
+    """Number of duplicate requests one book generation may fire"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+
+    @classmethod
+    def for_calls(cls, calls: int, ratio: float = LLM_HEDGE_BUDGET_RATIO) -> "HedgeBudget":
+        return cls(max(1, math.ceil(calls * ratio)) if LLM_HEDGING else 0)
+
+    def try_spend(self) -> bool:
+        if self.used >= self.limit:
+            return False
+        self.used += 1
+        return True
+
+
+class LlmGateway:
+    """Single way out to the LLM and image providers"""
+
+    def __init__(self, api_key: str, cache: Optional[LlmResponseCache] = None):
+        self.api_key = api_key
+        self.cache = cache
+        # Une clé Emergent n'est valable que sur son proxy : sans LLM_API_BASE, litellm
+        # l'enverrait au fournisseur public, le streaming est donc désactivé
+        self.streaming = LLM_STREAMING
+        if self.streaming and not LLM_API_BASE and (api_key or "").startswith("sk-emergent-"):
+            self.streaming = False
+            print("Token streaming disabled: set LLM_API_BASE to the Emergent proxy URL to enable it")
+        self.provider = LLM_PROVIDER
+        self.model = LLM_MODEL
+        self.image_model = IMAGE_MODEL
+        self.text_scheduler = FairScheduler(LLM_MAX_CONCURRENCY, LLM_INTERACTIVE_RESERVED, LLM_USER_WEIGHTS)
+        self.image_scheduler = FairScheduler(IMAGE_MAX_CONCURRENCY, IMAGE_INTERACTIVE_RESERVED, LLM_USER_WEIGHTS)
+        # (utilisateur, priorité) -> sémaphore ; celui d'un utilisateur inactif est retiré
+        self._user_slots: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self._user_slot_calls: Dict[Tuple[str, str], int] = {}
+        self._output_limit_warned = False
+        self.latency = LatencyTracker()
+        self._image_gen = OpenAIImageGeneration(api_key=api_key)
+
+        # Connexions HTTP réutilisées par litellm (utilisé par LlmChat et le streaming)
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY * 2, max_keepalive_connections=LLM_MAX_CONCURRENCY),
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0)
+        )
+        litellm.aclient_session = self.http_client
+
+        # Relevé des jetons servis par le cache de préfixe du fournisseur
+        self.prompt_cache = PromptCacheStats()
+        litellm.success_callback.append(self.prompt_cache.record)
+
+    async def close(self):
+        await self.http_client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "text": self.text_scheduler.stats(),
+            "image": self.image_scheduler.stats(),
+            "latency": self.latency.stats()
+        }
+
+    @asynccontextmanager
+    async def _slot(
+        self,
+        user_id: Optional[str],
+        scheduler: Optional[FairScheduler] = None,
+        priority: Optional[str] = None,
+        capped: bool = True
+    ):
+        """
+        Hold one of the user's slots for the priority class, then a fairly
+        scheduled provider slot
+
+        Args:
+            priority: "interactive" or "bulk"; defaults to the priority of the
+                current context (bulk inside background jobs)
+            capped: False for hedge requests, which must not wait behind the
+                user's own slow call for a per-user slot
+        """
+        priority = priority or current_priority.get()
+        user_slots = None
+        user_key = (user_id, priority)
+        if user_id and capped:
+            limit = LLM_MAX_INTERACTIVE_PER_USER if priority == PRIORITY_INTERACTIVE else LLM_MAX_CONCURRENCY_PER_USER
+            user_slots = self._user_slots.setdefault(user_key, asyncio.Semaphore(limit))
+            self._user_slot_calls[user_key] = self._user_slot_calls.get(user_key, 0) + 1
+            try:
+                await user_slots.acquire()
+            except BaseException:
+                self._end_user_call(user_key)
+                raise
+        try:
+            async with (scheduler or self.text_scheduler).slot(user_id, priority):
+                yield
+        finally:
+            if user_slots:
+                user_slots.release()
+                self._end_user_call(user_key)
+
+    def _end_user_call(self, user_key: Tuple[str, str]):
+        self._user_slot_calls[user_key] -= 1
+        if not self._user_slot_calls[user_key]:
+            del self._user_slot_calls[user_key]
+            del self._user_slots[user_key]
+
+    async def _with_retries(
+        self,
+        label: str,
+        call: Callable[[], Any],
+        timeout: float,
+        deadline: Optional[float] = None,
+        slot: Optional[Callable[[], Any]] = None,
+        hold: Optional[AsyncExitStack] = None,
+        retry_timeouts: bool = True
+    ) -> Any:
+        """
+        Run call() under a per-attempt timeout, backing off exponentially on retryable errors
+
+        Args:
+            deadline: time.monotonic() after which no attempt is started or continued,
+                whatever retries are left
+            slot: context manager factory (see _slot) held during each attempt only,
+                so that callers waiting to retry do not keep provider slots
+            hold: when given, the slot of the successful attempt is handed over to
+                this stack instead of being released (e.g. while a stream is read)
+            retry_timeouts: False when a timed-out attempt cannot actually be stopped
+                (synchronous client in a thread): retrying would run it twice
+        """
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            attempt_timeout = timeout
+            if deadline is not None:
+                attempt_timeout = min(timeout, deadline - time.monotonic())
+                if attempt_timeout <= 0:
+                    raise asyncio.TimeoutError(f"{label} missed its deadline")
+            async with AsyncExitStack() as attempt_stack:
+                if slot:
+                    await attempt_stack.enter_async_context(slot())
+                try:
+                    result = await asyncio.wait_for(call(), timeout=attempt_timeout)
+                except Exception as e:
+                    retryable = is_retryable(e) and (retry_timeouts or not isinstance(e, asyncio.TimeoutError))
+                    if attempt >= LLM_MAX_RETRIES or not retryable:
+                        raise
+                    error = e
+                else:
+                    if hold is not None:
+                        hold.push_async_exit(attempt_stack.pop_all())
+                    return result
+            # Le créneau est rendu avant l'attente : pendant une rafale de 429, les
+            # appels qui patientent ne bloquent pas ceux qui peuvent partir
+            delay = LLM_RETRY_BASE_DELAY * (2 ** attempt) * (1 + random.random())
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise error
+            print(f"{label} failed ({error}), retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _hedged(
+        self,
+        attempt: Callable[..., Awaitable[Any]],
+        prompt_class: str,
+        hedge: Optional[HedgeBudget]
+    ) -> Any:
+        """
+        Run attempt(), firing a duplicate if it is slower than the class's usual p90
+
+        The first successful result wins and the other request is cancelled. A
+        duplicate is only fired while the hedge budget lasts.
+        """
+        started = asyncio.Event()
+        primary = asyncio.create_task(attempt(started=started))
+        tasks = [primary]
+        try:
+            hedge_after = self.latency.quantile(prompt_class) if hedge and hedge.limit else None
+            if hedge_after is None:
+                return await primary
+
+            # Le délai court à partir de l'obtention du créneau, pas de l'attente en file
+            slot_taken = asyncio.create_task(started.wait())
+            tasks.append(slot_taken)
+            await asyncio.wait({primary, slot_taken}, return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+            if done or not hedge.try_spend():
+                return await primary
+
+            print(f"Hedging {prompt_class} call after {hedge_after:.1f}s ({hedge.used}/{hedge.limit})")
+            backup = asyncio.create_task(attempt(capped=False))
+            tasks.append(backup)
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.exception():
+                        return task.result()
+            return primary.result()  # les deux ont échoué : erreur de la requête d'origine
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def complete(
+        self,
+        prompt: str,
+        system_message: str,
+        session_prefix: str = "llm",
+        user_id: Optional[str] = None,
+        use_cache: bool = True,
+        validate: Optional[Callable[[str], Any]] = None,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        priority: Optional[str] = None,
+        prompt_class: Optional[str] = None,
+        hedge: Optional[HedgeBudget] = None,
+        deadline: float = LLM_CALL_DEADLINE_SECONDS,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Send a prompt to the LLM, reusing a cached completion for identical requests
+
+        Args:
+            use_cache: False for actions that explicitly want a new draft (the fresh
+                completion still replaces the cached one)
+            validate: optional check (e.g. parse_llm_json); completions it rejects are
+                not cached, so a retry after a parse error asks the model again
+            timeout: deadline of each attempt, in seconds
+            priority: "interactive" or "bulk" (see _slot)
+            prompt_class: latency class of the prompt (session_prefix up to the first "_" by default)
+            hedge: budget of the book being generated; when given, a call slower than the
+                class's observed p90 is duplicated and the fastest answer kept
+            deadline: overall limit in seconds, retries and queueing included
+            max_tokens: output limit of the completion (see token_budget)
+        """
+        prompt_class = prompt_class or session_prefix.split("_", 1)[0]
+        call_deadline = time.monotonic() + deadline
+        cache_key = LlmResponseCache.make_key(self.model, system_message, prompt)
+        if self.cache:
+            if use_cache:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            else:
+                self.cache.record_bypass()
+
+        async def call():
+            chat = LlmChat(
+                api_key=self.api_key,
+                session_id=f"{session_prefix}_{uuid.uuid4().hex}",
+                system_message=system_message
+            ).with_model(self.provider, self.model)
+            if max_tokens:
+                chat = self._limit_output(chat, max_tokens)
+            return await chat.send_message(UserMessage(text=prompt))
+
+        async def attempt(started: Optional[asyncio.Event] = None, capped: bool = True):
+            async def timed_call():
+                # Appelé une fois le créneau obtenu, à chaque tentative
+                if started:
+                    started.set()
+                begin = time.monotonic()
+                response = await call()
+                self.latency.record(prompt_class, time.monotonic() - begin)
+                return response
+
+            return await self._with_retries(
+                session_prefix, timed_call, timeout, call_deadline,
+                slot=lambda: self._slot(user_id, priority=priority, capped=capped)
+            )
+
+        response = await asyncio.wait_for(
+            self._hedged(attempt, prompt_class, hedge),
+            timeout=max(0.0, call_deadline - time.monotonic())
+        )
+
+        if self.cache:
+            try:
+                if validate:
+                    validate(response)
+                await self.cache.set(cache_key, self.model, response)
+            except Exception as e:
+                print(f"Invalid LLM response not cached: {e}")
+        return response
+
+    def _limit_output(self, chat: LlmChat, max_tokens: int) -> LlmChat:
+        """Apply an output limit with whichever setter this emergentintegrations version has"""
+        if hasattr(chat, "with_max_tokens"):
+            return chat.with_max_tokens(max_tokens)
+        if hasattr(chat, "with_params"):
+            # Paramètres transmis tels quels à litellm
+            return chat.with_params(max_tokens=max_tokens)
+        if not self._output_limit_warned:
+            self._output_limit_warned = True
+            print("LlmChat cannot set max_tokens: completions are not capped (upgrade emergentintegrations)")
+        return chat
+
+    async def stream(
+        self,
+        prompt: str,
+        system_message: str,
+        session_prefix: str = "llm",
+        user_id: Optional[str] = None,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        priority: Optional[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield the completion of a prompt token by token
+
+        Uses litellm streaming (LLM_API_BASE overrides the endpoint). If streaming is
+        disabled or the provider cannot stream, falls back to a regular completion
+        yielded as a single chunk. A stream silent for LLM_STREAM_CHUNK_TIMEOUT_SECONDS
+        is abandoned.
+        """
+        streamed = False
+        if not self.streaming:
+            yield await self.complete(
+                prompt, system_message, session_prefix, user_id, use_cache=False, timeout=timeout, priority=priority,
+                max_tokens=max_tokens
+            )
+            return
+
+        # Le créneau de la tentative réussie reste tenu pendant la lecture du flux
+        async with AsyncExitStack() as held:
+            try:
+                response = await self._with_retries(
+                    session_prefix,
+                    lambda: litellm.acompletion(
+                        model=self.model,
+                        custom_llm_provider=self.provider,
+                        api_key=self.api_key,
+                        api_base=LLM_API_BASE,
+                        messages=[
+                            {"role": "system", "content": system_message},
+                            {"role": "user", "content": prompt}
+                        ],
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        max_tokens=max_tokens
+                    ),
+                    timeout,
+                    slot=lambda: self._slot(user_id, priority=priority),
+                    hold=held
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        # Délai par morceau : un flux bloqué en cours de route n'est pas attendu indéfiniment
+                        chunk = await asyncio.wait_for(chunks.__anext__(), LLM_STREAM_CHUNK_TIMEOUT_SECONDS)
+                    except StopAsyncIteration:
+                        break
+                    token = chunk.choices[0].delta.content if chunk.choices else None
+                    if token:
+                        streamed = True
+                        yield token
+                return
+            except Exception as e:
+                if streamed:
+                    raise
+                print(f"Token streaming unavailable, falling back to a full completion: {e}")
+
+        yield await self.complete(
+            prompt, system_message, session_prefix, user_id, use_cache=False, timeout=timeout, priority=priority,
+            max_tokens=max_tokens
+        )
+
+    async def generate_image(
+        self,
+        prompt: str,
+        user_id: Optional[str] = None,
+        timeout: float = IMAGE_TIMEOUT_SECONDS,
+        priority: Optional[str] = None,
+        deadline: float = IMAGE_CALL_DEADLINE_SECONDS
+    ) -> Optional[bytes]:
+        """Generate one image and return its bytes (None if the provider returned nothing)"""
+        is_async = asyncio.iscoroutinefunction(self._image_gen.generate_images)
+
+        async def call():
+            if is_async:
+                return await self._image_gen.generate_images(
+                    prompt=prompt,
+                    model=self.image_model,
+                    number_of_images=1
+                )
+            # Client synchrone : exécuté dans un thread pour ne pas bloquer la boucle
+            return await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: self._image_gen.generate_images(
+                    prompt=prompt,
+                    model=self.image_model,
+                    number_of_images=1
+                )
+            )
+
+        call_deadline = time.monotonic() + deadline
+        # Un thread expiré continue de tourner (et de générer une image payante) :
+        # pas de nouvelle tentative après un délai dépassé avec le client synchrone
+        images = await self._with_retries(
+            "image", call, timeout, call_deadline,
+            slot=lambda: self._slot(user_id, self.image_scheduler, priority),
+            retry_timeouts=is_async
+        )
+        return images[0] if images else None
@@ -0,0 +1,123 @@
+"""
+Migration : retire les images base64 des documents des livres
+Chaque image déjà présente dans GridFS (image_id) perd sa copie base64 ; une
+image sans copie dans GridFS y est d'abord enregistrée. À relancer sans risque :
+
+    python migrate_images.py [--dry-run]
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from PIL import Image
+
+from repository import Repository
+
+
+def _image_type(data: bytes) -> Tuple[str, str]:
+    """(content type, file extension) of image bytes, PNG when the format is not recognised"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format = image.format or "PNG"
+    except Exception:
+        image_format = "PNG"
+    return Image.MIME.get(image_format, "image/png"), image_format.lower().replace("jpeg", "jpg")
+
+
+async def _store_base64(
+    repository: Repository,
+    ebook_id: str,
+    image: Dict[str, Any],
+    field: str,
+    dry_run: bool,
+    **metadata
+) -> Tuple[Optional[str], bool]:
+    """
+    GridFS id of an inline image, uploading it when the referenced file is missing
+
+    Returns:
+        (image id, whether it is (or on a dry run would be) uploaded); the id is None on a dry run upload
+    """
+    image_id = image.get(field.replace("base64", "id"))
+    if image_id and ObjectId.is_valid(image_id) and await repository.find_file({"_id": ObjectId(image_id)}):
+        return image_id, False
+    if dry_run:
+        return None, True
+    data = base64.b64decode(image[field])
+    content_type, extension = _image_type(data)
+    stored_id = await repository.put_file(
+        data,
+        filename=f"ebook_{ebook_id}_migrated_{datetime.now(timezone.utc).timestamp()}.{extension}",
+        content_type=content_type,
+        metadata={"ebook_id": ebook_id, "source": "base64_migration", **metadata}
+    )
+    return str(stored_id), True
+
+
+async def migrate(repository: Repository, dry_run: bool = False) -> Dict[str, int]:
+    # Sur un essai à blanc, les images à envoyer dans GridFS sont comptées à part
+    uploads = "would_upload" if dry_run else "uploaded"
+    counts = {"ebooks": 0, "images": 0, uploads: 0}
+    query = {"$or": [
+        {"cover.cover_image_base64": {"$exists": True}},
+        {"illustrations.images.image_base64": {"$exists": True}}
+    ]}
+    async for ebook in repository.ebooks.find(query, {"cover": 1, "illustrations": 1}):
+        ebook_id = ebook["_id"]
+        update: Dict[str, Any] = {"$set": {}, "$unset": {}}
+
+        cover = ebook.get("cover") or {}
+        if cover.get("cover_image_base64"):
+            image_id, uploaded = await _store_base64(repository, ebook_id, cover, "cover_image_base64", dry_run, type="cover")
+            counts[uploads] += uploaded
+            counts["images"] += 1
+            update["$set"]["cover.cover_image_id"] = image_id
+            update["$unset"]["cover.cover_image_base64"] = ""
+        elif "cover_image_base64" in cover:
+            update["$unset"]["cover.cover_image_base64"] = ""
+
+        illustrations = ebook.get("illustrations") or []
+        changed = False
+        for chapter_illust in illustrations:
+            for image in chapter_illust.get("images") or []:
+                if "image_base64" not in image:
+                    continue
+                changed = True
+                if image["image_base64"]:
+                    image_id, uploaded = await _store_base64(
+                        repository, ebook_id, image, "image_base64", dry_run,
+                        chapter_number=chapter_illust.get("chapter_number")
+                    )
+                    counts[uploads] += uploaded
+                    counts["images"] += 1
+                    image["image_id"] = image_id
+                del image["image_base64"]
+        if changed:
+            update["$set"]["illustrations"] = illustrations
+
+        counts["ebooks"] += 1
+        if not dry_run:
+            await repository.ebooks.update_one({"_id": ebook_id}, {key: value for key, value in update.items() if value})
+    return counts
+
+
+async def _main(dry_run: bool):
+    load_dotenv()
+    repository = Repository(os.getenv("MONGO_URL"))
+    try:
+        counts = await migrate(repository, dry_run)
+        print(json.dumps({"dry_run": dry_run, **counts}, indent=2))
+    finally:
+        repository.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main("--dry-run" in sys.argv[1:]))
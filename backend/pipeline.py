@@ -0,0 +1,113 @@
+"""
+Pipeline de production d'un livre
+Exécute les étapes de génération comme un graphe de dépendances : chaque étape
+démarre dès que celles dont elle dépend sont terminées, les étapes
+indépendantes tournant en parallèle.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+
+class PipelineNode:
+    """One step of the pipeline and the steps it waits for"""
+
+    def __init__(self, name: str, run: Callable[[], Awaitable[Any]], deps: Iterable[str] = ()):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+
+
+class DagScheduler:
+    """Run pipeline nodes with as much parallelism as their dependencies allow"""
+
+    def __init__(self, nodes: List[PipelineNode]):
+        self.nodes = {node.name: node for node in nodes}
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        """Check the graph (known dependencies, no cycle) and return its nodes in dependency order"""
+        for node in self.nodes.values():
+            for dep in node.deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"Pipeline node '{node.name}' depends on unknown node '{dep}'")
+
+        order = []
+        remaining = {name: set(node.deps) for name, node in self.nodes.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Pipeline has a dependency cycle between: {', '.join(sorted(remaining))}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    async def run(
+        self,
+        skip: Iterable[str] = (),
+        on_status: Optional[Callable[[str, str, Any], Awaitable[None]]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Execute the graph
+
+        A skipped node counts as satisfied for the nodes depending on it (its output
+        is expected to already be on the ebook). A node whose dependency failed is
+        not run and is reported as "blocked"; the other branches carry on.
+
+        Args:
+            skip: names of the nodes not to run
+            on_status: optional coroutine (name, status, detail) awaited on every
+                transition; detail is the node result, its error or the skip reason
+
+        Returns:
+            dict of node name -> {"status": completed|failed|skipped|blocked, ...}
+        """
+        skip = set(skip)
+        statuses: Dict[str, Dict[str, Any]] = {}
+
+        async def report(name: str, status: str, detail: Any = None):
+            if status != "running":
+                statuses[name] = {"status": status}
+                if status == "failed":
+                    statuses[name]["error"] = detail
+                elif status in ("skipped", "blocked"):
+                    statuses[name]["reason"] = detail
+            if on_status:
+                await on_status(name, status, detail)
+
+        async def execute(node: PipelineNode) -> str:
+            dep_statuses = {dep: await tasks[dep] for dep in node.deps}
+            unmet = [dep for dep, status in dep_statuses.items() if status in ("failed", "blocked")]
+
+            if node.name in skip:
+                await report(node.name, "skipped", "Skipped on request")
+            elif unmet:
+                await report(node.name, "blocked", f"Dependency not satisfied: {', '.join(unmet)}")
+            else:
+                await report(node.name, "running")
+                try:
+                    result = await node.run()
+                except Exception as e:
+                    print(f"Pipeline node {node.name} failed: {e}")
+                    await report(node.name, "failed", getattr(e, "detail", None) or str(e))
+                else:
+                    await report(node.name, "completed", result)
+            return statuses[node.name]["status"]
+
+        # Toutes les tâches sont créées avant de s'attendre mutuellement
+        tasks: Dict[str, asyncio.Task] = {}
+        for name in self.order:
+            tasks[name] = asyncio.create_task(execute(self.nodes[name]))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        return {name: statuses[name] for name in self.order}
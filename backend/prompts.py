@@ -0,0 +1,349 @@
+"""
+Registre des prompts de génération
+Chaque prompt est construit en deux parties : un préfixe stable (message système
+commun, contexte et plan du livre puis consignes du modèle de prompt), identique octet
+pour octet d'un appel à l'autre sur un même livre, suivi de la partie propre à
+l'appel (chapitre, extrait...). Les fournisseurs peuvent ainsi réutiliser leur
+cache de préfixe entre les chapitres d'un livre.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from token_budget import context_share, trim_field, trim_to_tokens
+
+
+# Message système partagé par tous les prompts liés à un livre : le préfixe
+# commun couvre aussi le contexte du livre d'un modèle à l'autre
+BOOK_SYSTEM_MESSAGE = "Tu es un auteur et éditeur professionnel qui accompagne la création d'un livre de qualité, en français."
+
+BOOK_CONTEXT = """CONTEXTE DU LIVRE :
+- Titre : "{title}"
+- Auteur : {author}
+- Ton : {tone}
+- Public cible : {audience}
+- Objectif global : {description}{toc}"""
+
+
+class PromptTemplate:
+    """A prompt split into a per-book stable prefix and a per-call suffix"""
+
+    def __init__(self, name: str, instructions: str, task: str):
+        """
+        Args:
+            instructions: static guidelines, may only use book fields ({tone}, {audience}...)
+            task: per-call part, formatted with the fields given to render()
+        """
+        self.name = name
+        self.instructions = instructions
+        self.task = task
+
+    def prefix(self, ebook: Dict[str, Any]) -> str:
+        fields = book_fields(ebook)
+        return f"{BOOK_CONTEXT.format(**fields)}\n\n{self.instructions.format(**fields)}"
+
+    def render(self, ebook: Dict[str, Any], **fields) -> Tuple[str, str]:
+        """Return (system_message, prompt)"""
+        task = self.task.format(**book_fields(ebook), **fields)
+        return BOOK_SYSTEM_MESSAGE, f"{self.prefix(ebook)}\n\n{task}"
+
+
+def book_fields(ebook: Dict[str, Any]) -> Dict[str, str]:
+    # La description est ramenée à son budget : le préfixe reste stable d'un appel à l'autre
+    return {
+        "title": ebook['title'],
+        "author": ebook['author'],
+        "tone": ebook['tone'],
+        "audience": ', '.join(ebook['target_audience']),
+        "description": trim_field("description", ebook['description']),
+        "toc": toc_context(ebook.get('toc') or [])
+    }
+
+
+def toc_context(toc: List[Dict[str, Any]]) -> str:
+    """Plan of the book for the stable prefix ("" when no TOC is saved yet)"""
+    if not toc:
+        return ""
+    # Le plan complet rend le préfixe commun assez long pour le cache des fournisseurs
+    # (1024 jetons minimum chez OpenAI) et situe chaque chapitre dans l'ensemble du livre
+    share = context_share("toc", len(toc))
+    entries = "\n".join(
+        f"  {entry.get('number', idx + 1)}. {entry.get('title', '')} : "
+        + trim_to_tokens(
+            trim_field('chapter_description', entry.get('description', ''))
+            + (f" (sections : {' ; '.join(entry['subtitles'])})" if entry.get('subtitles') else ""),
+            share
+        )
+        for idx, entry in enumerate(toc)
+    )
+    return f"\n- Plan du livre :\n{entries}"
+
+
+PROMPTS: Dict[str, PromptTemplate] = {}
+
+
+def register(template: PromptTemplate) -> PromptTemplate:
+    PROMPTS[template.name] = template
+    return template
+
+
+def render_prompt(name: str, ebook: Dict[str, Any], **fields) -> Tuple[str, str]:
+    """Render a registered template: (system_message, prompt)"""
+    return PROMPTS[name].render(ebook, **fields)
+
+
+def template_for_prompt(system_message: Optional[str], prompt: Optional[str]) -> str:
+    """Name of the template a rendered prompt comes from ("other" if none)"""
+    if system_message == BOOK_SYSTEM_MESSAGE and prompt:
+        for name, template in PROMPTS.items():
+            # La première ligne de la partie variable identifie le modèle
+            if f"\n\n{template.task.split(chr(10), 1)[0]}\n" in prompt:
+                return name
+    return "other"
+
+
+# Chapitres
+
+register(PromptTemplate(
+    "chapter_introduction",
+    instructions="""RÔLE : Auteur professionnel spécialisé en introductions captivantes.
+
+MISSION : Rédige une INTRODUCTION percutante (900-1200 mots) structurée ainsi :
+
+1. **OUVERTURE CAPTIVANTE** (2-3 paragraphes)
+   - Une anecdote personnelle, histoire marquante ou statistique surprenante
+   - Questions qui interpellent directement le lecteur
+   - Établis une connexion émotionnelle immédiate
+
+2. **LE POURQUOI** (2-3 paragraphes)
+   - Présente le problème ou besoin auquel répond ce livre
+   - Explique pourquoi c'est important MAINTENANT
+   - Crée l'urgence et la pertinence
+
+3. **LA PROMESSE** (2-3 paragraphes)
+   - Énonce clairement les bénéfices concrets pour le lecteur
+   - Liste 3-4 choses spécifiques qu'il va apprendre ou accomplir
+   - Témoigne de la transformation possible
+
+4. **LA FEUILLE DE ROUTE** (1-2 paragraphes)
+   - Donne un aperçu du parcours à venir (sans détailler chaque chapitre)
+   - Crée l'anticipation et l'excitation pour la lecture
+   - Termine sur une note motivante qui donne envie de tourner la page
+
+EXIGENCES STRICTES :
+- Style : {tone}, adapté à {audience}
+- ⚠️ INTERDIT : N'utilise JAMAIS les symboles #, ##, ### ou autres balises Markdown
+- ⚠️ INTERDIT : Ne répète JAMAIS le mot "Introduction" dans le texte
+- Structure : Utilise UNIQUEMENT le format "🔹 Titre de section" si nécessaire pour des sous-parties
+- Ton : Engageant, personnel, et orienté vers l'action
+- Langage : 100% en français""",
+    task="""INTRODUCTION À RÉDIGER :
+Titre : {chapter_title}
+Objectif : {chapter_description}{transition_context}{next_chapter_hint}
+
+Réponds UNIQUEMENT avec le texte de l'introduction (le titre "Introduction" sera ajouté automatiquement)."""
+))
+
+register(PromptTemplate(
+    "chapter_conclusion",
+    instructions="""RÔLE : Auteur professionnel spécialisé en conclusions mémorables et inspirantes.
+
+MISSION : Rédige une CONCLUSION puissante (900-1200 mots) structurée ainsi :
+
+1. **LE VOYAGE ACCOMPLI** (2-3 paragraphes)
+   - Rappelle le point de départ (où était le lecteur au début)
+   - Célèbre le chemin parcouru
+   - Reconnais l'effort et l'engagement du lecteur
+
+2. **LES ENSEIGNEMENTS CLÉS** (2-3 paragraphes)
+   - Synthèse des 4-5 points principaux du livre
+   - Reformule les messages essentiels de manière mémorable
+   - Utilise des formulations impactantes qui restent en tête
+
+3. **LE PASSAGE À L'ACTION** (2-3 paragraphes)
+   - Liste 3-4 actions concrètes que le lecteur peut entreprendre DÈS MAINTENANT
+   - Donne des étapes spécifiques et réalisables
+   - Crée un sentiment d'urgence positive et d'enthousiasme
+
+4. **LA VISION INSPIRANTE** (2 paragraphes)
+   - Peins le tableau de la transformation possible
+   - Projette le lecteur dans son futur réussi
+   - Termine sur une note émotionnelle forte et motivante
+   - Une phrase finale mémorable qui résume l'essence du livre
+
+EXIGENCES STRICTES :
+- Style : {tone}, adapté à {audience}
+- ⚠️ INTERDIT : N'utilise JAMAIS les symboles #, ##, ### ou autres balises Markdown
+- ⚠️ INTERDIT : Ne répète JAMAIS le mot "Conclusion" dans le texte
+- Structure : Utilise UNIQUEMENT le format "🔹 Titre de section" si nécessaire pour des sous-parties
+- Ton : Inspirant, optimiste, et orienté vers l'action
+- Impact : Crée une fin mémorable qui donne au lecteur l'envie de recommencer sa lecture
+- Langage : 100% en français""",
+    task="""CONCLUSION À RÉDIGER :
+Titre : {chapter_title}
+Objectif : {chapter_description}{transition_context}{next_chapter_hint}
+
+Réponds UNIQUEMENT avec le texte de la conclusion (le titre "Conclusion" sera ajouté automatiquement)."""
+))
+
+register(PromptTemplate(
+    "chapter",
+    instructions="""RÔLE : Auteur professionnel expert en pédagogie et storytelling.
+
+MISSION : Rédige le chapitre indiqué plus bas, COMPLET et ENGAGEANT (1200-1800 mots), structuré ainsi :
+
+1. **OUVERTURE** (2-3 paragraphes)
+   - Accroche puissante avec question, anecdote ou fait surprenant
+   - Annonce claire de ce qui sera couvert dans ce chapitre
+
+2. **DÉVELOPPEMENT EN SECTIONS** (corps principal)
+   Organise le contenu en 2-4 sections claires avec :
+   - Pour chaque section : un titre descriptif précédé de "🔹" (exemple: "🔹 La première étape vers le changement")
+   - Explications claires et approfondies
+   - 2-3 exemples concrets et pertinents par section
+   - Anecdotes illustratives adaptées au ton {tone}
+   - Étapes pratiques ou conseils actionnables
+   - Analogies ou métaphores pour clarifier les concepts complexes
+
+3. **EN SYNTHÈSE** (section finale OBLIGATOIRE - 1 paragraphe)
+   Titre de section : "🔹 En synthèse"
+   - Résumé concis des 3-4 points clés du chapitre
+   - Le principal enseignement à retenir
+   - Lien subtil avec le chapitre suivant
+
+4. **RÉFLEXION PERSONNELLE** (section finale OBLIGATOIRE)
+   Titre de section : "🔹 Question de réflexion"
+   - 1-2 questions ouvertes qui invitent le lecteur à appliquer ce qu'il a appris
+   - Formulation engageante et personnalisée
+
+EXIGENCES STRICTES :
+- Style : {tone}
+- Public : {audience}
+- Structuration : Utilise UNIQUEMENT le format "🔹 Titre de section" pour les sous-parties
+- ⚠️ INTERDIT : N'utilise JAMAIS les symboles #, ##, ### ou autres balises Markdown
+- ⚠️ INTERDIT : Ne répète JAMAIS le titre principal du chapitre dans le contenu
+- Exemples : Minimum 2-3 exemples concrets et situés
+- Longueur : Dense et riche, environ 1200-1800 mots
+- Langage : 100% en français""",
+    task="""CHAPITRE À RÉDIGER :
+Numéro : {chapter_number}
+Titre : {chapter_title}
+Objectif : {chapter_description}{transition_context}{next_chapter_hint}
+
+Réponds UNIQUEMENT avec le contenu du chapitre (sans le titre principal, il sera ajouté automatiquement)."""
+))
+
+register(PromptTemplate(
+    "chapter_regenerate",
+    instructions="""RÔLE : Auteur professionnel expert en pédagogie et storytelling.
+
+MISSION : Réécris le chapitre indiqué plus bas, COMPLET et ENGAGEANT (1200-1800 mots), structuré ainsi :
+
+1. **OUVERTURE** (2-3 paragraphes)
+   - Accroche puissante
+   - Annonce claire du contenu
+
+2. **DÉVELOPPEMENT EN SECTIONS** (corps principal)
+   - 2-4 sections claires avec titre "🔹 Titre"
+   - Explications approfondies
+   - 2-3 exemples concrets par section
+   - Anecdotes illustratives
+
+3. **EN SYNTHÈSE** (section finale OBLIGATOIRE)
+   "🔹 En synthèse"
+   - Résumé des 3-4 points clés
+   - Principal enseignement
+
+4. **RÉFLEXION PERSONNELLE** (section finale OBLIGATOIRE)
+   "🔹 Question de réflexion"
+   - 1-2 questions ouvertes
+
+EXIGENCES STRICTES :
+- Style : {tone}
+- ⚠️ INTERDIT : N'utilise JAMAIS #, ##, ###
+- ⚠️ INTERDIT : Ne répète JAMAIS le titre du chapitre
+- Format : "🔹 Titre" pour sous-sections
+- Langage : 100% français""",
+    task="""CHAPITRE À RÉGÉNÉRER :
+Numéro : {chapter_number}
+Titre : {chapter_title}
+Objectif : {chapter_description}{neighbours_context}
+
+Réponds UNIQUEMENT avec le contenu."""
+))
+
+# Illustrations
+
+ILLUSTRATION_GUIDELINES = """1. **Reflètent visuellement** le contenu et l'émotion du chapitre
+2. **Sont artistiques** et esthétiquement agréables (style photo réaliste, illustration digitale, art conceptuel)
+3. **Conviennent à un ebook** (pas de texte dans l'image, composition équilibrée)
+4. **Restent appropriées** au ton {tone} et au public cible
+
+Pour chaque prompt, fournis aussi une description ALT en français pour l'accessibilité."""
+
+ILLUSTRATION_IMAGE_SCHEMA = """{{
+      "dalle_prompt": "Detailed English prompt for DALL-E (ex: A serene landscape showing meditation in nature, soft lighting, peaceful atmosphere, digital art style)",
+      "alt_text": "Description accessible en français (ex: Paysage serein montrant une personne en méditation dans la nature)",
+      "placement": "Suggestion de placement (ex: Au début du chapitre, Après la section principale)"
+    }}"""
+
+ILLUSTRATION_CONSTRAINTS = """- Maximum 2 images par chapitre (DALL-E est coûteux)
+- Prompts en ANGLAIS, détaillés et descriptifs (50-100 mots)
+- Alt text en FRANÇAIS, accessible
+- PAS de texte/mots dans les images générées
+- Mentionner le style artistique souhaité (photo, illustration, art digital, etc.)"""
+
+register(PromptTemplate(
+    "illustration_plan_chapter",
+    instructions=f"""RÔLE : Expert en génération de prompts pour DALL-E (génération d'images IA).
+
+MISSION : Génère 1-2 prompts DALL-E en ANGLAIS pour illustrer le chapitre indiqué plus bas, avec des illustrations qui :
+{ILLUSTRATION_GUIDELINES}
+
+Format de réponse (JSON strict) :
+{{{{
+  "chapter_number": <numéro du chapitre>,
+  "images": [
+    {ILLUSTRATION_IMAGE_SCHEMA}
+  ]
+}}}}
+
+CONTRAINTES CRITIQUES :
+{ILLUSTRATION_CONSTRAINTS}
+- Style cohérent avec le thème du livre""",
+    task="""CHAPITRE À ILLUSTRER :
+- Numéro : {chapter_number}
+- Titre : {chapter_title}
+- Description : {chapter_description}
+- Extrait : {excerpt}...
+
+Réponds UNIQUEMENT avec le JSON."""
+))
+
+register(PromptTemplate(
+    "illustration_plan_book",
+    instructions=f"""RÔLE : Expert en génération de prompts pour DALL-E (génération d'images IA).
+
+MISSION : Pour CHAQUE chapitre listé plus bas, génère 1-2 prompts DALL-E en ANGLAIS pour créer des illustrations qui :
+{ILLUSTRATION_GUIDELINES}
+
+Format de réponse (JSON strict) :
+{{{{
+  "chapters": [
+    {{{{
+      "chapter_number": 1,
+      "images": [
+        {ILLUSTRATION_IMAGE_SCHEMA}
+      ]
+    }}}}
+  ]
+}}}}
+
+CONTRAINTES CRITIQUES :
+- Une entrée par chapitre, avec son numéro exact
+{ILLUSTRATION_CONSTRAINTS}
+- Style cohérent entre les chapitres et avec le thème du livre""",
+    task="""CHAPITRES À ILLUSTRER :
+{chapters_context}
+
+Réponds UNIQUEMENT avec le JSON."""
+))
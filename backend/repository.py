@@ -0,0 +1,81 @@
+"""
+Accès aux données MongoDB
+Pilote asynchrone (motor) : les requêtes et les transferts GridFS sont attendus
+sur la boucle d'événements au lieu de la bloquer, si bien qu'une écriture
+d'image de plusieurs Mo ne retarde plus les autres requêtes.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "yoocreat")
+
+
+def file_content_type(stream) -> Optional[str]:
+    # Fichiers écrits par gridfs.GridFS : contentType au premier niveau
+    return (stream.metadata or {}).get("content_type") or getattr(stream, "content_type", None)
+
+
+class Repository:
+    """Async collections and GridFS bucket of the application database"""
+
+    def __init__(self, mongo_url: str, db_name: str = MONGO_DB_NAME):
+        # tz_aware : les dates relues (expiration des sessions...) sont comparables à datetime.now(timezone.utc)
+        self.client = AsyncIOMotorClient(mongo_url, maxPoolSize=MONGO_MAX_POOL_SIZE, tz_aware=True)
+        self.db = self.client[db_name]
+        self.users = self.db.users
+        self.ebooks = self.db.ebooks
+        self.user_sessions = self.db.user_sessions
+        self.jobs = self.db.jobs
+        self.llm_cache = self.db.llm_cache
+        self.locks = self.db.locks
+        # Même bucket "fs" que l'ancien gridfs.GridFS : les fichiers existants restent lisibles
+        self.files = AsyncIOMotorGridFSBucket(self.db)
+
+    async def put_file(
+        self,
+        data: bytes,
+        filename: str,
+        content_type: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> ObjectId:
+        """Store a file in GridFS and return its id"""
+        return await self.files.upload_from_stream(
+            filename,
+            data,
+            metadata={"content_type": content_type, **(metadata or {})}
+        )
+
+    async def open_file(self, file_id: Any):
+        """Open a GridFS file for chunked reading (None if it does not exist)"""
+        try:
+            return await self.files.open_download_stream(ObjectId(file_id))
+        except Exception:
+            return None
+
+    async def find_file(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """fs.files document of the first file matching a metadata query"""
+        return await self.db.fs.files.find_one(query)
+
+    async def get_file(self, file_id: Any) -> Optional[Dict[str, Any]]:
+        """Return {"data", "filename", "content_type", "metadata", ...} or None if the file does not exist"""
+        stream = await self.open_file(file_id)
+        if stream is None:
+            return None
+        return {
+            "_id": stream._id,
+            "data": await stream.read(),
+            "filename": stream.filename,
+            "length": stream.length,
+            "upload_date": stream.upload_date,
+            "content_type": file_content_type(stream),
+            "metadata": stream.metadata or {}
+        }
+
+    def close(self):
+        self.client.close()
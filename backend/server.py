@@ -1,26 +1,46 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Response, Request, Cookie, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, status, Response, Request, Cookie, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from pymongo import MongoClient
-from bson import ObjectId
-import gridfs
 import os
 from dotenv import load_dotenv
 import asyncio
+import json
 import httpx
-import base64
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-from emergentintegrations.llm.openai.image_generation import OpenAIImageGeneration
-from exporter import EbookExporter
+import re
 
+# Avant les modules locaux, qui lisent leur configuration à l'import
 load_dotenv()
 
+from exporter import EbookExporter
+from chapter_scheduler import ChapterScheduler
+from chapter_sections import split_sections, join_sections, replace_section_text
+from jobs import JobManager, JobContext
+from repository import Repository, file_content_type
+from indexes import ensure_indexes
+from listing import encode_list_cursor, decode_list_cursor
+from images import (
+    image_url, verify_image_signature, with_image_urls, hydrate_images,
+    image_etag, etag_matches, parse_range, iter_file, thumbnail_id, THUMBNAIL_WIDTHS, image_cache_control
+)
+from pymongo.errors import DuplicateKeyError
+from pipeline import DagScheduler, PipelineNode
+from llm_cache import LlmResponseCache
+from llm_gateway import LlmGateway, HedgeBudget
+from fair_scheduler import PRIORITY_BULK
+from single_flight import SingleFlight, SingleFlightConflict
+from summarizer import summarize
+from prompts import render_prompt
+from token_budget import (
+    trim_field, trim_to_tokens, context_share, chapter_output_tokens, section_output_tokens,
+    toc_output_tokens, illustration_plan_output_tokens, output_tokens, CHARS_PER_TOKEN
+)
+
 app = FastAPI(title="YooCreat API")
 
 # CORS Configuration
@@ -37,15 +57,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB Connection
-client = MongoClient(os.getenv("MONGO_URL"))
-db = client.yoocreat
-users_collection = db.users
-ebooks_collection = db.ebooks
-user_sessions_collection = db.user_sessions
+# MongoDB Connection (async driver, GridFS bucket for image storage)
+repository = Repository(os.getenv("MONGO_URL"))
+users_collection = repository.users
+ebooks_collection = repository.ebooks
+user_sessions_collection = repository.user_sessions
+jobs_collection = repository.jobs
+llm_cache_collection = repository.llm_cache
+locks_collection = repository.locks
+
+# Background jobs for long-running generations
+job_manager = JobManager(jobs_collection)
 
-# GridFS for image storage
-fs = gridfs.GridFS(db)
+# Shared cache of LLM completions
+llm_cache = LlmResponseCache(llm_cache_collection)
+
+# One generation at a time per ebook and operation, across workers
+single_flight = SingleFlight(locks_collection)
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -53,6 +81,10 @@ security = HTTPBearer()
 JWT_SECRET = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
+ILLUSTRATION_CONCURRENCY = int(os.getenv("ILLUSTRATION_CONCURRENCY", 4))
+
+# Every LLM and image call goes through the gateway
+llm = LlmGateway(EMERGENT_LLM_KEY, llm_cache)
 
 # Pydantic Models
 class UserRegister(BaseModel):
@@ -99,12 +131,14 @@ class GenerateTOC(BaseModel):
 class GenerateContent(BaseModel):
     ebook_id: str
     toc: List[Dict[str, Any]]
+    with_illustrations: bool = False
 
 class GenerateVisualThemeRequest(BaseModel):
     ebook_id: str
 
 class GenerateIllustrationsRequest(BaseModel):
     ebook_id: str
+    planning: str = Field("batch", pattern="^(batch|per_chapter)$")
 
 class EditChapterRequest(BaseModel):
     ebook_id: str
@@ -115,6 +149,12 @@ class RegenerateChapterRequest(BaseModel):
     ebook_id: str
     chapter_number: int
 
+class RegenerateSectionsRequest(BaseModel):
+    ebook_id: str
+    chapter_number: int
+    sections: List[int] = Field(min_length=1)
+    instructions: Optional[str] = None
+
 class RegenerateImageRequest(BaseModel):
     ebook_id: str
     chapter_number: int
@@ -154,13 +194,13 @@ async def get_current_user(
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     # First try as session_token (Emergent OAuth)
-    session = user_sessions_collection.find_one({"session_token": token})
+    session = await user_sessions_collection.find_one({"session_token": token})
     if session:
         # Check if session is expired
         if session["expires_at"] < datetime.now(timezone.utc):
             raise HTTPException(status_code=401, detail="Session expired")
         
-        user = users_collection.find_one({"_id": session["user_id"]})
+        user = await users_collection.find_one({"_id": session["user_id"]})
         if user:
             return user
     
@@ -170,13 +210,53 @@ async def get_current_user(
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = users_collection.find_one({"_id": user_id})
+        user = await users_collection.find_one({"_id": user_id})
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def parse_llm_json(response: str) -> Any:
+    """Parse a JSON completion, removing markdown code blocks if present"""
+    clean_response = response.strip()
+    if clean_response.startswith("```json"):
+        clean_response = clean_response[7:]
+    if clean_response.startswith("```"):
+        clean_response = clean_response[3:]
+    if clean_response.endswith("```"):
+        clean_response = clean_response[:-3]
+    clean_response = clean_response.strip()
+    
+    return json.loads(clean_response)
+
+def job_accepted(job_id: str, **extra) -> JSONResponse:
+    """202 response returned when a generation runs as a background job"""
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}",
+            **extra
+        }
+    )
+
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes(repository.db)
+
+@app.on_event("startup")
+async def start_job_manager():
+    # Balayage immédiat puis périodique des tâches dont le worker a disparu
+    job_manager.start()
+
+@app.on_event("shutdown")
+async def close_llm_gateway():
+    job_manager.stop()
+    await llm.close()
+    repository.close()
+
 # API Routes
 @app.get("/api/health")
 async def health_check():
@@ -185,10 +265,10 @@ async def health_check():
 @app.post("/api/auth/register")
 async def register(user_data: UserRegister):
     # Check if user exists
-    if users_collection.find_one({"email": user_data.email}):
+    if await users_collection.find_one({"email": user_data.email}):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    if users_collection.find_one({"username": user_data.username}):
+    if await users_collection.find_one({"username": user_data.username}):
         raise HTTPException(status_code=400, detail="Username already taken")
     
     # Create user
@@ -201,7 +281,12 @@ async def register(user_data: UserRegister):
         "google_id": None,
         "created_at": datetime.utcnow().isoformat()
     }
-    users_collection.insert_one(user)
+    try:
+        await users_collection.insert_one(user)
+    except DuplicateKeyError as e:
+        # Inscription concurrente avec le même email ou nom d'utilisateur
+        taken = "Username already taken" if "username" in str(e) else "Email already registered"
+        raise HTTPException(status_code=400, detail=taken)
     
     # Create token
     token = create_access_token({"sub": user_id, "email": user_data.email})
@@ -217,7 +302,7 @@ async def register(user_data: UserRegister):
 
 @app.post("/api/auth/login")
 async def login(user_data: UserLogin):
-    user = users_collection.find_one({"email": user_data.email})
+    user = await users_collection.find_one({"email": user_data.email})
     if not user or not verify_password(user_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
@@ -232,6 +317,15 @@ async def login(user_data: UserLogin):
         }
     }
 
+async def available_username(name: str) -> str:
+    """Google display names are not unique: suffix the name until it is free"""
+    username = name
+    suffix = 1
+    while await users_collection.find_one({"username": username}, {"_id": 1}):
+        suffix += 1
+        username = f"{name} {suffix}"
+    return username
+
 @app.post("/api/auth/google")
 async def google_auth(auth_data: GoogleAuth, response: Response):
     """
@@ -255,26 +349,26 @@ async def google_auth(auth_data: GoogleAuth, response: Response):
             session_data = api_response.json()
         
         # Check if user exists
-        user = users_collection.find_one({"email": session_data["email"]})
+        user = await users_collection.find_one({"email": session_data["email"]})
         
         if not user:
             # Create new user
             user_id = f"user_{datetime.now(timezone.utc).timestamp()}".replace(".", "_")
             user = {
                 "_id": user_id,
-                "username": session_data["name"],
+                "username": await available_username(session_data["name"]),
                 "email": session_data["email"],
                 "password_hash": None,
                 "google_id": session_data["id"],
                 "picture": session_data.get("picture"),
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
-            users_collection.insert_one(user)
+            await users_collection.insert_one(user)
         else:
             user_id = user["_id"]
             # Update google_id and picture if not set
             if not user.get("google_id"):
-                users_collection.update_one(
+                await users_collection.update_one(
                     {"_id": user_id},
                     {"$set": {
                         "google_id": session_data["id"],
@@ -286,7 +380,7 @@ async def google_auth(auth_data: GoogleAuth, response: Response):
         session_token = session_data["session_token"]
         expires_at = datetime.now(timezone.utc) + timedelta(days=7)
         
-        user_sessions_collection.insert_one({
+        await user_sessions_collection.insert_one({
             "user_id": user_id,
             "session_token": session_token,
             "expires_at": expires_at,
@@ -334,25 +428,24 @@ async def logout(response: Response, session_token: Optional[str] = Cookie(None)
     """Logout user by deleting session and clearing cookie"""
     if session_token:
         # Delete session from database
-        user_sessions_collection.delete_one({"session_token": session_token})
+        await user_sessions_collection.delete_one({"session_token": session_token})
     
     # Clear cookie
     response.delete_cookie(key="session_token", path="/")
     
     return {"success": True, "message": "Logged out successfully"}
 
-@app.post("/api/ebooks/generate-toc")
-async def generate_toc(data: GenerateTOC, current_user = Depends(get_current_user)):
-    try:
-        # Create enhanced prompt for TOC generation
-        prompt = f"""Tu es un expert en création de livres et structuration de contenu littéraire professionnel.
+async def run_generate_toc(data: GenerateTOC, user_id: str) -> List[Dict[str, Any]]:
+    """Generate the table of contents of a book from its metadata"""
+    # Create enhanced prompt for TOC generation
+    prompt = f"""Tu es un expert en création de livres et structuration de contenu littéraire professionnel.
 
 CONTEXTE DU LIVRE :
 - Titre : {data.title}
 - Auteur : {data.author}
 - Ton : {data.tone}
 - Public cible : {', '.join(data.target_audience)}
-- Description/Objectif : {data.description}
+- Description/Objectif : {trim_field("description", data.description)}
 - Nombre de chapitres : {data.chapters_count}
 - Longueur : {data.length}
 
@@ -399,266 +492,462 @@ Réponds UNIQUEMENT avec ce JSON valide (sans markdown, sans texte avant/après)
   ]
 }}"""
 
-        # Initialize LLM Chat
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"toc_{current_user['_id']}_{datetime.utcnow().timestamp()}",
-            system_message="Tu es un assistant expert en création de contenu littéraire et structuration de livres."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        # Parse response
-        import json
-        # Clean response - remove markdown code blocks if present
-        clean_response = response.strip()
-        if clean_response.startswith("```json"):
-            clean_response = clean_response[7:]
-        if clean_response.startswith("```"):
-            clean_response = clean_response[3:]
-        if clean_response.endswith("```"):
-            clean_response = clean_response[:-3]
-        clean_response = clean_response.strip()
-        
-        toc_data = json.loads(clean_response)
+    # Initialize LLM Chat
+    response = await llm.complete(
+        session_prefix=f"toc_{user_id}",
+        user_id=user_id,
+        system_message="Tu es un assistant expert en création de contenu littéraire et structuration de livres.",
+        prompt=prompt,
+        validate=parse_llm_json,
+        max_tokens=toc_output_tokens(data.chapters_count)
+    )
+    
+    # Parse response
+    toc_data = parse_llm_json(response)
+    return toc_data["chapters"]
+
+@app.post("/api/ebooks/generate-toc")
+async def generate_toc(data: GenerateTOC, current_user = Depends(get_current_user)):
+    try:
+        toc = await run_generate_toc(data, current_user["_id"])
         
         return {
             "success": True,
-            "toc": toc_data["chapters"]
+            "toc": toc
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating TOC: {str(e)}")
 
-@app.post("/api/ebooks/generate-content")
-async def generate_content(data: GenerateContent, current_user = Depends(get_current_user)):
-    try:
-        # Get ebook
-        ebook = ebooks_collection.find_one({"_id": data.ebook_id, "user_id": current_user["_id"]})
-        if not ebook:
-            raise HTTPException(status_code=404, detail="Ebook not found")
-        
-        chapters = []
-        previous_chapter_summary = ""
-        
-        for idx, chapter in enumerate(data.toc):
-            chapter_type = chapter.get('type', 'chapter')
-            
-            # Prompt adapté selon le type de chapitre
-            if chapter_type == 'introduction':
-                prompt = f"""Tu es un auteur professionnel spécialisé en introductions captivantes.
-
-CONTEXTE DU LIVRE :
-- Titre : "{ebook['title']}"
-- Auteur : {ebook['author']}
-- Ton : {ebook['tone']}
-- Public cible : {', '.join(ebook['target_audience'])}
-- Objectif : {ebook['description']}
-
-MISSION : Rédige une INTRODUCTION percutante (900-1200 mots) structurée ainsi :
-
-1. **OUVERTURE CAPTIVANTE** (2-3 paragraphes)
-   - Une anecdote personnelle, histoire marquante ou statistique surprenante
-   - Questions qui interpellent directement le lecteur
-   - Établis une connexion émotionnelle immédiate
-
-2. **LE POURQUOI** (2-3 paragraphes)
-   - Présente le problème ou besoin auquel répond ce livre
-   - Explique pourquoi c'est important MAINTENANT
-   - Crée l'urgence et la pertinence
-
-3. **LA PROMESSE** (2-3 paragraphes)
-   - Énonce clairement les bénéfices concrets pour le lecteur
-   - Liste 3-4 choses spécifiques qu'il va apprendre ou accomplir
-   - Témoigne de la transformation possible
-
-4. **LA FEUILLE DE ROUTE** (1-2 paragraphes)
-   - Donne un aperçu du parcours à venir (sans détailler chaque chapitre)
-   - Crée l'anticipation et l'excitation pour la lecture
-   - Termine sur une note motivante qui donne envie de tourner la page
-
-EXIGENCES STRICTES :
-- Style : {ebook['tone']}, adapté à {', '.join(ebook['target_audience'])}
-- ⚠️ INTERDIT : N'utilise JAMAIS les symboles #, ##, ### ou autres balises Markdown
-- ⚠️ INTERDIT : Ne répète JAMAIS le mot "Introduction" dans le texte
-- Structure : Utilise UNIQUEMENT le format "🔹 Titre de section" si nécessaire pour des sous-parties
-- Ton : Engageant, personnel, et orienté vers l'action
-- Langage : 100% en français
-
-Réponds UNIQUEMENT avec le texte de l'introduction (le titre "Introduction" sera ajouté automatiquement)."""
-
-            elif chapter_type == 'conclusion':
-                prompt = f"""Tu es un auteur professionnel spécialisé en conclusions mémorables et inspirantes.
-
-CONTEXTE DU LIVRE :
-- Titre : "{ebook['title']}"
-- Auteur : {ebook['author']}
-- Ton : {ebook['tone']}
-- Public cible : {', '.join(ebook['target_audience'])}
-- Parcours du livre : {ebook['description']}
-
-MISSION : Rédige une CONCLUSION puissante (900-1200 mots) structurée ainsi :
-
-1. **LE VOYAGE ACCOMPLI** (2-3 paragraphes)
-   - Rappelle le point de départ (où était le lecteur au début)
-   - Célèbre le chemin parcouru
-   - Reconnais l'effort et l'engagement du lecteur
-
-2. **LES ENSEIGNEMENTS CLÉS** (2-3 paragraphes)
-   - Synthèse des 4-5 points principaux du livre
-   - Reformule les messages essentiels de manière mémorable
-   - Utilise des formulations impactantes qui restent en tête
-
-3. **LE PASSAGE À L'ACTION** (2-3 paragraphes)
-   - Liste 3-4 actions concrètes que le lecteur peut entreprendre DÈS MAINTENANT
-   - Donne des étapes spécifiques et réalisables
-   - Crée un sentiment d'urgence positive et d'enthousiasme
-
-4. **LA VISION INSPIRANTE** (2 paragraphes)
-   - Peins le tableau de la transformation possible
-   - Projette le lecteur dans son futur réussi
-   - Termine sur une note émotionnelle forte et motivante
-   - Une phrase finale mémorable qui résume l'essence du livre
-
-EXIGENCES STRICTES :
-- Style : {ebook['tone']}, adapté à {', '.join(ebook['target_audience'])}
-- ⚠️ INTERDIT : N'utilise JAMAIS les symboles #, ##, ### ou autres balises Markdown
-- ⚠️ INTERDIT : Ne répète JAMAIS le mot "Conclusion" dans le texte
-- Structure : Utilise UNIQUEMENT le format "🔹 Titre de section" si nécessaire pour des sous-parties
-- Ton : Inspirant, optimiste, et orienté vers l'action
-- Impact : Crée une fin mémorable qui donne au lecteur l'envie de recommencer sa lecture
-- Langage : 100% en français
-
-Réponds UNIQUEMENT avec le texte de la conclusion (le titre "Conclusion" sera ajouté automatiquement)."""
-
-            else:  # chapter
-                # Contexte du chapitre précédent pour transitions
-                transition_context = ""
-                if idx > 0 and previous_chapter_summary:
-                    transition_context = f"\n\nLIEN AVEC LE CHAPITRE PRÉCÉDENT :\n{previous_chapter_summary}\n→ Commence par une transition naturelle qui fait le pont entre ces idées."
-                
-                # Contexte du chapitre suivant
-                next_chapter_hint = ""
-                if idx < len(data.toc) - 1:
-                    next_chap = data.toc[idx + 1]
-                    next_chapter_hint = f"\n\nPRÉPARATION POUR LA SUITE :\nLe prochain chapitre abordera : {next_chap['title']}\n→ Termine par une phrase qui crée le lien avec ce sujet."
-
-                prompt = f"""Tu es un auteur professionnel expert en pédagogie et storytelling.
-
-CONTEXTE DU LIVRE :
-- Titre : "{ebook['title']}"
-- Auteur : {ebook['author']}
-- Ton : {ebook['tone']}
-- Public cible : {', '.join(ebook['target_audience'])}
-- Objectif global : {ebook['description']}
-
-CHAPITRE À RÉDIGER :
-Numéro : {chapter['number']}
-Titre : {chapter['title']}
-Objectif : {chapter['description']}{transition_context}{next_chapter_hint}
-
-MISSION : Rédige un chapitre COMPLET et ENGAGEANT (1200-1800 mots) structuré ainsi :
-
-1. **OUVERTURE** (2-3 paragraphes)
-   - Accroche puissante avec question, anecdote ou fait surprenant
-   - Annonce claire de ce qui sera couvert dans ce chapitre
-
-2. **DÉVELOPPEMENT EN SECTIONS** (corps principal)
-   Organise le contenu en 2-4 sections claires avec :
-   - Pour chaque section : un titre descriptif précédé de "🔹" (exemple: "🔹 La première étape vers le changement")
-   - Explications claires et approfondies
-   - 2-3 exemples concrets et pertinents par section
-   - Anecdotes illustratives adaptées au ton {ebook['tone']}
-   - Étapes pratiques ou conseils actionnables
-   - Analogies ou métaphores pour clarifier les concepts complexes
-
-3. **EN SYNTHÈSE** (section finale OBLIGATOIRE - 1 paragraphe)
-   Titre de section : "🔹 En synthèse"
-   - Résumé concis des 3-4 points clés du chapitre
-   - Le principal enseignement à retenir
-   - Lien subtil avec le chapitre suivant
-
-4. **RÉFLEXION PERSONNELLE** (section finale OBLIGATOIRE)
-   Titre de section : "🔹 Question de réflexion"
-   - 1-2 questions ouvertes qui invitent le lecteur à appliquer ce qu'il a appris
-   - Formulation engageante et personnalisée
-
-EXIGENCES STRICTES :
-- Style : {ebook['tone']}
-- Public : {', '.join(ebook['target_audience'])}
-- Structuration : Utilise UNIQUEMENT le format "🔹 Titre de section" pour les sous-parties
-- ⚠️ INTERDIT : N'utilise JAMAIS les symboles #, ##, ### ou autres balises Markdown
-- ⚠️ INTERDIT : Ne répète JAMAIS le titre principal du chapitre dans le contenu
-- Exemples : Minimum 2-3 exemples concrets et situés
-- Longueur : Dense et riche, environ 1200-1800 mots
-- Langage : 100% en français
+def build_chapter_prompt(ebook: dict, chapter: Dict[str, Any], transition: Dict[str, str]) -> Tuple[str, str]:
+    """Build the (system message, prompt) pair generating one TOC entry"""
+    chapter_type = chapter.get('type', 'chapter')
+    
+    # Prompt adapté selon le type de chapitre
+    template = {"introduction": "chapter_introduction", "conclusion": "chapter_conclusion"}.get(chapter_type, "chapter")
+    return render_prompt(
+        template,
+        ebook,
+        chapter_number=chapter['number'],
+        chapter_title=chapter['title'],
+        chapter_description=trim_field("chapter_description", chapter['description']),
+        transition_context=transition['transition_context'],
+        next_chapter_hint=transition['next_chapter_hint']
+    )
 
-Réponds UNIQUEMENT avec le contenu du chapitre (sans le titre principal, il sera ajouté automatiquement)."""
+async def generate_chapter(
+    ebook: dict,
+    chapter: Dict[str, Any],
+    transition: Dict[str, str],
+    hedge: Optional[HedgeBudget] = None
+) -> Dict[str, Any]:
+    """Generate the content of one TOC entry (slow calls are hedged within the book's budget)"""
+    system_message, prompt = build_chapter_prompt(ebook, chapter, transition)
+    content = await llm.complete(
+        session_prefix=f"chapter_{ebook['_id']}_{chapter['number']}",
+        user_id=ebook['user_id'],
+        system_message=system_message,
+        prompt=prompt,
+        priority=PRIORITY_BULK,
+        prompt_class="chapter",
+        hedge=hedge,
+        max_tokens=chapter_output_tokens(chapter.get('type', 'chapter'), ebook.get('length'))
+    )
+    
+    return {
+        "number": chapter["number"],
+        "title": chapter["title"],
+        "description": chapter["description"],
+        "type": chapter.get('type', 'chapter'),
+        "content": content.strip(),
+        "summary": summarize(content),
+        "generated_at": datetime.now(timezone.utc).isoformat()
+    }
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"chapter_{data.ebook_id}_{chapter['number']}_{datetime.now(timezone.utc).timestamp()}",
-                system_message="Tu es un auteur professionnel expert en création de contenu littéraire de haute qualité."
-            ).with_model("openai", "gpt-4o-mini")
-            
-            user_message = UserMessage(text=prompt)
-            content = await chat.send_message(user_message)
-            
-            chapter_data = {
-                "number": chapter["number"],
-                "title": chapter["title"],
-                "description": chapter["description"],
-                "type": chapter_type,
-                "content": content.strip(),
-                "generated_at": datetime.now(timezone.utc).isoformat()
-            }
-            chapters.append(chapter_data)
-            
-            # Créer un résumé du chapitre pour le chapitre suivant
-            if chapter_type == 'chapter':
-                previous_chapter_summary = f"Chapitre précédent '{chapter['title']}' : {chapter['description'][:100]}..."
-        
-        # Update ebook with chapters
-        ebooks_collection.update_one(
-            {"_id": data.ebook_id},
+async def run_generate_content(
+    ebook: dict,
+    toc: List[Dict[str, Any]],
+    job: Optional[JobContext] = None,
+    on_chapter_ready: Optional[Callable[[int, Dict[str, Any]], Awaitable[None]]] = None,
+    resume: bool = False,
+    with_illustrations: bool = False,
+    on_illustrations_ready: Optional[Callable[[int, Dict[str, Any]], Awaitable[None]]] = None
+) -> dict:
+    """
+    Generate the chapters of the TOC and save them on the ebook
+    
+    Each chapter is checkpointed in `generation.chapters` as soon as it is ready,
+    so with resume=True only the chapters missing from the previous run are generated.
+    With with_illustrations=True, the illustrations of each regular chapter are planned
+    and rendered as soon as it is written, while the other chapters are still generating.
+    """
+    ebook_id = ebook['_id']
+    checkpoint = ebook.get('generation', {}).get('chapters', {}) if resume else {}
+    # Les prompts décrivent le plan en cours de génération (préfixe commun à tous les chapitres)
+    ebook = {**ebook, "toc": toc}
+    done = {int(idx): chapter_data for idx, chapter_data in checkpoint.items()}
+    pending = [idx for idx in range(len(toc)) if idx not in done]
+    
+    # Curseur de génération : TOC de référence + chapitres déjà terminés
+    generation = {
+        "generation.toc": toc,
+        "generation.status": "running",
+        "generation.total": len(toc),
+        "generation.error": None,
+        "generation.updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    if not resume:
+        generation["generation.chapters"] = {}
+        generation["generation.started_at"] = datetime.now(timezone.utc).isoformat()
+    await ebooks_collection.update_one({"_id": ebook_id}, {"$set": generation})
+    
+    illustrated = [
+        idx for idx in range(len(toc))
+        if with_illustrations and toc[idx].get('type', 'chapter') == 'chapter'
+    ]
+    if job:
+        await job.set_steps(
+            [f"chapter_{toc[idx]['number']}" for idx in pending]
+            + [f"illustrations_{toc[idx]['number']}" for idx in illustrated]
+        )
+    
+    image_slots = asyncio.Semaphore(ILLUSTRATION_CONCURRENCY)
+    illustration_tasks: Dict[int, asyncio.Task] = {}
+    
+    async def illustrate(idx, chapter_data):
+        step = f"illustrations_{chapter_data['number']}"
+        if job:
+            await job.start_step(step)
+        try:
+            plan = await plan_chapter_illustrations(ebook, chapter_data)
+            chapter_illust = await render_chapter_illustrations(ebook, plan, image_slots)
+        except Exception as e:
+            if job:
+                await job.fail_step(step, str(e))
+            raise
+        if job:
+            await job.complete_step(step, chapter_illust)
+        if on_illustrations_ready:
+            await on_illustrations_ready(idx, chapter_illust)
+        return chapter_illust
+    
+    def start_illustrations(idx, chapter_data):
+        # Les illustrations d'un chapitre démarrent dès qu'il est écrit
+        if idx in illustrated:
+            illustration_tasks[idx] = asyncio.create_task(illustrate(idx, chapter_data))
+    
+    for idx, chapter_data in done.items():
+        start_illustrations(idx, chapter_data)
+    
+    # Budget de requêtes de secours pour la traîne de latence de ce livre
+    hedge = HedgeBudget.for_calls(len(pending))
+    
+    async def generate(chapter, transition):
+        step = f"chapter_{chapter['number']}"
+        if job:
+            await job.start_step(step)
+        try:
+            return await generate_chapter(ebook, chapter, transition, hedge)
+        except Exception as e:
+            if job:
+                await job.fail_step(step, str(e))
+            raise
+    
+    async def on_chapter(idx, chapter_data):
+        # Checkpoint : le chapitre est sauvegardé dès qu'il est prêt
+        await ebooks_collection.update_one(
+            {"_id": ebook_id},
+            {"$set": {
+                f"generation.chapters.{idx}": chapter_data,
+                "generation.updated_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        if job:
+            await job.complete_step(f"chapter_{chapter_data['number']}", chapter_data)
+        start_illustrations(idx, chapter_data)
+        if on_chapter_ready:
+            await on_chapter_ready(idx, chapter_data)
+    
+    # Les chapitres sont générés en parallèle puis remis dans l'ordre de la TOC
+    scheduler = ChapterScheduler()
+    try:
+        summaries = {idx: chapter_data.get('summary') or summarize(chapter_data.get('content', '')) for idx, chapter_data in done.items()}
+        generated = await scheduler.run(toc, generate, on_chapter, indices=pending, fail_fast=False, summaries=summaries)
+    except BaseException as e:
+        for task in illustration_tasks.values():
+            task.cancel()
+        await asyncio.gather(*illustration_tasks.values(), return_exceptions=True)
+        # Les chapitres déjà sauvegardés restent disponibles pour une reprise
+        cancelled = isinstance(e, asyncio.CancelledError)
+        await ebooks_collection.update_one(
+            {"_id": ebook_id},
             {"$set": {
+                "generation.status": "cancelled" if cancelled else "failed",
+                "generation.error": None if cancelled else str(e),
+                "generation.updated_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        raise
+    
+    done.update(generated)
+    chapters = [done[idx] for idx in range(len(toc))]
+    
+    # Update ebook with chapters (the checkpoints are no longer needed)
+    await ebooks_collection.update_one(
+        {"_id": ebook_id},
+        {
+            "$set": {
                 "chapters": chapters,
                 "status": "completed",
-                "completed_at": datetime.now(timezone.utc).isoformat()
-            }}
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+                "generation.status": "completed",
+                "generation.updated_at": datetime.now(timezone.utc).isoformat()
+            },
+            "$unset": {"generation.chapters": ""}
+        }
+    )
+    
+    result = {
+        "success": True,
+        "chapters": chapters
+    }
+    
+    if with_illustrations:
+        # Le contenu est déjà sauvegardé : un échec d'illustration ne le remet pas en cause
+        indices = sorted(illustration_tasks)
+        outcomes = await asyncio.gather(*(illustration_tasks[idx] for idx in indices), return_exceptions=True)
+        illustrations_data = []
+        illustration_errors = []
+        for idx, outcome in zip(indices, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Error illustrating chapter {toc[idx]['number']}: {outcome}")
+                illustration_errors.append({"chapter_number": toc[idx]['number'], "error": str(outcome)})
+            else:
+                illustrations_data.append(outcome)
+        
+        await ebooks_collection.update_one(
+            {"_id": ebook_id},
+            {"$set": {"illustrations": illustrations_data}}
         )
+        result["illustrations"] = illustrations_data
+        result["illustration_errors"] = illustration_errors
+    
+    return result
+
+async def generate_content_once(
+    ebook_id: str,
+    run: Callable[[], Awaitable[dict]],
+    toc: List[Dict[str, Any]],
+    resume: bool = False,
+    with_illustrations: bool = False
+) -> dict:
+    """
+    Run a content generation, or attach to the one already running for this ebook
+
+    Only a run with the same parameters is shared; a different one is refused
+    with a 409 until the current run completes.
+    """
+    params = {"toc": toc, "resume": resume, "with_illustrations": with_illustrations}
+    
+    async def load_result() -> dict:
+        ebook = await ebooks_collection.find_one({"_id": ebook_id}, {"chapters": 1, "illustrations": 1})
+        result = {"success": True, "chapters": ebook.get('chapters', [])}
+        if ebook.get('illustrations'):
+            result["illustrations"] = ebook['illustrations']
+        return result
+    
+    try:
+        return await single_flight.run(f"generate_content:{ebook_id}", run, load_result, params)
+    except SingleFlightConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/ebooks/generate-content")
+async def generate_content(data: GenerateContent, background: bool = False, current_user = Depends(get_current_user)):
+    try:
+        # Get ebook
+        ebook = await ebooks_collection.find_one({"_id": data.ebook_id, "user_id": current_user["_id"]})
+        if not ebook:
+            raise HTTPException(status_code=404, detail="Ebook not found")
         
-        return {
-            "success": True,
-            "chapters": chapters
-        }
+        if background:
+            job_id = await job_manager.submit(
+                "generate_content",
+                current_user["_id"],
+                lambda job: generate_content_once(
+                    data.ebook_id,
+                    lambda: run_generate_content(ebook, data.toc, job, with_illustrations=data.with_illustrations),
+                    toc=data.toc,
+                    with_illustrations=data.with_illustrations
+                ),
+                ebook_id=data.ebook_id
+            )
+            return job_accepted(job_id)
+        
+        return with_image_urls(await generate_content_once(
+            data.ebook_id,
+            lambda: run_generate_content(ebook, data.toc, with_illustrations=data.with_illustrations),
+            toc=data.toc,
+            with_illustrations=data.with_illustrations
+        ), current_user["_id"])
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating content: {str(e)}")
 
-class GenerateCoverRequest(BaseModel):
-    ebook_id: str
-
-@app.post("/api/ebooks/generate-cover")
-async def generate_cover(request: GenerateCoverRequest, current_user = Depends(get_current_user)):
-    """Generate a text-based cover page design"""
+@app.post("/api/ebooks/{ebook_id}/generate-content/resume")
+async def resume_generate_content(
+    ebook_id: str,
+    background: bool = False,
+    with_illustrations: bool = False,
+    current_user = Depends(get_current_user)
+):
+    """Resume an interrupted content generation, only generating the missing chapters"""
     try:
-        ebook_id = request.ebook_id
-        # Get ebook
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
-        # Generate cover description/design
-        prompt = f"""Tu es un designer de couvertures de livres professionnel.
+        generation = ebook.get('generation', {})
+        toc = generation.get('toc')
+        if not toc:
+            raise HTTPException(status_code=400, detail="No content generation to resume")
+        if generation.get('status') == 'completed':
+            raise HTTPException(status_code=400, detail="Content generation already completed")
+        
+        if background:
+            job_id = await job_manager.submit(
+                "generate_content",
+                current_user["_id"],
+                lambda job: generate_content_once(
+                    ebook_id,
+                    lambda: run_generate_content(ebook, toc, job, resume=True, with_illustrations=with_illustrations),
+                    toc=toc,
+                    resume=True,
+                    with_illustrations=with_illustrations
+                ),
+                ebook_id=ebook_id
+            )
+            return job_accepted(job_id)
+        
+        return with_image_urls(await generate_content_once(
+            ebook_id,
+            lambda: run_generate_content(ebook, toc, resume=True, with_illustrations=with_illustrations),
+            toc=toc,
+            resume=True,
+            with_illustrations=with_illustrations
+        ), current_user["_id"])
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error resuming content generation: {str(e)}")
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@app.get("/api/ebooks/{ebook_id}/generate-content/stream")
+async def stream_generate_content(
+    ebook_id: str,
+    resume: bool = False,
+    with_illustrations: bool = False,
+    current_user = Depends(get_current_user)
+):
+    """
+    Generate the content from the saved TOC and stream it as Server-Sent Events
+    
+    Events: one `chapter` event per chapter as soon as it is ready (in completion order,
+    with its TOC `index`), then a final `done` summary event, or an `error` event.
+    With resume=true, only the chapters missing from the interrupted run are generated.
+    With with_illustrations=true, an `illustrations` event follows each illustrated chapter.
+    """
+    ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+    if not ebook:
+        raise HTTPException(status_code=404, detail="Ebook not found")
+    
+    generation = ebook.get('generation', {})
+    if resume and generation.get('status') == 'completed':
+        # Les chapitres de la génération terminée ne sont plus suivis : tout serait régénéré
+        raise HTTPException(status_code=400, detail="Content generation already completed")
+    
+    toc = generation.get('toc') if resume else ebook.get('toc', [])
+    if not toc:
+        raise HTTPException(status_code=400, detail="Save a table of contents before generating content")
+    
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def on_chapter_ready(idx, chapter_data):
+        await queue.put(sse_event("chapter", {"index": idx, "total": len(toc), "chapter": chapter_data}))
+    
+    async def on_illustrations_ready(idx, chapter_illust):
+        await queue.put(sse_event("illustrations", {"index": idx, "illustrations": with_image_urls(chapter_illust, current_user["_id"])}))
+    
+    async def produce():
+        try:
+            # A stream attached to a run already in progress only receives the `done` event
+            result = await generate_content_once(
+                ebook_id,
+                lambda: run_generate_content(
+                    ebook,
+                    toc,
+                    on_chapter_ready=on_chapter_ready,
+                    resume=resume,
+                    with_illustrations=with_illustrations,
+                    on_illustrations_ready=on_illustrations_ready
+                ),
+                toc=toc,
+                resume=resume,
+                with_illustrations=with_illustrations
+            )
+            await queue.put(sse_event("done", {
+                "success": True,
+                "chapters_count": len(result["chapters"]),
+                "illustrations_count": len(result.get("illustrations", [])),
+                "status": "completed"
+            }))
+        except HTTPException as e:
+            await queue.put(sse_event("error", {"detail": e.detail, "status": e.status_code}))
+        except Exception as e:
+            await queue.put(sse_event("error", {"detail": f"Error generating content: {str(e)}"}))
+        finally:
+            await queue.put(None)
+    
+    async def event_stream():
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            # Client déconnecté : seule cette attente est annulée, la génération partagée
+            # continue tant qu'un autre appelant (job, autre flux) y est rattaché
+            producer.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class GenerateCoverRequest(BaseModel):
+    ebook_id: str
+
+async def run_generate_cover(ebook: dict) -> dict:
+    """Generate the text-based cover page design and attach it to the ebook"""
+    ebook_id = ebook['_id']
+    
+    # Generate cover description/design
+    prompt = f"""Tu es un designer de couvertures de livres professionnel.
 
 INFORMATIONS DU LIVRE :
 - Titre : {ebook['title']}
 - Auteur : {ebook['author']}
 - Ton : {ebook['tone']}
 - Public cible : {', '.join(ebook['target_audience'])}
-- Description : {ebook['description']}
+- Description : {trim_field("description", ebook['description'])}
 
 MISSION : Crée une description détaillée de couverture de livre professionnelle qui inclut :
 
@@ -703,33 +992,37 @@ Format de réponse (JSON) :
 
 Réponds UNIQUEMENT avec le JSON."""
 
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"cover_{ebook_id}_{datetime.now(timezone.utc).timestamp()}",
-            system_message="Tu es un designer professionnel de couvertures de livres."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        # Clean and parse response
-        import json
-        clean_response = response.strip()
-        if clean_response.startswith("```json"):
-            clean_response = clean_response[7:]
-        if clean_response.startswith("```"):
-            clean_response = clean_response[3:]
-        if clean_response.endswith("```"):
-            clean_response = clean_response[:-3]
-        clean_response = clean_response.strip()
-        
-        cover_data = json.loads(clean_response)
-        
-        # Save cover to ebook
-        ebooks_collection.update_one(
-            {"_id": ebook_id},
-            {"$set": {"cover": cover_data}}
-        )
+    response = await llm.complete(
+        session_prefix=f"cover_{ebook_id}",
+        user_id=ebook['user_id'],
+        system_message="Tu es un designer professionnel de couvertures de livres.",
+        prompt=prompt,
+        validate=parse_llm_json,
+        max_tokens=output_tokens("cover")
+    )
+    
+    # Parse response
+    cover_data = parse_llm_json(response)
+    
+    # Save cover to ebook, field by field so a cover image generated
+    # concurrently (pipeline) is not overwritten
+    await ebooks_collection.update_one(
+        {"_id": ebook_id},
+        {"$set": {f"cover.{key}": value for key, value in cover_data.items()}}
+    )
+    return cover_data
+
+@app.post("/api/ebooks/generate-cover")
+async def generate_cover(request: GenerateCoverRequest, current_user = Depends(get_current_user)):
+    """Generate a text-based cover page design"""
+    try:
+        ebook_id = request.ebook_id
+        # Get ebook
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        if not ebook:
+            raise HTTPException(status_code=404, detail="Ebook not found")
+        
+        cover_data = await run_generate_cover(ebook)
         
         return {
             "success": True,
@@ -739,18 +1032,15 @@ Réponds UNIQUEMENT avec le JSON."""
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating cover: {str(e)}")
 
-@app.post("/api/ebooks/generate-cover-image")
-async def generate_cover_image(request: GenerateCoverRequest, current_user = Depends(get_current_user)):
-    """Generate an actual cover image using DALL-E"""
-    try:
-        ebook_id = request.ebook_id
-        # Get ebook
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
-        if not ebook:
-            raise HTTPException(status_code=404, detail="Ebook not found")
-        
-        # Create DALL-E prompt for cover image
-        dalle_prompt = f"""Professional book cover design for:
+async def run_generate_cover_image(ebook: dict, job: Optional[JobContext] = None) -> dict:
+    """Generate the cover image with DALL-E and attach it to the ebook"""
+    ebook_id = ebook['_id']
+    if job:
+        await job.set_steps(["cover_image"])
+        await job.start_step("cover_image")
+    
+    # Create DALL-E prompt for cover image
+    dalle_prompt = f"""Professional book cover design for:
 Title: "{ebook['title']}"
 Author: {ebook['author']}
 Genre: {ebook.get('genre', 'Non-fiction')}
@@ -767,59 +1057,69 @@ Design a beautiful, professional book cover with:
 No photographs of people. Use abstract designs, patterns, or symbolic imagery.
 The design should be professional enough for Amazon KDP or traditional publishing."""
 
-        print(f"Generating cover image with DALL-E for: {ebook['title']}")
-        
-        # Initialize DALL-E
-        image_gen = OpenAIImageGeneration(api_key=EMERGENT_LLM_KEY)
-        
-        # Generate cover image
-        images = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: image_gen.generate_images(
-                prompt=dalle_prompt,
-                model="gpt-image-1",
-                number_of_images=1
-            )
+    print(f"Generating cover image with DALL-E for: {ebook['title']}")
+    
+    # Generate cover image
+    image_bytes = await llm.generate_image(dalle_prompt, user_id=ebook['user_id'])
+    
+    if image_bytes:
+        # Store in GridFS, the ebook only keeps the image id
+        image_id = await repository.put_file(
+            image_bytes,
+            filename=f"cover_{ebook_id}_{datetime.now(timezone.utc).timestamp()}.png",
+            content_type="image/png",
+            metadata={
+                "ebook_id": ebook_id,
+                "type": "cover",
+                "generated_at": datetime.now(timezone.utc).isoformat()
+            }
         )
         
-        if images and len(images) > 0:
-            # Convert to base64
-            image_base64 = base64.b64encode(images[0]).decode('utf-8')
-            
-            # Store in GridFS
-            image_id = fs.put(
-                images[0],
-                filename=f"cover_{ebook_id}_{datetime.now(timezone.utc).timestamp()}.png",
-                content_type="image/png",
-                metadata={
-                    "ebook_id": ebook_id,
-                    "type": "cover",
-                    "generated_at": datetime.now(timezone.utc).isoformat()
-                }
-            )
-            
-            # Update ebook cover with image
-            cover_data = ebook.get('cover', {})
-            cover_data['cover_image_base64'] = image_base64
-            cover_data['cover_image_id'] = str(image_id)
-            
-            ebooks_collection.update_one(
-                {"_id": ebook_id},
-                {"$set": {"cover": cover_data}}
-            )
-            
-            return {
-                "success": True,
-                "cover_image_base64": image_base64
+        # Update ebook cover with image (cover text may be generated concurrently)
+        await ebooks_collection.update_one(
+            {"_id": ebook_id},
+            {
+                "$set": {"cover.cover_image_id": str(image_id)},
+                "$unset": {"cover.cover_image_base64": ""}
             }
-        else:
-            raise HTTPException(status_code=500, detail="No image was generated")
+        )
+        if job:
+            await job.complete_step("cover_image")
         
-    except Exception as e:
-        print(f"Error generating cover image: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error generating cover image: {str(e)}")
+        return {
+            "success": True,
+            "cover_image_id": str(image_id),
+            "cover_image_url": image_url(str(image_id), ebook["user_id"])
+        }
+    else:
+        raise HTTPException(status_code=500, detail="No image was generated")
+
+@app.post("/api/ebooks/generate-cover-image")
+async def generate_cover_image(request: GenerateCoverRequest, background: bool = False, current_user = Depends(get_current_user)):
+    """Generate an actual cover image using DALL-E"""
+    try:
+        ebook_id = request.ebook_id
+        # Get ebook
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        if not ebook:
+            raise HTTPException(status_code=404, detail="Ebook not found")
+        
+        if background:
+            job_id = await job_manager.submit(
+                "generate_cover_image",
+                current_user["_id"],
+                lambda job: run_generate_cover_image(ebook, job),
+                ebook_id=ebook_id
+            )
+            return job_accepted(job_id)
+        
+        return await run_generate_cover_image(ebook)
+        
+    except Exception as e:
+        print(f"Error generating cover image: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error generating cover image: {str(e)}")
 
 @app.post("/api/ebooks/upload-cover-image")
 async def upload_cover_image(
@@ -829,7 +1129,7 @@ async def upload_cover_image(
 ):
     """Upload a custom cover image"""
     try:
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
@@ -842,7 +1142,7 @@ async def upload_cover_image(
         image_data = await file.read()
         
         # Store in GridFS
-        image_id = fs.put(
+        image_id = await repository.put_file(
             image_data,
             filename=file.filename,
             content_type=file.content_type,
@@ -855,51 +1155,38 @@ async def upload_cover_image(
             }
         )
         
-        # Convert to base64
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        
         # Update ebook cover
         cover_data = ebook.get('cover', {})
-        cover_data['cover_image_base64'] = image_base64
+        cover_data.pop('cover_image_base64', None)
         cover_data['cover_image_id'] = str(image_id)
         cover_data['source'] = 'user_upload'
         
-        ebooks_collection.update_one(
+        await ebooks_collection.update_one(
             {"_id": ebook_id},
             {"$set": {"cover": cover_data}}
         )
         
         return {
             "success": True,
-            "cover_image_base64": image_base64
+            "cover_image_id": str(image_id),
+            "cover_image_url": image_url(str(image_id), current_user["_id"])
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading cover image: {str(e)}")
 
-@app.post("/api/ebooks/create")
-async def create_ebook(ebook_data: EbookCreate, current_user = Depends(get_current_user)):
-    ebook_id = f"ebook_{datetime.utcnow().timestamp()}".replace(".", "_")
-    
-    # Enrich preface, acknowledgments, about_author with AI if provided
-    enriched_preface = ebook_data.preface
-    enriched_acknowledgments = ebook_data.acknowledgments
-    enriched_about_author = ebook_data.about_author
-    
-    # Enrich preface with AI
-    if ebook_data.preface and len(ebook_data.preface) > 10:
-        try:
-            preface_prompt = f"""Tu es un écrivain professionnel spécialisé dans la rédaction de préfaces.
+def build_preface_prompt(ebook_data: EbookCreate) -> str:
+    return f"""Tu es un écrivain professionnel spécialisé dans la rédaction de préfaces.
 
 CONTEXTE DU LIVRE :
 - Titre : {ebook_data.title}
 - Auteur : {ebook_data.author}
 - Genre : {ebook_data.genre}
-- Description : {ebook_data.description}
+- Description : {trim_field("description", ebook_data.description)}
 - Ton : {ebook_data.tone}
 
 PRÉFACE FOURNIE PAR L'AUTEUR (à enrichir) :
-{ebook_data.preface}
+{trim_field("preface", ebook_data.preface)}
 
 MISSION : Enrichis cette préface en te mettant à la place de l'auteur. Ajoute :
 1. Une introduction captivante
@@ -915,29 +1202,15 @@ Langage : 100% français
 
 Réponds UNIQUEMENT avec le texte enrichi de la préface."""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"preface_{ebook_id}",
-                system_message="Tu es un écrivain professionnel."
-            ).with_model("openai", "gpt-4o-mini")
-            
-            response = await chat.send_message(UserMessage(text=preface_prompt))
-            enriched_preface = response.strip()
-        except Exception as e:
-            print(f"Error enriching preface: {e}")
-            # Keep original if error
-    
-    # Enrich acknowledgments with AI
-    if ebook_data.acknowledgments and len(ebook_data.acknowledgments) > 10:
-        try:
-            ack_prompt = f"""Tu es un écrivain professionnel spécialisé dans les remerciements.
+def build_acknowledgments_prompt(ebook_data: EbookCreate) -> str:
+    return f"""Tu es un écrivain professionnel spécialisé dans les remerciements.
 
 CONTEXTE DU LIVRE :
 - Titre : {ebook_data.title}
 - Auteur : {ebook_data.author}
 
 REMERCIEMENTS FOURNIS PAR L'AUTEUR (à enrichir) :
-{ebook_data.acknowledgments}
+{trim_field("acknowledgments", ebook_data.acknowledgments)}
 
 MISSION : Enrichis ces remerciements en te mettant à la place de l'auteur. Ajoute :
 1. Une introduction chaleureuse
@@ -953,21 +1226,8 @@ Langage : 100% français
 
 Réponds UNIQUEMENT avec le texte enrichi des remerciements."""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"ack_{ebook_id}",
-                system_message="Tu es un écrivain professionnel."
-            ).with_model("openai", "gpt-4o-mini")
-            
-            response = await chat.send_message(UserMessage(text=ack_prompt))
-            enriched_acknowledgments = response.strip()
-        except Exception as e:
-            print(f"Error enriching acknowledgments: {e}")
-    
-    # Enrich about_author with AI
-    if ebook_data.about_author and len(ebook_data.about_author) > 10:
-        try:
-            author_prompt = f"""Tu es un rédacteur professionnel spécialisé dans les biographies d'auteurs.
+def build_about_author_prompt(ebook_data: EbookCreate) -> str:
+    return f"""Tu es un rédacteur professionnel spécialisé dans les biographies d'auteurs.
 
 CONTEXTE :
 - Nom de l'auteur : {ebook_data.author}
@@ -975,7 +1235,7 @@ CONTEXTE :
 - Genre : {ebook_data.genre}
 
 BIOGRAPHIE FOURNIE (à enrichir) :
-{ebook_data.about_author}
+{trim_field("about_author", ebook_data.about_author)}
 
 MISSION : Enrichis cette biographie de l'auteur. Ajoute :
 1. Une introduction professionnelle
@@ -991,20 +1251,60 @@ Langage : 100% français
 
 Réponds UNIQUEMENT avec le texte enrichi "À propos de l'auteur"."""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"author_{ebook_id}",
-                system_message="Tu es un rédacteur professionnel."
-            ).with_model("openai", "gpt-4o-mini")
-            
-            response = await chat.send_message(UserMessage(text=author_prompt))
-            enriched_about_author = response.strip()
+# field -> (prompt builder, session prefix, system message)
+FRONT_MATTER_ENRICHMENTS = {
+    "preface": (build_preface_prompt, "preface", "Tu es un écrivain professionnel."),
+    "acknowledgments": (build_acknowledgments_prompt, "ack", "Tu es un écrivain professionnel."),
+    "about_author": (build_about_author_prompt, "author", "Tu es un rédacteur professionnel.")
+}
+
+def front_matter_to_enrich(ebook_data: EbookCreate) -> List[str]:
+    """Front matter fields worth enriching (texts longer than 10 characters)"""
+    return [
+        field for field in FRONT_MATTER_ENRICHMENTS
+        if getattr(ebook_data, field) and len(getattr(ebook_data, field)) > 10
+    ]
+
+async def enrich_front_matter(
+    ebook_id: str,
+    ebook_data: EbookCreate,
+    user_id: str,
+    job: Optional[JobContext] = None
+) -> Dict[str, Optional[str]]:
+    """
+    Enrich preface, acknowledgments and about_author with AI, concurrently
+    
+    If an enrichment fails the author's original text is kept.
+    """
+    fields = front_matter_to_enrich(ebook_data)
+    
+    async def enrich(field):
+        build_prompt, session, system_message = FRONT_MATTER_ENRICHMENTS[field]
+        enriched = getattr(ebook_data, field)
+        try:
+            response = await llm.complete(
+                session_prefix=f"{session}_{ebook_id}",
+                user_id=user_id,
+                system_message=system_message,
+                prompt=build_prompt(ebook_data),
+                max_tokens=output_tokens("front_matter")
+            )
+            enriched = response.strip()
         except Exception as e:
-            print(f"Error enriching about_author: {e}")
+            print(f"Error enriching {field}: {e}")
+            # Keep original if error
+        if job:
+            await job.complete_step(field, enriched)
+        return enriched
     
-    ebook = {
+    front_matter = {field: getattr(ebook_data, field) for field in FRONT_MATTER_ENRICHMENTS}
+    front_matter.update(zip(fields, await asyncio.gather(*(enrich(field) for field in fields))))
+    return front_matter
+
+def build_ebook_document(ebook_id: str, ebook_data: EbookCreate, user_id: str, front_matter: Dict[str, Optional[str]]) -> dict:
+    return {
         "_id": ebook_id,
-        "user_id": current_user["_id"],
+        "user_id": user_id,
         "author": ebook_data.author,
         "title": ebook_data.title,
         "tone": ebook_data.tone,
@@ -1013,15 +1313,27 @@ Réponds UNIQUEMENT avec le texte enrichi "À propos de l'auteur"."""
         "chapters_count": ebook_data.chapters_count,
         "length": ebook_data.length,
         "genre": ebook_data.genre,
-        "about_author": enriched_about_author,
-        "acknowledgments": enriched_acknowledgments,
-        "preface": enriched_preface,
+        "about_author": front_matter["about_author"],
+        "acknowledgments": front_matter["acknowledgments"],
+        "preface": front_matter["preface"],
         "toc": [],
         "chapters": [],
         "status": "draft",
         "created_at": datetime.utcnow().isoformat()
     }
-    ebooks_collection.insert_one(ebook)
+
+async def run_create_ebook(ebook_id: str, ebook_data: EbookCreate, user_id: str, job: Optional[JobContext] = None) -> dict:
+    """Enrich the front matter with AI and insert the draft ebook"""
+    if job:
+        await job.set_steps(front_matter_to_enrich(ebook_data) + ["insert"])
+    
+    # Enrich preface, acknowledgments, about_author with AI if provided
+    front_matter = await enrich_front_matter(ebook_id, ebook_data, user_id, job)
+    
+    ebook = build_ebook_document(ebook_id, ebook_data, user_id, front_matter)
+    await ebooks_collection.insert_one(ebook)
+    if job:
+        await job.complete_step("insert")
     
     return {
         "success": True,
@@ -1029,25 +1341,152 @@ Réponds UNIQUEMENT avec le texte enrichi "À propos de l'auteur"."""
         "ebook": ebook
     }
 
+async def run_enrich_draft(ebook_id: str, ebook_data: EbookCreate, user_id: str, job: Optional[JobContext] = None) -> dict:
+    """Fill in the enriched front matter of a draft inserted in fast mode"""
+    if job:
+        await job.set_steps(front_matter_to_enrich(ebook_data))
+    
+    front_matter = await enrich_front_matter(ebook_id, ebook_data, user_id, job)
+    await ebooks_collection.update_one(
+        {"_id": ebook_id},
+        {"$set": {**front_matter, "front_matter_status": "enriched"}}
+    )
+    
+    return {
+        "success": True,
+        "ebook_id": ebook_id,
+        **front_matter
+    }
+
+@app.post("/api/ebooks/create")
+async def create_ebook(
+    ebook_data: EbookCreate,
+    background: bool = False,
+    fast: bool = False,
+    current_user = Depends(get_current_user)
+):
+    """
+    Create a draft ebook, enriching its front matter with AI
+    
+    With fast=true the draft is inserted right away with the author's texts and
+    the enriched versions are filled in by a background job (job_id in the response).
+    """
+    ebook_id = f"ebook_{datetime.utcnow().timestamp()}".replace(".", "_")
+    
+    if fast:
+        raw_front_matter = {field: getattr(ebook_data, field) for field in FRONT_MATTER_ENRICHMENTS}
+        ebook = build_ebook_document(ebook_id, ebook_data, current_user["_id"], raw_front_matter)
+        ebook["front_matter_status"] = "enriching"
+        await ebooks_collection.insert_one(ebook)
+        
+        job_id = await job_manager.submit(
+            "enrich_front_matter",
+            current_user["_id"],
+            lambda job: run_enrich_draft(ebook_id, ebook_data, current_user["_id"], job),
+            ebook_id=ebook_id
+        )
+        return {
+            "success": True,
+            "ebook_id": ebook_id,
+            "ebook": ebook,
+            "job_id": job_id
+        }
+    
+    if background:
+        job_id = await job_manager.submit(
+            "create_ebook",
+            current_user["_id"],
+            lambda job: run_create_ebook(ebook_id, ebook_data, current_user["_id"], job),
+            ebook_id=ebook_id
+        )
+        return job_accepted(job_id, ebook_id=ebook_id)
+    
+    return await run_create_ebook(ebook_id, ebook_data, current_user["_id"])
+
+# Champs d'une carte du tableau de bord : ni texte des chapitres ni images
+EBOOK_SUMMARY_FIELDS = {
+    "title": "$title",
+    "author": "$author",
+    "description": "$description",
+    "status": "$status",
+    "length": "$length",
+    "chapters_count": "$chapters_count",
+    "chapters_written": {"$size": {"$ifNull": ["$chapters", []]}},
+    "illustrated_chapters": {"$size": {"$ifNull": ["$illustrations", []]}},
+    "generation_status": "$generation.status",
+    "cover_image_id": "$cover.cover_image_id",
+    "created_at": "$created_at",
+    "completed_at": "$completed_at"
+}
+EBOOK_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+
+def ebook_list_projection(fields: Optional[str]) -> Dict[str, Any]:
+    """Summary projection, or the comma-separated `fields` (summary names or document paths)"""
+    if not fields:
+        return dict(EBOOK_SUMMARY_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    invalid = [name for name in names if not EBOOK_FIELD_NAME.match(name) or name.startswith("_")]
+    if invalid or not names:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(invalid) or fields}")
+    return {name: EBOOK_SUMMARY_FIELDS.get(name, 1) for name in names}
+
 @app.get("/api/ebooks/list")
-async def list_ebooks(current_user = Depends(get_current_user)):
-    ebooks = list(ebooks_collection.find({"user_id": current_user["_id"]}).sort("created_at", -1))
-    return {"ebooks": ebooks}
+async def list_ebooks(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """
+    List the user's ebooks, most recent first, as lightweight summaries
+    
+    Keyset pagination: pass the returned `next_cursor` to get the following page
+    (null on the last page). `fields=title,status,...` replaces the summary by the
+    given summary names or document fields.
+    """
+    match = {"user_id": current_user["_id"]}
+    if cursor:
+        try:
+            created_at, ebook_id = decode_list_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # (created_at, _id) départage les livres créés au même instant
+        match["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": ebook_id}}
+        ]
+    
+    projection = ebook_list_projection(fields)
+    # created_at est toujours lu pour construire le curseur suivant
+    projection.setdefault("created_at", 1)
+    ebooks = await ebooks_collection.aggregate([
+        {"$match": match},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": projection}
+    ]).to_list(length=None)
+    
+    next_cursor = encode_list_cursor(ebooks[limit - 1]) if len(ebooks) > limit else None
+    ebooks = ebooks[:limit]
+    for ebook in ebooks:
+        if ebook.get("cover_image_id"):
+            ebook["cover_url"] = image_url(ebook["cover_image_id"], current_user["_id"])
+    return {"ebooks": ebooks, "next_cursor": next_cursor}
 
 @app.get("/api/ebooks/{ebook_id}")
 async def get_ebook(ebook_id: str, current_user = Depends(get_current_user)):
-    ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+    ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
     if not ebook:
         raise HTTPException(status_code=404, detail="Ebook not found")
-    return ebook
+    return with_image_urls(ebook, current_user["_id"])
 
 @app.post("/api/ebooks/{ebook_id}/save-toc")
 async def save_toc(ebook_id: str, toc_data: dict, current_user = Depends(get_current_user)):
-    ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+    ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
     if not ebook:
         raise HTTPException(status_code=404, detail="Ebook not found")
     
-    ebooks_collection.update_one(
+    await ebooks_collection.update_one(
         {"_id": ebook_id},
         {"$set": {"toc": toc_data.get("toc", [])}}
     )
@@ -1061,22 +1500,16 @@ class GenerateLegalPagesRequest(BaseModel):
     edition: Optional[str] = "Première édition"
     year: Optional[int] = None
 
-@app.post("/api/ebooks/generate-legal-pages")
-async def generate_legal_pages(request: GenerateLegalPagesRequest, current_user = Depends(get_current_user)):
-    """Generate legal pages (copyright, mentions légales, ISBN) for the ebook"""
-    try:
-        ebook_id = request.ebook_id
-        # Get ebook
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
-        if not ebook:
-            raise HTTPException(status_code=404, detail="Ebook not found")
-        
-        # Determine year
-        year = request.year if request.year else datetime.now(timezone.utc).year
-        publisher = request.publisher if request.publisher else "Édition Indépendante"
-        
-        # Generate legal pages content using AI
-        prompt = f"""Tu es un expert juridique et éditorial spécialisé dans la création de pages légales pour les livres.
+async def run_generate_legal_pages(ebook: dict, request: GenerateLegalPagesRequest) -> dict:
+    """Generate the legal pages of an ebook and attach them to it"""
+    ebook_id = ebook['_id']
+    
+    # Determine year
+    year = request.year if request.year else datetime.now(timezone.utc).year
+    publisher = request.publisher if request.publisher else "Édition Indépendante"
+    
+    # Generate legal pages content using AI
+    prompt = f"""Tu es un expert juridique et éditorial spécialisé dans la création de pages légales pour les livres.
 
 INFORMATIONS DU LIVRE :
 - Titre : {ebook['title']}
@@ -1127,33 +1560,36 @@ EXIGENCES :
 
 Réponds UNIQUEMENT avec le JSON."""
 
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"legal_{ebook_id}_{datetime.now(timezone.utc).timestamp()}",
-            system_message="Tu es un expert juridique et éditorial spécialisé dans les pages légales de livres."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        # Clean and parse response
-        import json
-        clean_response = response.strip()
-        if clean_response.startswith("```json"):
-            clean_response = clean_response[7:]
-        if clean_response.startswith("```"):
-            clean_response = clean_response[3:]
-        if clean_response.endswith("```"):
-            clean_response = clean_response[:-3]
-        clean_response = clean_response.strip()
-        
-        legal_data = json.loads(clean_response)
-        
-        # Save legal pages to ebook
-        ebooks_collection.update_one(
-            {"_id": ebook_id},
-            {"$set": {"legal_pages": legal_data}}
-        )
+    response = await llm.complete(
+        session_prefix=f"legal_{ebook_id}",
+        user_id=ebook['user_id'],
+        system_message="Tu es un expert juridique et éditorial spécialisé dans les pages légales de livres.",
+        prompt=prompt,
+        validate=parse_llm_json,
+        max_tokens=output_tokens("legal_pages")
+    )
+    
+    # Parse response
+    legal_data = parse_llm_json(response)
+    
+    # Save legal pages to ebook
+    await ebooks_collection.update_one(
+        {"_id": ebook_id},
+        {"$set": {"legal_pages": legal_data}}
+    )
+    return legal_data
+
+@app.post("/api/ebooks/generate-legal-pages")
+async def generate_legal_pages(request: GenerateLegalPagesRequest, current_user = Depends(get_current_user)):
+    """Generate legal pages (copyright, mentions légales, ISBN) for the ebook"""
+    try:
+        ebook_id = request.ebook_id
+        # Get ebook
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        if not ebook:
+            raise HTTPException(status_code=404, detail="Ebook not found")
+        
+        legal_data = await run_generate_legal_pages(ebook, request)
         
         return {
             "success": True,
@@ -1170,7 +1606,7 @@ async def update_legal_pages(
 ):
     """Update legal pages manually"""
     try:
-        ebook = ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
@@ -1179,7 +1615,7 @@ async def update_legal_pages(
         legal_pages['copyright_page'] = request.copyright_page
         legal_pages['legal_mentions'] = request.legal_mentions
         
-        ebooks_collection.update_one(
+        await ebooks_collection.update_one(
             {"_id": request.ebook_id},
             {"$set": {"legal_pages": legal_pages}}
         )
@@ -1192,25 +1628,19 @@ async def update_legal_pages(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating legal pages: {str(e)}")
 
-@app.post("/api/ebooks/generate-visual-theme")
-async def generate_visual_theme(request: GenerateVisualThemeRequest, current_user = Depends(get_current_user)):
-    """Generate visual theme (colors, fonts, styles) for the ebook using AI"""
-    try:
-        ebook_id = request.ebook_id
-        # Get ebook
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
-        if not ebook:
-            raise HTTPException(status_code=404, detail="Ebook not found")
-        
-        # Generate theme using AI
-        prompt = f"""Tu es un designer graphique expert spécialisé dans la conception de livres numériques et imprimés.
+async def run_generate_visual_theme(ebook: dict) -> dict:
+    """Generate the visual theme of an ebook and attach it to it"""
+    ebook_id = ebook['_id']
+    
+    # Generate theme using AI
+    prompt = f"""Tu es un designer graphique expert spécialisé dans la conception de livres numériques et imprimés.
 
 INFORMATIONS DU LIVRE :
 - Titre : {ebook['title']}
 - Auteur : {ebook['author']}
 - Ton : {ebook['tone']}
 - Public cible : {', '.join(ebook['target_audience'])}
-- Description : {ebook['description']}
+- Description : {trim_field("description", ebook['description'])}
 
 MISSION : Crée un thème visuel professionnel et cohérent pour ce livre qui inclut :
 
@@ -1270,33 +1700,36 @@ EXIGENCES :
 
 Réponds UNIQUEMENT avec le JSON."""
 
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"theme_{ebook_id}_{datetime.now(timezone.utc).timestamp()}",
-            system_message="Tu es un designer graphique expert spécialisé dans la conception de livres."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        # Clean and parse response
-        import json
-        clean_response = response.strip()
-        if clean_response.startswith("```json"):
-            clean_response = clean_response[7:]
-        if clean_response.startswith("```"):
-            clean_response = clean_response[3:]
-        if clean_response.endswith("```"):
-            clean_response = clean_response[:-3]
-        clean_response = clean_response.strip()
-        
-        theme_data = json.loads(clean_response)
-        
-        # Save theme to ebook
-        ebooks_collection.update_one(
-            {"_id": ebook_id},
-            {"$set": {"visual_theme": theme_data}}
-        )
+    response = await llm.complete(
+        session_prefix=f"theme_{ebook_id}",
+        user_id=ebook['user_id'],
+        system_message="Tu es un designer graphique expert spécialisé dans la conception de livres.",
+        prompt=prompt,
+        validate=parse_llm_json,
+        max_tokens=output_tokens("visual_theme")
+    )
+    
+    # Parse response
+    theme_data = parse_llm_json(response)
+    
+    # Save theme to ebook
+    await ebooks_collection.update_one(
+        {"_id": ebook_id},
+        {"$set": {"visual_theme": theme_data}}
+    )
+    return theme_data
+
+@app.post("/api/ebooks/generate-visual-theme")
+async def generate_visual_theme(request: GenerateVisualThemeRequest, current_user = Depends(get_current_user)):
+    """Generate visual theme (colors, fonts, styles) for the ebook using AI"""
+    try:
+        ebook_id = request.ebook_id
+        # Get ebook
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        if not ebook:
+            raise HTTPException(status_code=404, detail="Ebook not found")
+        
+        theme_data = await run_generate_visual_theme(ebook)
         
         return {
             "success": True,
@@ -1306,13 +1739,239 @@ Réponds UNIQUEMENT avec le JSON."""
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating visual theme: {str(e)}")
 
+def is_valid_illustration_plan(plan: Any) -> bool:
+    """Check a plan against the {"chapter_number", "images": [{"dalle_prompt", ...}]} schema"""
+    if not isinstance(plan, dict) or not isinstance(plan.get('chapter_number'), int):
+        return False
+    images = plan.get('images')
+    if not isinstance(images, list) or not 1 <= len(images) <= 2:
+        return False
+    return all(isinstance(image, dict) and isinstance(image.get('dalle_prompt'), str) and image['dalle_prompt'].strip() for image in images)
+
+async def plan_chapter_illustrations(ebook: dict, chapter: Dict[str, Any]) -> Dict[str, Any]:
+    """Ask the LLM for the DALL-E prompts of one chapter"""
+    ebook_id = ebook['_id']
+    chapter_num = chapter.get('number', 0)
+    chapter_title = chapter.get('title', '')
+    chapter_desc = chapter.get('description', '')
+    chapter_content = chapter.get('content', '')[:500]  # First 500 chars for context
+    
+    # AI generates image prompts for DALL-E
+    system_message, prompt = render_prompt(
+        "illustration_plan_chapter",
+        ebook,
+        chapter_number=chapter_num,
+        chapter_title=chapter_title,
+        chapter_description=trim_field("chapter_description", chapter_desc),
+        excerpt=chapter_content[:200]
+    )
+
+    response = await llm.complete(
+        session_prefix=f"illust_{ebook_id}_{chapter_num}",
+        user_id=ebook['user_id'],
+        system_message=system_message,
+        prompt=prompt,
+        validate=parse_llm_json,
+        priority=PRIORITY_BULK,
+        max_tokens=illustration_plan_output_tokens()
+    )
+    
+    # Parse response
+    chapter_illust = parse_llm_json(response)
+    chapter_illust['chapter_number'] = chapter_num
+    
+    return chapter_illust
+
+async def plan_book_illustrations(ebook: dict, chapters: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Ask the LLM for the DALL-E prompts of several chapters in a single request
+    
+    Chapters missing from the answer or not matching the schema are planned
+    one by one with plan_chapter_illustrations.
+    
+    Returns:
+        dict of chapter number -> {"chapter_number", "images": [...]}
+    """
+    # Le contexte grandit avec le nombre de chapitres : son budget total est partagé entre eux
+    share = context_share("illustration_plan_book", len(chapters))
+    excerpt_chars = min(200, int(share / 2 * CHARS_PER_TOKEN))
+    chapters_context = "\n\n".join(
+        f"""CHAPITRE {chapter.get('number', 0)} :
+- Titre : {chapter.get('title', '')}
+- Description : {trim_to_tokens(trim_field("chapter_description", chapter.get('description', '')), share // 2)}
+- Extrait : {chapter.get('content', '')[:excerpt_chars]}..."""
+        for chapter in chapters
+    )
+    
+    system_message, prompt = render_prompt("illustration_plan_book", ebook, chapters_context=chapters_context)
+    
+    plans = {}
+    try:
+        response = await llm.complete(
+            session_prefix=f"illust_plan_{ebook['_id']}",
+            user_id=ebook['user_id'],
+            system_message=system_message,
+            prompt=prompt,
+            validate=parse_llm_json,
+            priority=PRIORITY_BULK,
+            max_tokens=illustration_plan_output_tokens(len(chapters))
+        )
+        for plan in parse_llm_json(response).get('chapters', []):
+            if is_valid_illustration_plan(plan):
+                plans[plan['chapter_number']] = plan
+    except Exception as e:
+        print(f"Batched illustration planning failed, planning chapter by chapter: {e}")
+    
+    missing = [chapter for chapter in chapters if chapter.get('number', 0) not in plans]
+    if missing:
+        fallback_plans = await asyncio.gather(*(plan_chapter_illustrations(ebook, chapter) for chapter in missing))
+        for chapter, plan in zip(missing, fallback_plans):
+            plans[chapter.get('number', 0)] = plan
+    
+    return plans
+
+async def render_illustration(ebook: dict, chapter_num: int, image_item: Dict[str, Any]):
+    """Generate one DALL-E image, store it in GridFS and record it (or its error) on image_item"""
+    ebook_id = ebook['_id']
+    dalle_prompt = image_item.get('dalle_prompt', '')
+    
+    try:
+        # Generate image with DALL-E
+        print(f"Generating DALL-E image for chapter {chapter_num} with prompt: {dalle_prompt[:100]}...")
+        
+        image_bytes = await llm.generate_image(dalle_prompt, user_id=ebook['user_id'], priority=PRIORITY_BULK)
+        
+        print(f"DALL-E response received, image generated: {bool(image_bytes)}")
+        
+        if image_bytes:
+            # Store image in GridFS
+            image_id = await repository.put_file(
+                image_bytes,
+                filename=f"ebook_{ebook_id}_ch{chapter_num}_{datetime.now(timezone.utc).timestamp()}.png",
+                content_type="image/png",
+                metadata={
+                    "ebook_id": ebook_id,
+                    "chapter_number": chapter_num,
+                    "dalle_prompt": dalle_prompt,
+                    "generated_at": datetime.now(timezone.utc).isoformat()
+                }
+            )
+            
+            # Add to image item
+            image_item['image_id'] = str(image_id)
+            image_item['image_source'] = 'dall-e'
+            
+            print(f"Image successfully generated and stored for chapter {chapter_num}")
+            
+        else:
+            error_msg = "No image was generated by DALL-E"
+            print(f"ERROR: {error_msg}")
+            image_item['error'] = error_msg
+            
+    except Exception as img_error:
+        error_msg = f"Error generating DALL-E image: {str(img_error)}"
+        print(error_msg)
+        import traceback
+        traceback.print_exc()
+        image_item['error'] = str(img_error)
+
+async def render_chapter_illustrations(
+    ebook: dict,
+    chapter_illust: Dict[str, Any],
+    image_slots: Optional[asyncio.Semaphore] = None
+) -> Dict[str, Any]:
+    """Generate the DALL-E images of a planned chapter concurrently"""
+    chapter_num = chapter_illust.get('chapter_number', 0)
+    image_slots = image_slots or asyncio.Semaphore(ILLUSTRATION_CONCURRENCY)
+    
+    async def render(image_item):
+        async with image_slots:
+            await render_illustration(ebook, chapter_num, image_item)
+    
+    await asyncio.gather(*(render(image_item) for image_item in chapter_illust.get('images', [])))
+    return chapter_illust
+
+async def run_generate_illustrations(
+    ebook: dict,
+    job: Optional[JobContext] = None,
+    planning: str = "batch"
+) -> dict:
+    """
+    Generate and save the illustrations of every regular chapter
+    
+    All image prompts of the book are submitted at once, ILLUSTRATION_CONCURRENCY
+    images being rendered at the same time.
+    
+    Args:
+        planning: "batch" plans the prompts of the whole book in one LLM request,
+            "per_chapter" asks for them chapter by chapter
+    """
+    chapters = [chapter for chapter in ebook.get('chapters', []) if chapter.get('type', 'chapter') == 'chapter']
+    if job:
+        await job.set_steps(["planning"] + [f"chapter_{chapter.get('number', 0)}" for chapter in chapters])
+        await job.start_step("planning")
+    
+    if planning == "batch":
+        plans = await plan_book_illustrations(ebook, chapters)
+    else:
+        plans = {}
+        for chapter in chapters:
+            plans[chapter.get('number', 0)] = await plan_chapter_illustrations(ebook, chapter)
+    if job:
+        await job.complete_step("planning")
+    
+    # Generate illustrations for each chapter using AI
+    image_slots = asyncio.Semaphore(ILLUSTRATION_CONCURRENCY)
+    
+    async def illustrate(chapter):
+        step = f"chapter_{chapter.get('number', 0)}"
+        if job:
+            await job.start_step(step)
+        try:
+            chapter_illust = await render_chapter_illustrations(ebook, plans[chapter.get('number', 0)], image_slots)
+        except Exception as e:
+            if job:
+                await job.fail_step(step, str(e))
+            raise
+        if job:
+            await job.complete_step(step, chapter_illust)
+        return chapter_illust
+    
+    illustrations_data = list(await asyncio.gather(*(illustrate(chapter) for chapter in chapters)))
+    
+    # Save illustrations to ebook
+    await ebooks_collection.update_one(
+        {"_id": ebook['_id']},
+        {"$set": {"illustrations": illustrations_data}}
+    )
+    
+    return {
+        "success": True,
+        "illustrations": illustrations_data
+    }
+
+async def generate_illustrations_once(ebook_id: str, run: Callable[[], Awaitable[dict]], planning: str) -> dict:
+    """Run an illustration generation, or attach to the one already running for this ebook with the same planning"""
+    async def load_result() -> dict:
+        ebook = await ebooks_collection.find_one({"_id": ebook_id}, {"illustrations": 1})
+        return {"success": True, "illustrations": ebook.get('illustrations', [])}
+    
+    try:
+        return await single_flight.run(f"generate_illustrations:{ebook_id}", run, load_result, {"planning": planning})
+    except SingleFlightConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.post("/api/ebooks/generate-illustrations")
-async def generate_illustrations(request: GenerateIllustrationsRequest, current_user = Depends(get_current_user)):
+async def generate_illustrations(
+    request: GenerateIllustrationsRequest,
+    background: bool = False,
+    current_user = Depends(get_current_user)
+):
     """Generate illustrations for each chapter using AI and DALL-E (OpenAI)"""
     try:
         ebook_id = request.ebook_id
         # Get ebook
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
@@ -1320,162 +1979,223 @@ async def generate_illustrations(request: GenerateIllustrationsRequest, current_
         if not chapters:
             raise HTTPException(status_code=400, detail="Generate content first before illustrations")
         
-        # Initialize DALL-E image generator
-        image_gen = OpenAIImageGeneration(api_key=EMERGENT_LLM_KEY)
+        if background:
+            job_id = await job_manager.submit(
+                "generate_illustrations",
+                current_user["_id"],
+                lambda job: generate_illustrations_once(
+                    ebook_id,
+                    lambda: run_generate_illustrations(ebook, job, request.planning),
+                    planning=request.planning
+                ),
+                ebook_id=ebook_id
+            )
+            return job_accepted(job_id)
         
-        # Generate illustrations for each chapter using AI
-        illustrations_data = []
+        return with_image_urls(await generate_illustrations_once(
+            ebook_id,
+            lambda: run_generate_illustrations(ebook, planning=request.planning),
+            planning=request.planning
+        ), current_user["_id"])
         
-        for chapter in chapters:
-            chapter_num = chapter.get('number', 0)
-            chapter_title = chapter.get('title', '')
-            chapter_desc = chapter.get('description', '')
-            chapter_content = chapter.get('content', '')[:500]  # First 500 chars for context
-            chapter_type = chapter.get('type', 'chapter')
-            
-            # Skip for introduction/conclusion or limit to regular chapters
-            if chapter_type not in ['chapter']:
-                continue
-            
-            # AI generates image prompts for DALL-E
-            prompt = f"""Tu es un expert en génération de prompts pour DALL-E (génération d'images IA).
-
-CHAPITRE À ILLUSTRER :
-- Numéro : {chapter_num}
-- Titre : {chapter_title}
-- Description : {chapter_desc}
-- Extrait : {chapter_content[:200]}...
-- Livre : {ebook['title']} (Ton: {ebook['tone']})
-
-MISSION : Génère 1-2 prompts DALL-E en ANGLAIS pour créer des illustrations qui :
-1. **Reflètent visuellement** le contenu et l'émotion du chapitre
-2. **Sont artistiques** et esthétiquement agréables (style photo réaliste, illustration digitale, art conceptuel)
-3. **Conviennent à un ebook** (pas de texte dans l'image, composition équilibrée)
-4. **Restent appropriées** au ton {ebook['tone']} et au public cible
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating illustrations: {str(e)}")
 
-Pour chaque prompt, fournis aussi une description ALT en français pour l'accessibilité.
 
-Format de réponse (JSON strict) :
-{{
-  "chapter_number": {chapter_num},
-  "images": [
-    {{
-      "dalle_prompt": "Detailed English prompt for DALL-E (ex: A serene landscape showing meditation in nature, soft lighting, peaceful atmosphere, digital art style)",
-      "alt_text": "Description accessible en français (ex: Paysage serein montrant une personne en méditation dans la nature)",
-      "placement": "Suggestion de placement (ex: Au début du chapitre, Après la section principale)"
-    }}
-  ]
-}}
-
-CONTRAINTES CRITIQUES :
-- Maximum 2 images par chapitre (DALL-E est coûteux)
-- Prompts en ANGLAIS, détaillés et descriptifs (50-100 mots)
-- Alt text en FRANÇAIS, accessible
-- Style cohérent avec le thème du livre
-- PAS de texte/mots dans les images générées
-- Mentionner le style artistique souhaité (photo, illustration, art digital, etc.)
+# Graphe de production d'un livre : étape -> étapes dont elle dépend.
+# Seul le chemin TOC -> contenu -> illustrations est séquentiel, le reste
+# ne dépend que des métadonnées du livre.
+PIPELINE_GRAPH = {
+    "create": [],
+    "front_matter": ["create"],
+    "toc": ["create"],
+    "content": ["toc"],
+    "illustrations": ["content"],
+    "cover": ["create"],
+    "cover_image": ["create"],
+    "legal_pages": ["create"],
+    "visual_theme": ["create"]
+}
+
+class PipelineRequest(BaseModel):
+    ebook: Optional[EbookCreate] = None
+    ebook_id: Optional[str] = None
+    skip: List[str] = []
+    publisher: Optional[str] = None
+    isbn: Optional[str] = None
+    edition: Optional[str] = "Première édition"
+    year: Optional[int] = None
+    illustration_planning: str = Field("batch", pattern="^(batch|per_chapter)$")
 
-Réponds UNIQUEMENT avec le JSON."""
+async def run_book_pipeline(
+    ebook_id: str,
+    request: PipelineRequest,
+    user_id: str,
+    skip: List[str],
+    job: Optional[JobContext] = None
+) -> dict:
+    """Run the steps of PIPELINE_GRAPH on one ebook, reporting each node as a job step"""
+    async def load() -> dict:
+        # Chaque étape relit le livre pour voir le travail des étapes précédentes
+        ebook = await ebooks_collection.find_one({"_id": ebook_id})
+        if not ebook:
+            raise HTTPException(status_code=404, detail="Ebook not found")
+        return ebook
+    
+    async def create():
+        # Le brouillon est inséré tout de suite, l'enrichissement est une étape à part
+        raw_front_matter = {field: getattr(request.ebook, field) for field in FRONT_MATTER_ENRICHMENTS}
+        ebook = build_ebook_document(ebook_id, request.ebook, user_id, raw_front_matter)
+        if "front_matter" not in skip:
+            ebook["front_matter_status"] = "enriching"
+        await ebooks_collection.insert_one(ebook)
+        return {"ebook_id": ebook_id}
+    
+    async def front_matter():
+        await run_enrich_draft(ebook_id, request.ebook, user_id)
+        return {"enriched": front_matter_to_enrich(request.ebook)}
+    
+    async def toc():
+        ebook = await load()
+        toc_request = GenerateTOC(
+            author=ebook['author'],
+            title=ebook['title'],
+            tone=ebook['tone'],
+            target_audience=ebook['target_audience'],
+            description=ebook['description'],
+            chapters_count=ebook['chapters_count'],
+            length=ebook['length']
+        )
+        toc_entries = await run_generate_toc(toc_request, user_id)
+        await ebooks_collection.update_one({"_id": ebook_id}, {"$set": {"toc": toc_entries}})
+        return {"chapters": len(toc_entries)}
+    
+    async def content():
+        ebook = await load()
+        if not ebook.get('toc'):
+            raise ValueError("No table of contents to generate content from")
+        result = await generate_content_once(
+            ebook_id,
+            lambda: run_generate_content(ebook, ebook['toc']),
+            toc=ebook['toc']
+        )
+        return {"chapters": len(result["chapters"])}
+    
+    async def illustrations():
+        ebook = await load()
+        if not ebook.get('chapters'):
+            raise ValueError("Generate content first before illustrations")
+        result = await generate_illustrations_once(
+            ebook_id,
+            lambda: run_generate_illustrations(ebook, planning=request.illustration_planning),
+            planning=request.illustration_planning
+        )
+        return {"chapters": len(result["illustrations"])}
+    
+    async def cover():
+        return await run_generate_cover(await load())
+    
+    async def cover_image():
+        await run_generate_cover_image(await load())
+        return {"generated": True}
+    
+    async def legal_pages():
+        legal_request = GenerateLegalPagesRequest(
+            ebook_id=ebook_id,
+            publisher=request.publisher,
+            isbn=request.isbn,
+            edition=request.edition,
+            year=request.year
+        )
+        return await run_generate_legal_pages(await load(), legal_request)
+    
+    async def visual_theme():
+        return await run_generate_visual_theme(await load())
+    
+    steps = {
+        "create": create,
+        "front_matter": front_matter,
+        "toc": toc,
+        "content": content,
+        "illustrations": illustrations,
+        "cover": cover,
+        "cover_image": cover_image,
+        "legal_pages": legal_pages,
+        "visual_theme": visual_theme
+    }
+    scheduler = DagScheduler([PipelineNode(name, steps[name], deps) for name, deps in PIPELINE_GRAPH.items()])
+    
+    async def on_status(name: str, state: str, detail: Any):
+        if not job:
+            return
+        if state == "running":
+            await job.start_step(name)
+        elif state == "completed":
+            await job.complete_step(name, detail)
+        elif state == "failed":
+            await job.fail_step(name, detail)
+        else:
+            await job.skip_step(name, detail, state)
+    
+    if job:
+        await job.set_steps(scheduler.order)
+    nodes = await scheduler.run(skip, on_status)
+    
+    return {
+        "success": all(node["status"] in ("completed", "skipped") for node in nodes.values()),
+        "ebook_id": ebook_id,
+        "nodes": nodes
+    }
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"illust_{ebook_id}_{chapter_num}_{datetime.now(timezone.utc).timestamp()}",
-                system_message="Tu es un expert en génération de prompts pour DALL-E et illustration de contenu."
-            ).with_model("openai", "gpt-4o-mini")
-            
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
-            
-            # Parse AI response
-            import json
-            clean_response = response.strip()
-            if clean_response.startswith("```json"):
-                clean_response = clean_response[7:]
-            if clean_response.startswith("```"):
-                clean_response = clean_response[3:]
-            if clean_response.endswith("```"):
-                clean_response = clean_response[:-3]
-            clean_response = clean_response.strip()
-            
-            chapter_illust = json.loads(clean_response)
-            
-            # Generate images with DALL-E for each prompt
-            for image_item in chapter_illust.get('images', []):
-                dalle_prompt = image_item.get('dalle_prompt', '')
-                
-                try:
-                    # Generate image with DALL-E
-                    print(f"Generating DALL-E image for chapter {chapter_num} with prompt: {dalle_prompt[:100]}...")
-                    
-                    # Use sync call wrapped in executor to avoid async issues
-                    images = await asyncio.get_event_loop().run_in_executor(
-                        None,
-                        lambda: image_gen.generate_images(
-                            prompt=dalle_prompt,
-                            model="gpt-image-1",
-                            number_of_images=1
-                        )
-                    )
-                    
-                    print(f"DALL-E response received, images count: {len(images) if images else 0}")
-                    
-                    if images and len(images) > 0:
-                        # Convert image bytes to base64
-                        image_base64 = base64.b64encode(images[0]).decode('utf-8')
-                        
-                        # Store image in GridFS
-                        image_id = fs.put(
-                            images[0],
-                            filename=f"ebook_{ebook_id}_ch{chapter_num}_{datetime.now(timezone.utc).timestamp()}.png",
-                            content_type="image/png",
-                            metadata={
-                                "ebook_id": ebook_id,
-                                "chapter_number": chapter_num,
-                                "dalle_prompt": dalle_prompt,
-                                "generated_at": datetime.now(timezone.utc).isoformat()
-                            }
-                        )
-                        
-                        # Add to image item
-                        image_item['image_base64'] = image_base64
-                        image_item['image_id'] = str(image_id)
-                        image_item['image_source'] = 'dall-e'
-                        
-                        print(f"Image successfully generated and stored for chapter {chapter_num}")
-                        
-                    else:
-                        error_msg = "No image was generated by DALL-E"
-                        print(f"ERROR: {error_msg}")
-                        image_item['error'] = error_msg
-                        
-                except Exception as img_error:
-                    error_msg = f"Error generating DALL-E image: {str(img_error)}"
-                    print(error_msg)
-                    import traceback
-                    traceback.print_exc()
-                    image_item['error'] = str(img_error)
-            
-            illustrations_data.append(chapter_illust)
+@app.post("/api/ebooks/pipeline")
+async def book_pipeline(request: PipelineRequest, current_user = Depends(get_current_user)):
+    """
+    Produce a whole book in one background job
+    
+    Pass `ebook` to create a new book or `ebook_id` to complete an existing one
+    (create and front_matter are then skipped). Steps listed in `skip` are not run;
+    the per-step status is reported by GET /api/jobs/{job_id}.
+    """
+    try:
+        unknown = [name for name in request.skip if name not in PIPELINE_GRAPH]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown pipeline steps: {', '.join(unknown)}")
+        if bool(request.ebook) == bool(request.ebook_id):
+            raise HTTPException(status_code=400, detail="Provide either ebook or ebook_id")
+        if request.ebook and "create" in request.skip:
+            # Le brouillon ne serait jamais enregistré : toutes les étapes suivantes échoueraient
+            raise HTTPException(status_code=400, detail="The create step cannot be skipped for a new ebook")
+        
+        skip = list(request.skip)
+        if request.ebook_id:
+            ebook = await ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
+            if not ebook:
+                raise HTTPException(status_code=404, detail="Ebook not found")
+            ebook_id = request.ebook_id
+            skip += ["create", "front_matter"]
+        else:
+            ebook_id = f"ebook_{datetime.utcnow().timestamp()}".replace(".", "_")
         
-        # Save illustrations to ebook
-        ebooks_collection.update_one(
-            {"_id": ebook_id},
-            {"$set": {"illustrations": illustrations_data}}
+        job_id = await job_manager.submit(
+            "book_pipeline",
+            current_user["_id"],
+            lambda job: run_book_pipeline(ebook_id, request, current_user["_id"], skip, job),
+            ebook_id=ebook_id
         )
+        return job_accepted(job_id, ebook_id=ebook_id, steps=PIPELINE_GRAPH)
         
-        return {
-            "success": True,
-            "illustrations": illustrations_data
-        }
-        
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating illustrations: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error starting book pipeline: {str(e)}")
 
 @app.post("/api/ebooks/edit-chapter")
 async def edit_chapter(request: EditChapterRequest, current_user = Depends(get_current_user)):
     """Edit chapter content manually"""
     try:
-        ebook = ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
@@ -1485,6 +2205,7 @@ async def edit_chapter(request: EditChapterRequest, current_user = Depends(get_c
         for chapter in chapters:
             if chapter.get('number') == request.chapter_number:
                 chapter['content'] = request.new_content
+                chapter['summary'] = summarize(request.new_content)
                 chapter['edited_at'] = datetime.now(timezone.utc).isoformat()
                 chapter_found = True
                 break
@@ -1493,7 +2214,7 @@ async def edit_chapter(request: EditChapterRequest, current_user = Depends(get_c
             raise HTTPException(status_code=404, detail="Chapter not found")
         
         # Update ebook
-        ebooks_collection.update_one(
+        await ebooks_collection.update_one(
             {"_id": request.ebook_id},
             {"$set": {"chapters": chapters}}
         )
@@ -1506,11 +2227,42 @@ async def edit_chapter(request: EditChapterRequest, current_user = Depends(get_c
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error editing chapter: {str(e)}")
 
+def chapter_summary(chapter: Dict[str, Any]) -> str:
+    """Stored summary of a written chapter (computed for chapters written before summaries existed)"""
+    return chapter.get('summary') or summarize(chapter.get('content', ''))
+
+def build_regenerate_prompt(ebook: dict, chapter_to_regen: Dict[str, Any], chapter_index: int) -> Tuple[str, str]:
+    """Build the (system message, prompt) pair used to rewrite an existing chapter"""
+    # Regenerate content using same logic as original generation
+    chapter_type = chapter_to_regen.get('type', 'chapter')
+    chapters = ebook.get('chapters', [])
+    
+    # Le chapitre réécrit doit s'enchaîner avec ses voisins tels qu'ils sont écrits
+    neighbours_context = ""
+    if chapter_index > 0:
+        previous = chapters[chapter_index - 1]
+        neighbours_context += f"\n\nLIEN AVEC LE CHAPITRE PRÉCÉDENT :\nChapitre précédent '{previous['title']}' : {chapter_summary(previous)}\n→ Commence par une transition naturelle qui fait le pont entre ces idées."
+    if chapter_index < len(chapters) - 1:
+        following = chapters[chapter_index + 1]
+        neighbours_context += f"\n\nPRÉPARATION POUR LA SUITE :\nLe prochain chapitre ('{following['title']}') traite de : {chapter_summary(following)}\n→ Termine par une phrase qui crée le lien avec ce sujet."
+    
+    fields = {
+        "chapter_number": chapter_to_regen['number'],
+        "chapter_title": chapter_to_regen['title'],
+        "chapter_description": trim_field("chapter_description", chapter_to_regen.get('description', 'Développer ce thème'))
+    }
+    if chapter_type == 'chapter':
+        return render_prompt("chapter_regenerate", ebook, neighbours_context=neighbours_context, **fields)
+    
+    # For introduction or conclusion, use the generation prompt of that type
+    template = "chapter_introduction" if chapter_type == 'introduction' else "chapter_conclusion"
+    return render_prompt(template, ebook, transition_context=neighbours_context, next_chapter_hint="", **fields)
+
 @app.post("/api/ebooks/regenerate-chapter")
 async def regenerate_chapter(request: RegenerateChapterRequest, current_user = Depends(get_current_user)):
     """Regenerate a specific chapter using AI"""
     try:
-        ebook = ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
@@ -1527,89 +2279,213 @@ async def regenerate_chapter(request: RegenerateChapterRequest, current_user = D
         if not chapter_to_regen:
             raise HTTPException(status_code=404, detail="Chapter not found")
         
-        # Regenerate content using same logic as original generation
-        chapter_type = chapter_to_regen.get('type', 'chapter')
+        system_message, prompt = build_regenerate_prompt(ebook, chapter_to_regen, chapter_index)
+        
+        new_content = await llm.complete(
+            session_prefix=f"regen_{request.ebook_id}_{request.chapter_number}",
+            user_id=current_user["_id"],
+            system_message=system_message,
+            prompt=prompt,
+            use_cache=False,  # a regeneration explicitly wants a new draft
+            max_tokens=chapter_output_tokens(chapter_to_regen.get('type', 'chapter'), ebook.get('length'))
+        )
+        
+        # Update chapter
+        chapters[chapter_index]['content'] = new_content.strip()
+        chapters[chapter_index]['summary'] = summarize(new_content)
+        chapters[chapter_index]['regenerated_at'] = datetime.now(timezone.utc).isoformat()
+        
+        await ebooks_collection.update_one(
+            {"_id": request.ebook_id},
+            {"$set": {"chapters": chapters}}
+        )
         
-        if chapter_type == 'chapter':
-            prompt = f"""Tu es un auteur professionnel expert en pédagogie et storytelling.
+        return {
+            "success": True,
+            "new_content": new_content.strip()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error regenerating chapter: {str(e)}")
+
+@app.post("/api/ebooks/regenerate-chapter/stream")
+async def stream_regenerate_chapter(request: RegenerateChapterRequest, current_user = Depends(get_current_user)):
+    """
+    Regenerate a chapter and stream the new text as Server-Sent Events
+    
+    Emits `token` events while the completion arrives, then saves the chapter and
+    emits a `done` event with the full `new_content` (or an `error` event).
+    """
+    ebook = await ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
+    if not ebook:
+        raise HTTPException(status_code=404, detail="Ebook not found")
+    
+    chapters = ebook.get('chapters', [])
+    chapter_index = next(
+        (idx for idx, chapter in enumerate(chapters) if chapter.get('number') == request.chapter_number),
+        -1
+    )
+    if chapter_index < 0:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    
+    system_message, prompt = build_regenerate_prompt(ebook, chapters[chapter_index], chapter_index)
+    
+    async def event_stream():
+        parts = []
+        try:
+            async for token in llm.stream(
+                prompt,
+                system_message,
+                session_prefix=f"regen_{request.ebook_id}_{request.chapter_number}",
+                user_id=current_user["_id"],
+                max_tokens=chapter_output_tokens(chapters[chapter_index].get('type', 'chapter'), ebook.get('length'))
+            ):
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+            
+            new_content = "".join(parts).strip()
+            await ebooks_collection.update_one(
+                {"_id": request.ebook_id},
+                {"$set": {
+                    f"chapters.{chapter_index}.content": new_content,
+                    f"chapters.{chapter_index}.summary": summarize(new_content),
+                    f"chapters.{chapter_index}.regenerated_at": datetime.now(timezone.utc).isoformat()
+                }}
+            )
+            yield sse_event("done", {"success": True, "new_content": new_content})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error regenerating chapter: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def build_regenerate_section_prompt(
+    ebook: dict,
+    chapter: Dict[str, Any],
+    sections: List[Dict[str, Any]],
+    index: int,
+    instructions: Optional[str] = None
+) -> str:
+    """Build the prompt rewriting one section of a chapter, its neighbours given as context"""
+    section = sections[index]
+    section_label = f"la section \"🔹 {section['title']}\"" if section['title'] else "l'ouverture du chapitre (avant la première section)"
+    
+    neighbours_context = ""
+    if index > 0:
+        neighbours_context += f"\n\nSECTION PRÉCÉDENTE (à ne pas réécrire) :\n{sections[index - 1]['text'].strip()[-1200:]}"
+    if index < len(sections) - 1:
+        neighbours_context += f"\n\nSECTION SUIVANTE (à ne pas réécrire) :\n{sections[index + 1]['text'].strip()[:1200]}"
+    
+    author_request = f"\n\nDEMANDE DE L'AUTEUR :\n{trim_field('instructions', instructions)}" if instructions else ""
+    heading_rule = f"- Commence par le titre exact \"🔹 {section['title']}\"" if section['title'] else "- Pas de titre : l'ouverture commence directement par le texte"
+    
+    return f"""Tu es un auteur professionnel expert en pédagogie et storytelling.
 
 CONTEXTE DU LIVRE :
 - Titre : "{ebook['title']}"
-- Auteur : {ebook['author']}
 - Ton : {ebook['tone']}
 - Public cible : {', '.join(ebook['target_audience'])}
-- Objectif global : {ebook['description']}
-
-CHAPITRE À RÉGÉNÉRER :
-Numéro : {chapter_to_regen['number']}
-Titre : {chapter_to_regen['title']}
-Objectif : {chapter_to_regen.get('description', 'Développer ce thème')}
-
-MISSION : Rédige un chapitre COMPLET et ENGAGEANT (1200-1800 mots) structuré ainsi :
 
-1. **OUVERTURE** (2-3 paragraphes)
-   - Accroche puissante
-   - Annonce claire du contenu
+CHAPITRE {chapter['number']} : {chapter['title']}
+Objectif : {trim_field("chapter_description", chapter.get('description', 'Développer ce thème'))}{neighbours_context}
 
-2. **DÉVELOPPEMENT EN SECTIONS** (corps principal)
-   - 2-4 sections claires avec titre "🔹 Titre"
-   - Explications approfondies
-   - 2-3 exemples concrets par section
-   - Anecdotes illustratives
+SECTION À RÉÉCRIRE :
+{section['text'].strip()}{author_request}
 
-3. **EN SYNTHÈSE** (section finale OBLIGATOIRE)
-   "🔹 En synthèse"
-   - Résumé des 3-4 points clés
-   - Principal enseignement
-
-4. **RÉFLEXION PERSONNELLE** (section finale OBLIGATOIRE)
-   "🔹 Question de réflexion"
-   - 1-2 questions ouvertes
+MISSION : Réécris UNIQUEMENT {section_label}, avec une longueur comparable, en gardant la continuité avec les sections voisines.
 
 EXIGENCES STRICTES :
+{heading_rule}
 - Style : {ebook['tone']}
-- ⚠️ INTERDIT : N'utilise JAMAIS #, ##, ### 
-- ⚠️ INTERDIT : Ne répète JAMAIS le titre du chapitre
-- Format : "🔹 Titre" pour sous-sections
+- ⚠️ INTERDIT : N'utilise JAMAIS #, ##, ###
+- ⚠️ INTERDIT : Ne réécris pas les sections voisines
 - Langage : 100% français
 
-Réponds UNIQUEMENT avec le contenu."""
+Réponds UNIQUEMENT avec le contenu de la section."""
 
-        else:
-            # For introduction or conclusion, use appropriate prompt
-            prompt = f"""Régénère le contenu pour ce type de chapitre: {chapter_type}"""
+@app.get("/api/ebooks/{ebook_id}/chapters/{chapter_number}/sections")
+async def get_chapter_sections(ebook_id: str, chapter_number: int, current_user = Depends(get_current_user)):
+    """List the 🔹 sections of a chapter (index 0 is the opening when present)"""
+    ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]}, {"chapters": 1})
+    if not ebook:
+        raise HTTPException(status_code=404, detail="Ebook not found")
+    
+    chapter = next((chapter for chapter in ebook.get('chapters', []) if chapter.get('number') == chapter_number), None)
+    if not chapter:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    
+    return {
+        "success": True,
+        "sections": split_sections(chapter.get('content', ''))
+    }
+
+@app.post("/api/ebooks/regenerate-sections")
+async def regenerate_sections(request: RegenerateSectionsRequest, current_user = Depends(get_current_user)):
+    """Regenerate selected 🔹 sections of a chapter and splice them back, keeping the rest untouched"""
+    try:
+        ebook = await ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
+        if not ebook:
+            raise HTTPException(status_code=404, detail="Ebook not found")
         
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"regen_{request.ebook_id}_{request.chapter_number}_{datetime.now(timezone.utc).timestamp()}",
-            system_message="Tu es un auteur professionnel."
-        ).with_model("openai", "gpt-4o-mini")
+        chapters = ebook.get('chapters', [])
+        chapter_index = next(
+            (idx for idx, chapter in enumerate(chapters) if chapter.get('number') == request.chapter_number),
+            -1
+        )
+        if chapter_index < 0:
+            raise HTTPException(status_code=404, detail="Chapter not found")
         
-        user_message = UserMessage(text=prompt)
-        new_content = await chat.send_message(user_message)
+        chapter = chapters[chapter_index]
+        sections = split_sections(chapter.get('content', ''))
+        selected = sorted(set(request.sections))
+        invalid = [index for index in selected if index < 0 or index >= len(sections)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Unknown sections: {invalid} (chapter has {len(sections)})")
+        
+        # Les sections choisies sont réécrites en parallèle, à partir du texte d'origine
+        async def rewrite(index):
+            return await llm.complete(
+                session_prefix=f"regen_section_{request.ebook_id}_{request.chapter_number}_{index}",
+                user_id=current_user["_id"],
+                system_message="Tu es un auteur professionnel.",
+                prompt=build_regenerate_section_prompt(ebook, chapter, sections, index, request.instructions),
+                use_cache=False,  # a regeneration explicitly wants a new draft
+                max_tokens=section_output_tokens(sections[index]['text'])
+            )
         
-        # Update chapter
-        chapters[chapter_index]['content'] = new_content.strip()
-        chapters[chapter_index]['regenerated_at'] = datetime.now(timezone.utc).isoformat()
+        rewritten = await asyncio.gather(*(rewrite(index) for index in selected))
+        for index, new_text in zip(selected, rewritten):
+            sections[index]["text"] = replace_section_text(sections[index], new_text)
         
-        ebooks_collection.update_one(
+        new_content = join_sections(sections)
+        await ebooks_collection.update_one(
             {"_id": request.ebook_id},
-            {"$set": {"chapters": chapters}}
+            {"$set": {
+                f"chapters.{chapter_index}.content": new_content,
+                f"chapters.{chapter_index}.summary": summarize(new_content),
+                f"chapters.{chapter_index}.regenerated_at": datetime.now(timezone.utc).isoformat()
+            }}
         )
         
         return {
             "success": True,
-            "new_content": new_content.strip()
+            "new_content": new_content,
+            "regenerated_sections": [sections[index] for index in selected]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error regenerating chapter: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error regenerating sections: {str(e)}")
 
 @app.post("/api/ebooks/regenerate-image")
 async def regenerate_image(request: RegenerateImageRequest, current_user = Depends(get_current_user)):
     """Regenerate a specific illustration using DALL-E"""
     try:
-        ebook = ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": request.ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
@@ -1633,21 +2509,12 @@ async def regenerate_image(request: RegenerateImageRequest, current_user = Depen
         dalle_prompt = image_item.get('dalle_prompt', '')
         
         # Regenerate with DALL-E
-        image_gen = OpenAIImageGeneration(api_key=EMERGENT_LLM_KEY)
+        image_bytes = await llm.generate_image(dalle_prompt, user_id=current_user["_id"])
         
-        generated_images = await image_gen.generate_images(
-            prompt=dalle_prompt,
-            model="gpt-image-1",
-            number_of_images=1
-        )
-        
-        if generated_images and len(generated_images) > 0:
-            # Convert to base64
-            image_base64 = base64.b64encode(generated_images[0]).decode('utf-8')
-            
+        if image_bytes:
             # Store in GridFS
-            image_id = fs.put(
-                generated_images[0],
+            image_id = await repository.put_file(
+                image_bytes,
                 filename=f"ebook_{request.ebook_id}_ch{request.chapter_number}_regen_{datetime.now(timezone.utc).timestamp()}.png",
                 content_type="image/png",
                 metadata={
@@ -1659,19 +2526,20 @@ async def regenerate_image(request: RegenerateImageRequest, current_user = Depen
             )
             
             # Update image item
-            image_item['image_base64'] = image_base64
+            image_item.pop('image_base64', None)
             image_item['image_id'] = str(image_id)
             image_item['regenerated_at'] = datetime.now(timezone.utc).isoformat()
             
             # Save back to database
-            ebooks_collection.update_one(
+            await ebooks_collection.update_one(
                 {"_id": request.ebook_id},
                 {"$set": {"illustrations": illustrations}}
             )
             
             return {
                 "success": True,
-                "image_base64": image_base64
+                "image_id": str(image_id),
+                "image_url": image_url(str(image_id), current_user["_id"])
             }
         else:
             raise HTTPException(status_code=500, detail="No image was generated")
@@ -1688,7 +2556,7 @@ async def upload_custom_image(
 ):
     """Upload a custom image for a chapter"""
     try:
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
@@ -1701,7 +2569,7 @@ async def upload_custom_image(
         image_data = await file.read()
         
         # Store in GridFS
-        image_id = fs.put(
+        image_id = await repository.put_file(
             image_data,
             filename=file.filename,
             content_type=file.content_type,
@@ -1714,9 +2582,6 @@ async def upload_custom_image(
             }
         )
         
-        # Convert to base64 for frontend
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        
         # Add to illustrations array
         illustrations = ebook.get('illustrations', [])
         
@@ -1727,7 +2592,6 @@ async def upload_custom_image(
                 if 'images' not in illust:
                     illust['images'] = []
                 illust['images'].append({
-                    'image_base64': image_base64,
                     'image_id': str(image_id),
                     'image_source': 'user_upload',
                     'alt_text': f"Image personnalisée pour le chapitre {chapter_number}",
@@ -1740,7 +2604,6 @@ async def upload_custom_image(
             illustrations.append({
                 'chapter_number': chapter_number,
                 'images': [{
-                    'image_base64': image_base64,
                     'image_id': str(image_id),
                     'image_source': 'user_upload',
                     'alt_text': f"Image personnalisée pour le chapitre {chapter_number}",
@@ -1748,30 +2611,122 @@ async def upload_custom_image(
                 }]
             })
         
-        ebooks_collection.update_one(
+        await ebooks_collection.update_one(
             {"_id": ebook_id},
             {"$set": {"illustrations": illustrations}}
         )
         
         return {
             "success": True,
-            "image_base64": image_base64,
-            "image_id": str(image_id)
+            "image_id": str(image_id),
+            "image_url": image_url(str(image_id), current_user["_id"])
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading image: {str(e)}")
 
+# Image Routes
+@app.get("/api/images/{image_id}")
+async def get_image(
+    image_id: str,
+    request: Request,
+    u: Optional[str] = None,
+    exp: Optional[int] = None,
+    sig: Optional[str] = None,
+    w: Optional[int] = None
+):
+    """
+    Stream a stored image, or its thumbnail of width `w` (one of THUMBNAIL_WIDTHS)
+    
+    The signed URL (see images.image_url) stands for authentication until it expires.
+    Stored files never change: responses carry a strong ETag and an immutable cache
+    lasting as long as the URL, If-None-Match is answered with 304 and single byte
+    ranges with 206.
+    """
+    if not verify_image_signature(image_id, u, exp, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired image signature")
+    if w is not None and w not in THUMBNAIL_WIDTHS:
+        raise HTTPException(status_code=400, detail=f"Unsupported width, use one of {list(THUMBNAIL_WIDTHS)}")
+    
+    etag = image_etag(image_id, w)
+    cache_headers = {"ETag": etag, "Cache-Control": image_cache_control(exp)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+    
+    file_id = await thumbnail_id(repository, image_id, w) if w else image_id
+    stream = await repository.open_file(file_id) if file_id else None
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    headers = {**cache_headers, "Accept-Ranges": "bytes"}
+    media_type = file_content_type(stream) or "application/octet-stream"
+    try:
+        byte_range = parse_range(request.headers.get("range"), stream.length)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stream.length}"})
+    
+    if byte_range is None:
+        headers["Content-Length"] = str(stream.length)
+        return StreamingResponse(iter_file(stream), media_type=media_type, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stream.length}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iter_file(stream, start, end), status_code=206, media_type=media_type, headers=headers)
+
+# LLM Routes
+@app.get("/api/llm/scheduler/stats")
+async def get_llm_scheduler_stats(current_user = Depends(get_current_user)):
+    """Slots in use and calls queued per priority class, for text and image calls"""
+    return llm.stats()
+
+@app.get("/api/llm/prompt-cache/stats")
+async def get_prompt_cache_stats(current_user = Depends(get_current_user)):
+    """Share of prompt tokens served from the provider's prefix cache, per prompt template"""
+    return llm.prompt_cache.stats()
+
+@app.get("/api/llm/cache/stats")
+async def get_llm_cache_stats(current_user = Depends(get_current_user)):
+    """Hit/miss counters of the LLM response cache"""
+    return llm_cache.stats()
+
+# Job Routes
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str, current_user = Depends(get_current_user)):
+    """Cancel a queued or running job; steps already completed stay recorded on the job"""
+    job = await job_manager.cancel(job_id, current_user["_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": job["status"],
+        "cancel_requested": job.get("cancel_requested", False)
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, current_user = Depends(get_current_user)):
+    """Report state, per-step progress, partial results and errors of a background job"""
+    job = await job_manager.get(job_id, current_user["_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job["result"] = with_image_urls(job.get("result"), current_user["_id"])
+    job["partial_results"] = {
+        step: with_image_urls(partial, current_user["_id"]) for step, partial in (job.get("partial_results") or {}).items()
+    }
+    return job
+
 # Export Routes
 @app.get("/api/ebooks/{ebook_id}/export/pdf")
 async def export_pdf(ebook_id: str, current_user = Depends(get_current_user)):
     """Export ebook to PDF format"""
     try:
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
-        exporter = EbookExporter(ebook)
+        exporter = EbookExporter(await hydrate_images(ebook, repository))
         pdf_buffer = exporter.export_to_pdf()
         
         filename = f"{ebook['title'].replace(' ', '_')}.pdf"
@@ -1788,11 +2743,11 @@ async def export_pdf(ebook_id: str, current_user = Depends(get_current_user)):
 async def export_epub(ebook_id: str, current_user = Depends(get_current_user)):
     """Export ebook to EPUB format (e-readers)"""
     try:
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
-        exporter = EbookExporter(ebook)
+        exporter = EbookExporter(await hydrate_images(ebook, repository))
         epub_buffer = exporter.export_to_epub()
         
         filename = f"{ebook['title'].replace(' ', '_')}.epub"
@@ -1809,11 +2764,11 @@ async def export_epub(ebook_id: str, current_user = Depends(get_current_user)):
 async def export_docx(ebook_id: str, current_user = Depends(get_current_user)):
     """Export ebook to DOCX format (editable)"""
     try:
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
-        exporter = EbookExporter(ebook)
+        exporter = EbookExporter(await hydrate_images(ebook, repository))
         docx_buffer = exporter.export_to_docx()
         
         filename = f"{ebook['title'].replace(' ', '_')}.docx"
@@ -1830,11 +2785,11 @@ async def export_docx(ebook_id: str, current_user = Depends(get_current_user)):
 async def export_html(ebook_id: str, current_user = Depends(get_current_user)):
     """Export ebook to HTML format (interactive flipbook)"""
     try:
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
-        exporter = EbookExporter(ebook)
+        exporter = EbookExporter(await hydrate_images(ebook, repository))
         html_buffer = exporter.export_to_html_flipbook()
         
         filename = f"{ebook['title'].replace(' ', '_')}_flipbook.html"
@@ -1851,13 +2806,13 @@ async def export_html(ebook_id: str, current_user = Depends(get_current_user)):
 async def export_mobi(ebook_id: str, current_user = Depends(get_current_user)):
     """Export ebook to MOBI format (Kindle)"""
     try:
-        ebook = ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
+        ebook = await ebooks_collection.find_one({"_id": ebook_id, "user_id": current_user["_id"]})
         if not ebook:
             raise HTTPException(status_code=404, detail="Ebook not found")
         
         # Note: MOBI requires conversion tool
         # For now, return EPUB (can be converted to MOBI using Calibre)
-        exporter = EbookExporter(ebook)
+        exporter = EbookExporter(await hydrate_images(ebook, repository))
         epub_buffer = exporter.export_to_mobi()
         
         filename = f"{ebook['title'].replace(' ', '_')}_for_kindle.epub"
@@ -0,0 +1,191 @@
+"""
+Dédoublonnage des générations concurrentes (single-flight)
+Une seule exécution à la fois par (opération, ebook) : les demandes identiques
+arrivées pendant l'exécution s'y rattachent et reçoivent son résultat, une
+demande aux paramètres différents est refusée (SingleFlightConflict).
+Dans un même processus via un futur partagé, entre workers uvicorn via un bail
+(lease) dans la collection MongoDB `locks`, renouvelé tant que l'exécution dure.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+
+SINGLE_FLIGHT_LEASE_SECONDS = int(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", 60))
+SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL_SECONDS", 2.0))
+
+
+class SingleFlightConflict(RuntimeError):
+    """The operation is already running for this key with different parameters"""
+
+
+def params_fingerprint(params: Optional[Dict[str, Any]]) -> str:
+    """Stable short hash of the parameters of a run"""
+    payload = json.dumps(params or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class SingleFlight:
+    """Coalesce concurrent runs of the same operation, within and across processes"""
+
+    def __init__(self, collection, lease_seconds: int = SINGLE_FLIGHT_LEASE_SECONDS):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # key -> tâche du run partagé, empreinte de ses paramètres et nombre d'appelants attachés
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+
+    async def run(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        load_result: Callable[[], Awaitable[Any]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        Run call() unless the same key is already running, in which case wait for it
+
+        The run belongs to all its callers: a cancelled caller (closed stream,
+        cancelled job) only detaches, and the run itself is cancelled when its
+        last caller is.
+
+        Args:
+            key: operation identity, e.g. "generate_content:<ebook_id>"
+            call: coroutine factory doing the actual work
+            load_result: rebuilds the result from the database once a run owned by
+                another worker has completed
+            params: parameters of the run; only a run with the same parameters is shared
+
+        Returns:
+            the result of the run this request was attached to
+
+        Raises:
+            SingleFlightConflict: the key is running with different parameters
+        """
+        fingerprint = params_fingerprint(params)
+        inflight = self._inflight.get(key)
+        if inflight:
+            if inflight["params"] != fingerprint:
+                raise SingleFlightConflict(f"{key} is already running with different parameters")
+            print(f"Attaching to in-flight {key}")
+        else:
+            # Tâche à part : elle survit à l'annulation de l'appelant qui l'a lancée
+            task = asyncio.ensure_future(self._run_leased(key, call, load_result, fingerprint))
+            inflight = {"task": task, "params": fingerprint, "waiters": 0}
+            self._inflight[key] = inflight
+
+            def forget(done: asyncio.Future):
+                if self._inflight.get(key) is inflight:
+                    del self._inflight[key]
+                # Évite l'avertissement "exception never retrieved" quand personne n'attend plus
+                done.cancelled() or done.exception()
+
+            task.add_done_callback(forget)
+
+        task = inflight["task"]
+        inflight["waiters"] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Le run partagé a été annulé, pas cette requête
+            if task.cancelled():
+                raise RuntimeError(f"{key} was cancelled")
+            raise
+        finally:
+            inflight["waiters"] -= 1
+            if not inflight["waiters"] and not task.done():
+                print(f"Cancelling {key}: no caller is waiting for it anymore")
+                task.cancel()
+
+    async def _run_leased(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        load_result: Callable[[], Awaitable[Any]],
+        fingerprint: str
+    ) -> Any:
+        waited = False
+        while not await self._acquire(key, fingerprint):
+            # Un autre worker exécute déjà cette opération : attendre son issue
+            waited = True
+            while True:
+                lease = await self.collection.find_one({"_id": key})
+                if lease is None:
+                    break
+                if lease.get("params") != fingerprint:
+                    if lease["state"] == "running":
+                        raise SingleFlightConflict(f"{key} is already running with different parameters")
+                    # Run terminé avec d'autres paramètres : son résultat ne vaut pas pour celui-ci
+                    break
+                if lease["state"] == "running":
+                    if lease["expires_at"] < datetime.now(timezone.utc):
+                        # Propriétaire disparu sans terminer : reprendre le bail
+                        break
+                    await asyncio.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+                    continue
+                # Le run attendu est terminé : son issue est lue, jamais rejouée
+                if lease["state"] == "failed":
+                    raise RuntimeError(f"Concurrent {key} failed: {lease.get('error')}")
+                print(f"Reusing the result of {key} completed by {lease['owner']}")
+                return await load_result()
+
+        if waited:
+            print(f"Took over {key} after the previous lease expired")
+        heartbeat = asyncio.create_task(self._renew(key))
+        try:
+            result = await call()
+        except BaseException as e:
+            await self._release(key, "failed", str(e) or type(e).__name__)
+            raise
+        else:
+            await self._release(key, "completed")
+            return result
+        finally:
+            heartbeat.cancel()
+
+    def _expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+
+    async def _acquire(self, key: str, fingerprint: str) -> bool:
+        """Take the lease unless a live one is held (by anyone, this process included)"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {"_id": key, "$or": [{"state": {"$ne": "running"}}, {"expires_at": {"$lt": now}}]},
+                {"$set": {
+                    "owner": self.owner,
+                    "state": "running",
+                    "params": fingerprint,
+                    "error": None,
+                    "acquired_at": now,
+                    "expires_at": self._expiry()
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _renew(self, key: str):
+        """Keep the lease alive while the run is in progress"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.collection.update_one(
+                {"_id": key, "owner": self.owner, "state": "running"},
+                {"$set": {"expires_at": self._expiry()}}
+            )
+
+    async def _release(self, key: str, state: str, error: Optional[str] = None):
+        # Le bail terminé est conservé jusqu'à expiration pour les workers en attente
+        await self.collection.update_one(
+            {"_id": key, "owner": self.owner},
+            {"$set": {"state": state, "error": error, "expires_at": self._expiry()}}
+        )
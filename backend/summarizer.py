@@ -0,0 +1,118 @@
+"""
+Résumé extractif local des chapitres
+Sélectionne les phrases les plus représentatives d'un chapitre (fréquence des
+mots pleins, position, section "En synthèse") sans appel réseau, pour nourrir
+les transitions entre chapitres.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import List, Tuple
+
+
+SUMMARY_MAX_SENTENCES = 3
+SUMMARY_MAX_CHARS = 400
+
+FRENCH_STOPWORDS = set("""
+a à afin ai aie aient ainsi alors as au aucun aucune auquel aura aurai auraient
+aurais aurait auras aurez auriez aurions aurons auront aussi autre autres aux
+auxquelles auxquels avaient avais avait avant avec avez aviez avions avoir avons
+ayant bien c ça car ce ceci cela celle celles celui cependant certain certaine
+certaines certains ces cet cette ceux chacun chacune chaque chez ci comme comment
+d dans de depuis des desquelles desquels dès donc dont du duquel elle elles en
+encore entre es est et étaient étais était étant été être eu eue eues eurent eus
+eut eux fait faire fois font furent fut il ils j je jusqu l la laquelle le
+lequel les lesquelles lesquels leur leurs lors lorsque lui m ma mais me même
+mêmes mes moi moins mon n ne ni non nos notre nous on ont ou où par parce pas
+peu peut peuvent plus plutôt pour pourquoi qu quand que quel quelle quelles
+quels qui quoi s sa sans se sera serai seraient serais serait seras serez seriez
+serions serons seront ses si sien soi soient sois soit sommes son sont sous
+souvent suis sur t ta tandis te tel telle telles tels tes toi ton tous tout
+toute toutes très tu un une unes uns va vais vers via voici voilà vont vos
+votre vous y
+""".split())
+
+_WORD_RE = re.compile(r"[a-zàâäçéèêëîïôöùûüÿœæ]+(?:-[a-zàâäçéèêëîïôöùûüÿœæ]+)*")
+_ELISION_RE = re.compile(r"\b(?:[cdjlmnst]|qu|jusqu|lorsqu|puisqu)['’]", re.IGNORECASE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+(?=[«\"A-ZÀÂÄÇÉÈÊËÎÏÔÖÙÛÜŸ0-9])")
+_SECTION_RE = re.compile(r"^\s*🔹\s*(.+?)\s*$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased content words, elisions removed and plurals folded"""
+    words = _WORD_RE.findall(_ELISION_RE.sub(" ", text.lower()))
+    tokens = []
+    for word in words:
+        if word in FRENCH_STOPWORDS or len(word) < 3:
+            continue
+        # Pluriels réguliers ramenés au singulier
+        if len(word) > 4 and word[-1] in "sx":
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _sentences(text: str) -> List[Tuple[str, str]]:
+    """Split a chapter into (section title, sentence) pairs, section titles excluded"""
+    sentences = []
+    section = ""
+    for line in text.splitlines():
+        heading = _SECTION_RE.match(line)
+        if heading:
+            section = heading.group(1).lower()
+            continue
+        line = line.strip().lstrip("-•*> ").strip()
+        if not line:
+            continue
+        for sentence in _SENTENCE_RE.split(line):
+            sentence = sentence.strip()
+            if len(sentence) >= 30 and not sentence.endswith("?"):
+                sentences.append((section, sentence))
+    return sentences
+
+
+def summarize(text: str, max_sentences: int = SUMMARY_MAX_SENTENCES, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """
+    Extract a short summary of a generated chapter
+
+    Sentences are scored by the document frequency of their content words
+    (normalised by length), with a bonus for the opening and the "En synthèse"
+    section; reflection questions are ignored. The best sentences are returned
+    in their original order.
+    """
+    sentences = [
+        (position, section, sentence)
+        for position, (section, sentence) in enumerate(_sentences(text or ""))
+        if "réflexion" not in section
+    ]
+    if not sentences:
+        return ""
+
+    tokenized = [tokenize(sentence) for _, _, sentence in sentences]
+    frequencies = Counter(token for tokens in tokenized for token in tokens)
+    if not frequencies:
+        return sentences[0][2][:max_chars]
+    top_frequency = max(frequencies.values())
+
+    scored = []
+    for (position, section, sentence), tokens in zip(sentences, tokenized):
+        if not tokens:
+            continue
+        score = sum(frequencies[token] / top_frequency for token in tokens) / math.sqrt(len(tokens))
+        if position < 2:
+            score *= 1.3
+        if "synthèse" in section:
+            score *= 1.5
+        scored.append((score, position, sentence))
+
+    best = sorted(scored, reverse=True)[:max_sentences]
+    summary = ""
+    for _, _, sentence in sorted(best, key=lambda item: item[1]):
+        candidate = f"{summary} {sentence}".strip()
+        if len(candidate) > max_chars:
+            if not summary:
+                summary = sentence[:max_chars - 3].rsplit(" ", 1)[0] + "..."
+            break
+        summary = candidate
+    return summary
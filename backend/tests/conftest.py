@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Les modules du backend sont importés à plat, comme par uvicorn depuis backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# images.py refuse de démarrer sans secret de signature
+os.environ.setdefault("IMAGE_URL_SECRET", "test-secret")
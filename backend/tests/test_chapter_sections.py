@@ -0,0 +1,54 @@
+from chapter_sections import SECTION_MARKER, join_sections, replace_section_text, split_sections
+
+
+CHAPTER = f"""Une ouverture qui pose le décor du chapitre.
+
+{SECTION_MARKER} Premiers pas
+
+Le texte de la première section.
+
+  {SECTION_MARKER} Aller plus loin
+Le texte de la deuxième section, sans ligne vide après le titre.
+
+{SECTION_MARKER} En synthèse
+
+- Un point
+- Un autre point
+"""
+
+
+def test_split_then_join_gives_the_content_back():
+    assert join_sections(split_sections(CHAPTER)) == CHAPTER
+
+
+def test_split_titles_and_indexes():
+    sections = split_sections(CHAPTER)
+    assert [section["index"] for section in sections] == [0, 1, 2, 3]
+    assert [section["title"] for section in sections] == [None, "Premiers pas", "Aller plus loin", "En synthèse"]
+
+
+def test_split_without_opening_or_headings():
+    assert [section["title"] for section in split_sections(f"{SECTION_MARKER} Seule\nTexte")] == ["Seule"]
+    assert split_sections("Un chapitre sans section.") == [
+        {"index": 0, "title": None, "text": "Un chapitre sans section."}
+    ]
+    assert split_sections("") == []
+    assert split_sections(None) == []
+
+
+def test_replace_keeps_heading_and_separation():
+    sections = split_sections(CHAPTER)
+    sections[1]["text"] = replace_section_text(sections[1], "Un texte réécrit.")
+    rewritten = join_sections(sections)
+
+    assert f"{SECTION_MARKER} Premiers pas\n\nUn texte réécrit.\n\n  {SECTION_MARKER} Aller plus loin" in rewritten
+    assert [section["title"] for section in split_sections(rewritten)] == [
+        None, "Premiers pas", "Aller plus loin", "En synthèse"
+    ]
+
+
+def test_replace_keeps_a_heading_given_by_the_model():
+    section = split_sections(CHAPTER)[1]
+    assert replace_section_text(section, f"{SECTION_MARKER} Premiers pas\n\nNouveau.\n").startswith(
+        f"{SECTION_MARKER} Premiers pas\n\nNouveau."
+    )
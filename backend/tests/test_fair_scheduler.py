@@ -0,0 +1,57 @@
+import asyncio
+
+from fair_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, FairScheduler
+
+
+async def served_order(scheduler, requests):
+    """Queue (user, priority) requests behind a held slot and return the order they are served in"""
+    order = []
+
+    async def call(user_id, priority):
+        async with scheduler.slot(user_id, priority):
+            order.append((user_id, priority))
+            await asyncio.sleep(0)
+
+    await scheduler.acquire("holder", PRIORITY_INTERACTIVE)
+    tasks = []
+    for user_id, priority in requests:
+        tasks.append(asyncio.create_task(call(user_id, priority)))
+        await asyncio.sleep(0)
+    scheduler.release("holder", PRIORITY_INTERACTIVE)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_users_share_slots_fairly():
+    # Un utilisateur qui met beaucoup d'appels en file ne passe pas devant l'autre
+    requests = [("user_a", PRIORITY_BULK)] * 4 + [("user_b", PRIORITY_BULK)] * 2
+    order = asyncio.run(served_order(FairScheduler(capacity=1), requests))
+    assert [user_id for user_id, _ in order] == ["user_a", "user_b", "user_a", "user_b", "user_a", "user_a"]
+
+
+def test_user_weights_scale_their_share():
+    requests = [("user_a", PRIORITY_BULK)] * 4 + [("user_b", PRIORITY_BULK)] * 2
+    order = asyncio.run(served_order(FairScheduler(capacity=1, user_weights={"user_a": 2}), requests))
+    assert [user_id for user_id, _ in order][:3].count("user_a") == 2
+
+
+def test_interactive_calls_go_before_bulk():
+    requests = [("user_a", PRIORITY_BULK), ("user_a", PRIORITY_BULK), ("user_b", PRIORITY_INTERACTIVE)]
+    order = asyncio.run(served_order(FairScheduler(capacity=1), requests))
+    assert order[0] == ("user_b", PRIORITY_INTERACTIVE)
+
+
+def test_reserved_slots_stay_free_for_interactive_calls():
+    async def scenario():
+        scheduler = FairScheduler(capacity=2, reserved=1)
+        await scheduler.acquire("user_a", PRIORITY_BULK)
+        bulk = asyncio.create_task(scheduler.acquire("user_a", PRIORITY_BULK))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(scheduler.acquire("user_b", PRIORITY_INTERACTIVE), 1)
+        stats = scheduler.stats()
+        bulk.cancel()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["in_use"] == {PRIORITY_INTERACTIVE: 1, PRIORITY_BULK: 1}
+    assert stats["queued"][PRIORITY_BULK] == 1
@@ -0,0 +1,96 @@
+import pytest
+
+from urllib.parse import parse_qs, urlsplit
+
+from images import (
+    etag_matches, image_cache_control, image_etag, image_url, image_url_expiry, parse_range, verify_image_signature
+)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("items=0-10", None),
+    ("bytes=-", None),
+    ("bytes=0-99,200-299", None),  # plusieurs plages : fichier entier
+    ("bytes=0-0", (0, 0)),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),  # ouverte : jusqu'à la fin
+    ("bytes=900-5000", (900, 999)),  # fin ramenée à la taille
+    ("bytes=-100", (900, 999)),  # suffixe : 100 derniers octets
+    ("bytes=-5000", (0, 999)),  # suffixe plus long que le fichier
+    (" bytes=10-20 ", (10, 20))
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-1200", "bytes=5000-", "bytes=20-10", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+def test_parse_range_empty_file():
+    with pytest.raises(ValueError):
+        parse_range("bytes=0-", 0)
+
+
+def test_image_etag():
+    assert image_etag("abc") == '"abc"'
+    assert image_etag("abc", 320) == '"abc-w320"'
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other"', False),
+    ('"other", W/"abc"', True),
+    ('"other","abc"', True),
+    ('  "x" ,  "abc"  ', True),
+    ('"abc-w320"', False),
+    ("*", True),
+    ("abc", False)
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, '"abc"') is expected
+
+
+def signed(url):
+    query = {name: values[0] for name, values in parse_qs(urlsplit(url).query).items()}
+    return query["u"], int(query["exp"]), query["sig"]
+
+
+def test_signed_url_round_trip():
+    user_id, expires, sig = signed(image_url("abc", "user_1"))
+    assert user_id == "user_1"
+    assert verify_image_signature("abc", user_id, expires, sig)
+
+
+def test_signature_is_bound_to_image_user_and_expiry():
+    user_id, expires, sig = signed(image_url("abc", "user_1"))
+    assert not verify_image_signature("abd", user_id, expires, sig)
+    assert not verify_image_signature("abc", "user_2", expires, sig)
+    assert not verify_image_signature("abc", user_id, expires + 1, sig)
+
+
+def test_expired_signature_is_rejected():
+    user_id, expires, sig = signed(image_url("abc", "user_1"))
+    assert not verify_image_signature("abc", user_id, expires, sig, now=expires + 1)
+
+
+@pytest.mark.parametrize("sig", [None, "", "é" * 32, "0" * 31, "Z" * 32, "0" * 64])
+def test_malformed_signature_is_rejected(sig):
+    assert verify_image_signature("abc", "user_1", image_url_expiry(), sig) is False
+
+
+def test_expiry_is_stable_within_a_window():
+    assert image_url_expiry(now=86400 * 10 + 1) == image_url_expiry(now=86400 * 11 - 1)
+    assert image_url_expiry(now=0) >= 7 * 86400
+
+
+def test_cache_lasts_until_the_url_expires():
+    assert image_cache_control(1000, now=400) == "private, max-age=600, immutable"
+    assert image_cache_control(1000, now=2000) == "private, max-age=0, immutable"
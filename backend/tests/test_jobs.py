@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+import jobs
+from jobs import JobManager
+
+
+def ago(**delta) -> str:
+    return (datetime.now(timezone.utc) - timedelta(**delta)).isoformat()
+
+
+def test_recover_fails_jobs_whose_heartbeat_expired():
+    async def scenario():
+        collection = AsyncMongoMockClient().db.jobs
+        manager = JobManager(collection)
+        await collection.insert_many([
+            # Worker redémarré il y a quelques minutes : updated_at est récent
+            {"_id": "restarted", "status": "running", "heartbeat_at": ago(minutes=3), "updated_at": ago(minutes=3)},
+            {"_id": "alive", "status": "running", "heartbeat_at": ago(seconds=5), "updated_at": ago(minutes=10)},
+            {"_id": "legacy", "status": "queued", "updated_at": ago(hours=2)},
+            {"_id": "legacy_recent", "status": "running", "updated_at": ago(minutes=1)},
+            {"_id": "done", "status": "completed", "heartbeat_at": ago(hours=1), "updated_at": ago(hours=1)}
+        ])
+        await manager.recover()
+        return {job["_id"]: job["status"] async for job in collection.find()}
+
+    assert asyncio.run(scenario()) == {
+        "restarted": "failed",
+        "alive": "running",
+        "legacy": "failed",
+        "legacy_recent": "running",
+        "done": "completed"
+    }
+
+
+def test_running_jobs_keep_their_heartbeat(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT_TIMEOUT_SECONDS", 0.05)
+
+    async def scenario():
+        collection = AsyncMongoMockClient().db.jobs
+        manager = JobManager(collection)
+        release = asyncio.Event()
+
+        async def runner(job):
+            await release.wait()
+            return {"ok": True}
+
+        manager.start()
+        job_id = await manager.submit("test", "user_1", runner)
+        await asyncio.sleep(0.2)
+        running = await collection.find_one({"_id": job_id})
+        release.set()
+        await asyncio.sleep(0.05)
+        manager.stop()
+        return running, await collection.find_one({"_id": job_id})
+
+    running, done = asyncio.run(scenario())
+    assert running["status"] == "running"
+    assert running["heartbeat_at"] > running["started_at"]
+    assert done["status"] == "completed"
+
+
+def test_cancel_stops_the_job_and_keeps_completed_steps():
+    async def scenario():
+        collection = AsyncMongoMockClient().db.jobs
+        manager = JobManager(collection)
+        interrupted = asyncio.Event()
+
+        async def runner(job):
+            await job.set_steps(["chapter_1", "chapter_2"])
+            await job.start_step("chapter_1")
+            await job.complete_step("chapter_1")
+            await job.start_step("chapter_2")
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                interrupted.set()
+                raise
+
+        job_id = await manager.submit("generate_content", "user_1", runner)
+        await asyncio.sleep(0.05)
+        assert await manager.cancel(job_id, "user_2") is None
+        await manager.cancel(job_id, "user_1")
+        await asyncio.sleep(0.05)
+        return interrupted.is_set(), await collection.find_one({"_id": job_id}), job_id in manager._tasks
+
+    interrupted, job, tracked = asyncio.run(scenario())
+    assert interrupted
+    assert not tracked
+    assert job["status"] == "cancelled"
+    assert job["result"] == {"cancelled": True, "completed_steps": ["chapter_1"]}
+    assert job["progress"]["steps"]["chapter_2"]["status"] == "cancelled"
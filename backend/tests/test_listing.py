@@ -0,0 +1,40 @@
+import base64
+import json
+
+import pytest
+
+from listing import decode_list_cursor, encode_list_cursor
+
+
+def test_cursor_round_trip():
+    ebook = {"_id": "ebook_1", "created_at": "2024-05-01T10:00:00+00:00", "title": "Ignoré"}
+    assert decode_list_cursor(encode_list_cursor(ebook)) == ("2024-05-01T10:00:00+00:00", "ebook_1")
+
+
+def test_cursor_round_trip_without_created_at():
+    assert decode_list_cursor(encode_list_cursor({"_id": "ebook_1"})) == (None, "ebook_1")
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_list_cursor({"_id": "ébook?/+", "created_at": "2024-05-01"})
+    assert all(char.isalnum() or char in "-_=" for char in cursor)
+
+
+def encoded(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64 !",
+    "bm90IGpzb24=",  # "not json"
+    encoded({"created_at": "2024", "_id": "ebook_1"}),
+    encoded(["2024"]),
+    encoded(["2024", "ebook_1", "extra"]),
+    encoded(["2024", 42]),
+    encoded([{"$gt": ""}, "ebook_1"]),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode()
+])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_list_cursor(cursor)
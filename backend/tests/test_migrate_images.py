@@ -0,0 +1,69 @@
+import asyncio
+import base64
+
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from migrate_images import migrate
+
+
+IMAGE = base64.b64encode(b"not really a png").decode()
+
+
+class FakeRepository:
+    """Collections of Repository on mongomock, GridFS files reduced to their fs.files documents"""
+
+    def __init__(self):
+        self.db = AsyncMongoMockClient().db
+        self.ebooks = self.db.ebooks
+        self.files = self.db["fs.files"]
+
+    async def find_file(self, query):
+        return await self.files.find_one(query)
+
+    async def put_file(self, data, filename, content_type, metadata=None):
+        return (await self.files.insert_one({"filename": filename, "metadata": metadata})).inserted_id
+
+
+async def seeded_repository():
+    repository = FakeRepository()
+    stored_id = (await repository.files.insert_one({"filename": "stored.png"})).inserted_id
+    await repository.ebooks.insert_one({
+        "_id": "ebook_1",
+        # Jamais envoyée dans GridFS
+        "cover": {"cover_image_base64": IMAGE},
+        "illustrations": [{"chapter_number": 1, "images": [
+            # Déjà dans GridFS : seule la copie base64 disparaît
+            {"image_id": str(stored_id), "image_base64": IMAGE},
+            # Référence un fichier disparu
+            {"image_id": str(ObjectId()), "image_base64": IMAGE}
+        ]}]
+    })
+    return repository
+
+
+def test_dry_run_counts_images_that_would_be_uploaded():
+    async def scenario():
+        repository = await seeded_repository()
+        counts = await migrate(repository, dry_run=True)
+        return counts, await repository.ebooks.find_one({"_id": "ebook_1"})
+
+    counts, ebook = asyncio.run(scenario())
+    assert counts == {"ebooks": 1, "images": 3, "would_upload": 2}
+    assert ebook["cover"]["cover_image_base64"] == IMAGE
+
+
+def test_migration_uploads_missing_images_and_drops_base64():
+    async def scenario():
+        repository = await seeded_repository()
+        counts = await migrate(repository)
+        ebook = await repository.ebooks.find_one({"_id": "ebook_1"})
+        image_ids = [ebook["cover"]["cover_image_id"]] + [image["image_id"] for image in ebook["illustrations"][0]["images"]]
+        files = [await repository.find_file({"_id": ObjectId(image_id)}) for image_id in image_ids]
+        return counts, ebook, files
+
+    counts, ebook, files = asyncio.run(scenario())
+    assert counts == {"ebooks": 1, "images": 3, "uploaded": 2}
+    assert "cover_image_base64" not in ebook["cover"]
+    assert all("image_base64" not in image for image in ebook["illustrations"][0]["images"])
+    assert all(files)
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from pipeline import DagScheduler, PipelineNode
+
+
+async def succeed():
+    return {"ok": True}
+
+
+async def fail():
+    raise ValueError("No table of contents")
+
+
+def test_failed_node_blocks_its_dependents_only():
+    events = []
+
+    async def on_status(name, status, detail):
+        events.append((name, status))
+
+    scheduler = DagScheduler([
+        PipelineNode("toc", fail),
+        PipelineNode("content", succeed, deps=["toc"]),
+        PipelineNode("illustrations", succeed, deps=["content"]),
+        PipelineNode("cover", succeed)
+    ])
+    statuses = asyncio.run(scheduler.run(on_status=on_status))
+
+    assert statuses["toc"] == {"status": "failed", "error": "No table of contents"}
+    assert statuses["content"]["status"] == "blocked"
+    assert statuses["illustrations"] == {"status": "blocked", "reason": "Dependency not satisfied: content"}
+    assert statuses["cover"]["status"] == "completed"
+    assert ("content", "running") not in events
+
+
+def test_skipped_node_satisfies_its_dependents():
+    scheduler = DagScheduler([
+        PipelineNode("toc", fail),
+        PipelineNode("content", succeed, deps=["toc"])
+    ])
+    statuses = asyncio.run(scheduler.run(skip=["toc"]))
+    assert statuses == {
+        "toc": {"status": "skipped", "reason": "Skipped on request"},
+        "content": {"status": "completed"}
+    }
+
+
+def test_dependency_cycle_is_rejected():
+    with pytest.raises(ValueError):
+        DagScheduler([
+            PipelineNode("a", succeed, deps=["b"]),
+            PipelineNode("b", succeed, deps=["a"])
+        ])
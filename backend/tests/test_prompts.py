@@ -0,0 +1,59 @@
+from prompts import BOOK_SYSTEM_MESSAGE, PROMPTS, render_prompt
+from token_budget import estimate_tokens
+
+
+TOC = [
+    {"number": 0, "title": "Introduction", "description": "Accroche le lecteur, présente le sujet et annonce les bénéfices",
+     "subtitles": ["Pourquoi ce livre maintenant ?", "Ce que vous allez découvrir"], "type": "introduction"},
+] + [
+    {"number": number, "title": f"Reprendre la main sur son agenda, étape {number}",
+     "description": "Ce chapitre explique comment organiser ses journées et prioriser ses tâches. Il prépare le lecteur à la suite.",
+     "subtitles": ["Identifier ses priorités", "Bloquer du temps", "Dire non"], "type": "chapter"}
+    for number in range(1, 9)
+] + [
+    {"number": 9, "title": "Conclusion", "description": "Synthèse, call-to-action et ouverture",
+     "subtitles": ["Les enseignements clés", "Vos prochaines étapes"], "type": "conclusion"},
+]
+
+EBOOK = {
+    "title": "Maîtriser son temps",
+    "author": "Jean Dupont",
+    "tone": "Inspirant",
+    "target_audience": ["Entrepreneurs", "Cadres"],
+    "description": "Un guide pratique pour reprendre le contrôle de son agenda.",
+    "toc": TOC
+}
+
+
+def chapter_prompt(chapter):
+    return render_prompt(
+        "chapter",
+        EBOOK,
+        chapter_number=chapter["number"],
+        chapter_title=chapter["title"],
+        chapter_description=chapter["description"],
+        transition_context="",
+        next_chapter_hint=""
+    )
+
+
+def test_chapter_prefix_reaches_provider_cache_minimum():
+    # OpenAI ne met en cache que les préfixes d'au moins 1024 jetons
+    prefix = PROMPTS["chapter"].prefix(EBOOK)
+    assert estimate_tokens(BOOK_SYSTEM_MESSAGE) + estimate_tokens(prefix) >= 1024
+    assert "Plan du livre" in prefix and TOC[-1]["title"] in prefix
+
+
+def test_prefix_is_shared_between_chapters():
+    prefix = PROMPTS["chapter"].prefix(EBOOK)
+    for chapter in TOC[1:3]:
+        system_message, prompt = chapter_prompt(chapter)
+        assert system_message == BOOK_SYSTEM_MESSAGE
+        assert prompt.startswith(prefix)
+        assert prompt[len(prefix):].count(chapter["title"]) == 1
+
+
+def test_prefix_without_toc_has_no_plan():
+    prefix = PROMPTS["chapter"].prefix({**EBOOK, "toc": []})
+    assert "Plan du livre" not in prefix
+    assert "Objectif global : Un guide pratique pour reprendre le contrôle de son agenda.\n\n" in prefix
@@ -0,0 +1,26 @@
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from repository import Repository
+
+
+def test_repository_imports_and_builds_without_a_server():
+    # motor et pymongo doivent être compatibles : l'import seul échouait au démarrage
+    async def build():
+        repository = Repository("mongodb://localhost:27017", db_name="yoocreat_test")
+        try:
+            assert repository.db.name == "yoocreat_test"
+            assert repository.ebooks.name == "ebooks"
+            assert isinstance(repository.files, AsyncIOMotorGridFSBucket)
+        finally:
+            repository.close()
+
+    asyncio.run(build())
+
+
+def test_modules_using_the_repository_import():
+    import indexes
+    import migrate_images
+
+    assert indexes.ensure_indexes and migrate_images.migrate
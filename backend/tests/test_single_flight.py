@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from single_flight import SingleFlight, SingleFlightConflict
+
+
+KEY = "generate_content:ebook_1"
+PARAMS = {"toc": ["intro", "chapitre 1"], "resume": False}
+
+
+class Call:
+    """Run body that counts its executions and waits until released"""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"chapters": 2}
+
+
+async def load_result():
+    return {"chapters": "from database"}
+
+
+def test_identical_requests_attach_to_one_run():
+    async def scenario():
+        flight = SingleFlight(AsyncMongoMockClient().db.locks)
+        call = Call()
+        first = asyncio.create_task(flight.run(KEY, call, load_result, PARAMS))
+        second = asyncio.create_task(flight.run(KEY, call, load_result, dict(PARAMS)))
+        await asyncio.sleep(0.01)
+        call.release.set()
+        return call.started, await first, await second
+
+    started, first, second = asyncio.run(scenario())
+    assert started == 1
+    assert first == second == {"chapters": 2}
+
+
+def test_cancelled_caller_detaches_without_stopping_the_run():
+    async def scenario():
+        flight = SingleFlight(AsyncMongoMockClient().db.locks)
+        call = Call()
+        first = asyncio.create_task(flight.run(KEY, call, load_result, PARAMS))
+        second = asyncio.create_task(flight.run(KEY, call, load_result, PARAMS))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        call.release.set()
+        return call, first, await second
+
+    call, first, second = asyncio.run(scenario())
+    assert first.cancelled()
+    assert not call.cancelled
+    assert second == {"chapters": 2}
+
+
+def test_different_params_conflict_with_the_running_key():
+    async def scenario():
+        flight = SingleFlight(AsyncMongoMockClient().db.locks)
+        call = Call()
+        running = asyncio.create_task(flight.run(KEY, call, load_result, PARAMS))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(SingleFlightConflict):
+                await flight.run(KEY, Call(), load_result, {**PARAMS, "resume": True})
+        finally:
+            call.release.set()
+            await running
+
+    asyncio.run(scenario())
+
+
+def test_last_waiter_leaving_cancels_the_run():
+    async def scenario():
+        collection = AsyncMongoMockClient().db.locks
+        flight = SingleFlight(collection)
+        call = Call()
+        waiters = [asyncio.create_task(flight.run(KEY, call, load_result, PARAMS)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return call, await collection.find_one({"_id": KEY}), KEY in flight._inflight
+
+    call, lease, inflight = asyncio.run(scenario())
+    assert call.cancelled
+    assert lease["state"] == "failed"
+    assert not inflight
@@ -0,0 +1,62 @@
+from summarizer import summarize, tokenize
+
+
+CHAPTER = """La gestion du temps commence par une vision claire de vos priorités quotidiennes.
+
+🔹 Organiser ses priorités
+
+Une méthode simple consiste à classer les tâches selon leur urgence et leur importance.
+Les priorités importantes méritent un créneau protégé dans votre agenda chaque matin.
+Le café du matin reste un moment agréable pour bien démarrer la journée.
+
+🔹 Questions de réflexion
+
+Quelles priorités importantes repoussez-vous chaque semaine dans votre agenda ?
+Vos priorités importantes et votre agenda reflètent-ils vraiment vos objectifs annuels.
+
+🔹 En synthèse
+
+Protéger un créneau pour les priorités importantes transforme durablement votre agenda.
+"""
+
+
+def sentence_positions(summary):
+    return [CHAPTER.index(sentence.strip()) for sentence in summary.replace(". ", ".\n").splitlines()]
+
+
+def test_summary_respects_sentence_and_char_limits():
+    for max_sentences in (1, 2, 3):
+        summary = summarize(CHAPTER, max_sentences=max_sentences, max_chars=1000)
+        assert 1 <= summary.count(".") <= max_sentences
+    assert len(summarize(CHAPTER, max_sentences=3, max_chars=200)) <= 200
+
+
+def test_summary_keeps_the_original_order():
+    positions = sentence_positions(summarize(CHAPTER, max_sentences=3, max_chars=1000))
+    assert positions == sorted(positions)
+
+
+def test_summary_skips_reflection_questions():
+    summary = summarize(CHAPTER, max_sentences=5, max_chars=2000)
+    assert "?" not in summary
+    assert "objectifs annuels" not in summary
+
+
+def test_summary_favours_the_synthesis_section():
+    assert "transforme durablement" in summarize(CHAPTER, max_sentences=2, max_chars=1000)
+
+
+def test_overlong_first_sentence_is_cut_at_a_word():
+    summary = summarize("Une phrase " + "très " * 200 + "longue.", max_sentences=1, max_chars=50)
+    assert len(summary) <= 50
+    assert summary.endswith("...")
+    assert not summary[:-3].endswith(" ")
+
+
+def test_empty_chapter():
+    assert summarize("") == ""
+    assert summarize(None) == ""
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("L'organisation des priorités et les tâches") == ["organisation", "priorité", "tâche"]
@@ -0,0 +1,147 @@
+"""
+Budget de jetons des appels LLM
+Estime localement la taille des prompts, réduit les champs de contexte trop
+longs (résumé extractif puis coupe) pour tenir dans le budget de chaque type
+de génération, et fixe la longueur maximale des réponses d'après la longueur
+du livre et le type de chapitre.
+"""
+
+import math
+import os
+from typing import Optional
+
+from summarizer import summarize
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding(os.getenv("TOKEN_ENCODING", "o200k_base"))
+except Exception:
+    # tiktoken absent ou encodage indisponible hors ligne : estimation par caractères
+    _ENCODING = None
+
+# Le français compte environ 3,5 caractères par jeton
+CHARS_PER_TOKEN = 3.5
+
+# Taille maximale (en jetons) de chaque champ fourni par l'utilisateur dans un prompt
+FIELD_TOKEN_LIMITS = {
+    "description": int(os.getenv("PROMPT_DESCRIPTION_TOKENS", 300)),
+    "chapter_description": int(os.getenv("PROMPT_CHAPTER_DESCRIPTION_TOKENS", 150)),
+    "about_author": int(os.getenv("PROMPT_ABOUT_AUTHOR_TOKENS", 500)),
+    "acknowledgments": int(os.getenv("PROMPT_ACKNOWLEDGMENTS_TOKENS", 400)),
+    "preface": int(os.getenv("PROMPT_PREFACE_TOKENS", 800)),
+    "instructions": int(os.getenv("PROMPT_INSTRUCTIONS_TOKENS", 200))
+}
+
+# Budget total (en jetons) des contextes qui grandissent avec le livre, par type
+# d'appel : il est partagé entre les éléments (chapitres...) qu'ils énumèrent
+CONTEXT_TOKEN_LIMITS = {
+    "illustration_plan_book": int(os.getenv("PROMPT_ILLUSTRATION_PLAN_CONTEXT_TOKENS", 4000)),
+    "toc": int(os.getenv("PROMPT_TOC_CONTEXT_TOKENS", 2000))
+}
+
+# Nombre de jetons par mot en sortie (français) pour convertir les consignes de longueur
+TOKENS_PER_WORD = 1.6
+
+# Borne haute des mots demandés par type de chapitre dans les consignes des prompts
+CHAPTER_WORDS = {
+    "introduction": 1200,
+    "conclusion": 1200,
+    "chapter": 1800
+}
+
+# Le choix "Court / Moyen / Long / Très long" peut allonger les chapitres ; les
+# consignes des prompts ne changent pas avec la longueur du livre, le plafond ne
+# descend donc jamais sous leur borne haute (facteur minimal 1)
+LENGTH_FACTORS = {
+    "court": 1.0,
+    "moyen": 1.0,
+    "long": 1.25,
+    "très long": 1.5
+}
+
+# Réponses courtes ou structurées : plafond fixe par type d'appel
+OUTPUT_TOKEN_LIMITS = {
+    "toc_base": 400,
+    "toc_per_chapter": 150,
+    "cover": 1200,
+    "legal_pages": 2000,
+    "visual_theme": 1200,
+    "front_matter": 1500,
+    "illustration_plan": 700,
+    "illustration_plan_per_chapter": 450
+}
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    if _ENCODING:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def trim_to_tokens(text: Optional[str], max_tokens: int) -> Optional[str]:
+    """
+    Shorten a text to about max_tokens
+
+    Long prose is first reduced to its most representative sentences; whatever
+    still exceeds the budget is cut at a word boundary.
+    """
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    summary = summarize(text, max_sentences=max(1, max_tokens // 40), max_chars=max_chars)
+    if summary and estimate_tokens(summary) <= max_tokens:
+        return summary
+
+    cut = text[:max_chars].rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:") + "…"
+
+
+def trim_field(name: str, text: Optional[str]) -> Optional[str]:
+    """Apply the FIELD_TOKEN_LIMITS budget of a context field"""
+    limit = FIELD_TOKEN_LIMITS.get(name)
+    return trim_to_tokens(text, limit) if limit else text
+
+
+def context_share(kind: str, items: int) -> int:
+    """Tokens each of `items` context entries may use within the CONTEXT_TOKEN_LIMITS budget of a call type"""
+    return max(40, CONTEXT_TOKEN_LIMITS[kind] // max(1, items))
+
+
+def length_factor(length: Optional[str]) -> float:
+    """Map the book length choice ("Court: 5-10 pages", ...) to an output factor"""
+    label = (length or "").split(":", 1)[0].strip().lower()
+    return LENGTH_FACTORS.get(label, 1.0)
+
+
+def chapter_output_tokens(chapter_type: str = "chapter", length: Optional[str] = None) -> int:
+    """
+    Output limit of one chapter: upper bound of the words its prompt asks for,
+    scaled up by the book length, plus headroom
+
+    Never below the prompt's own target, which would truncate the chapter.
+    """
+    words = CHAPTER_WORDS.get(chapter_type, CHAPTER_WORDS["chapter"]) * max(1.0, length_factor(length))
+    return int(words * TOKENS_PER_WORD * 1.3)
+
+
+def section_output_tokens(section_text: str) -> int:
+    """Output limit of a rewritten section: "comparable length" with some slack"""
+    return max(300, int(estimate_tokens(section_text) * 1.5))
+
+
+def toc_output_tokens(chapters_count: int) -> int:
+    return OUTPUT_TOKEN_LIMITS["toc_base"] + OUTPUT_TOKEN_LIMITS["toc_per_chapter"] * (chapters_count + 2)
+
+
+def illustration_plan_output_tokens(chapters: int = 1) -> int:
+    if chapters <= 1:
+        return OUTPUT_TOKEN_LIMITS["illustration_plan"]
+    return OUTPUT_TOKEN_LIMITS["illustration_plan_per_chapter"] * chapters + 200
+
+
+def output_tokens(kind: str) -> int:
+    return OUTPUT_TOKEN_LIMITS[kind]
+
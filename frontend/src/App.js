@@ -26,9 +26,51 @@ const getAPIUrl = () => {
 
 const API_URL = getAPIUrl();
 
+// Les images sont servies par l'API via des URLs signées relatives
+const imageSrc = (url) => `${API_URL}${url}`;
+
 // Configure axios to send cookies with all requests
 axios.defaults.withCredentials = true;
 
+// Open a Server-Sent Events endpoint and call onEvent(name, data) for each event
+const readEventStream = async (path, options, onEvent) => {
+  const response = await fetch(`${API_URL}${path}`, {
+    ...options,
+    credentials: 'include',
+    headers: {
+      Authorization: axios.defaults.headers.common['Authorization'] || '',
+      ...(options.headers || {})
+    }
+  });
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({}));
+    throw { response: { data: body } };
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let separator;
+    while ((separator = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+
+      const eventName = (rawEvent.match(/^event: (.*)$/m) || [])[1];
+      const data = JSON.parse((rawEvent.match(/^data: (.*)$/m) || [])[1] || '{}');
+      if (eventName === 'error') {
+        throw { response: { data: data } };
+      }
+      onEvent(eventName, data);
+    }
+  }
+};
+
 // Auth Context
 const AuthContext = createContext();
 
@@ -300,7 +342,9 @@ const AuthPage = () => {
 // Dashboard Component
 const Dashboard = () => {
   const [ebooks, setEbooks] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const { user, logout } = useAuth();
   const navigate = useNavigate();
 
@@ -308,10 +352,13 @@ const Dashboard = () => {
     fetchEbooks();
   }, []);
 
-  const fetchEbooks = async () => {
+  const fetchEbooks = async (cursor = null) => {
     try {
-      const response = await axios.get(`${API_URL}/api/ebooks/list`);
-      setEbooks(response.data.ebooks);
+      const response = await axios.get(`${API_URL}/api/ebooks/list`, {
+        params: cursor ? { cursor } : {}
+      });
+      setEbooks((previous) => (cursor ? [...previous, ...response.data.ebooks] : response.data.ebooks));
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Error fetching ebooks:', error);
     } finally {
@@ -319,6 +366,12 @@ const Dashboard = () => {
     }
   };
 
+  const loadMoreEbooks = async () => {
+    setLoadingMore(true);
+    await fetchEbooks(nextCursor);
+    setLoadingMore(false);
+  };
+
   return (
     <div className="min-h-screen bg-gray-100">
       <nav className="gradient-bg text-white p-4 shadow-lg">
@@ -388,6 +441,14 @@ const Dashboard = () => {
                     {ebook.status === 'completed' ? 'Terminé' : 'Brouillon'}
                   </span>
                 </div>
+                {ebook.cover_url && (
+                  <img
+                    src={imageSrc(`${ebook.cover_url}&w=320`)}
+                    alt={`Couverture de ${ebook.title}`}
+                    loading="lazy"
+                    className="w-full h-48 object-cover rounded-lg mb-4"
+                  />
+                )}
                 <h3 className="text-xl font-bold text-gray-800 mb-2">{ebook.title}</h3>
                 <p className="text-sm text-gray-600 mb-2">Par {ebook.author}</p>
                 <p className="text-sm text-gray-500 mb-4 line-clamp-2">{ebook.description}</p>
@@ -399,6 +460,19 @@ const Dashboard = () => {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="flex justify-center mt-8">
+            <button
+              onClick={loadMoreEbooks}
+              disabled={loadingMore}
+              className="btn-primary"
+              data-testid="load-more-ebooks-button"
+            >
+              {loadingMore ? 'Chargement...' : 'Afficher plus d\'ebooks'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -511,22 +585,21 @@ const EbookCreator = () => {
       setContentProgress(20);
       setProgressDetails(`Génération du contenu (0/${totalChapters} chapitres)...`);
       
-      const response = await axios.post(`${API_URL}/api/ebooks/generate-content`, {
-        ebook_id: ebookId,
-        toc: toc
+      // Stream chapters (Server-Sent Events) as soon as each one is written
+      const chapters = new Array(totalChapters);
+      let received = 0;
+      await readEventStream(`/api/ebooks/${ebookId}/generate-content/stream`, {}, (eventName, data) => {
+        if (eventName === 'chapter') {
+          chapters[data.index] = data.chapter;
+          received += 1;
+          setContentProgress(Math.min(90, 20 + (received * progressPerChapter)));
+          setProgressDetails(`Génération du contenu (${received}/${totalChapters} chapitres)...`);
+        }
       });
 
-      // Simulate progress updates (since backend doesn't send progress)
-      for (let i = 1; i <= totalChapters; i++) {
-        await new Promise(resolve => setTimeout(resolve, 200));
-        const currentProgress = 20 + (i * progressPerChapter);
-        setContentProgress(Math.min(90, currentProgress));
-        setProgressDetails(`Génération du contenu (${i}/${totalChapters} chapitres)...`);
-      }
-
       setContentProgress(100);
       setProgressDetails('Contenu généré avec succès !');
-      setGeneratedChapters(response.data.chapters);
+      setGeneratedChapters(chapters.filter(Boolean));
       
       // Small delay to show 100%
       await new Promise(resolve => setTimeout(resolve, 500));
@@ -1250,27 +1323,35 @@ const EbookViewer = () => {
   // Regenerate chapter
   const handleRegenerateChapter = async (chapterNumber) => {
     setRegeneratingChapter(chapterNumber);
+    const setChapterContent = (content) => {
+      setEbook(current => ({
+        ...current,
+        chapters: current.chapters.map(ch =>
+          ch.number === chapterNumber ? { ...ch, content } : ch
+        )
+      }));
+    };
+
     try {
-      const response = await axios.post(
-        `${API_URL}/api/ebooks/regenerate-chapter`,
-        {
-          ebook_id: id,
-          chapter_number: chapterNumber
-        },
+      // Tokens are displayed as they arrive, the backend saves the chapter at the end
+      let streamedContent = '';
+      await readEventStream(
+        '/api/ebooks/regenerate-chapter/stream',
         {
+          method: 'POST',
           headers: { 'Content-Type': 'application/json' },
-          withCredentials: true
+          body: JSON.stringify({ ebook_id: id, chapter_number: chapterNumber })
+        },
+        (eventName, data) => {
+          if (eventName === 'token') {
+            streamedContent += data.text;
+            setChapterContent(streamedContent);
+          } else if (eventName === 'done') {
+            setChapterContent(data.new_content);
+            showToast('Chapitre régénéré avec succès !', 'success');
+          }
         }
       );
-
-      if (response.data.success) {
-        // Update local state
-        const updatedChapters = ebook.chapters.map(ch =>
-          ch.number === chapterNumber ? { ...ch, content: response.data.new_content } : ch
-        );
-        setEbook({ ...ebook, chapters: updatedChapters });
-        showToast('Chapitre régénéré avec succès !', 'success');
-      }
     } catch (error) {
       console.error('Error regenerating chapter:', error);
       showToast(`Erreur: ${error.response?.data?.detail || error.message}`, 'error');
@@ -1303,7 +1384,8 @@ const EbookViewer = () => {
             const updatedImages = [...ill.images];
             updatedImages[imageIndex] = {
               ...updatedImages[imageIndex],
-              image_base64: response.data.image_base64
+              image_id: response.data.image_id,
+              image_url: response.data.image_url
             };
             return { ...ill, images: updatedImages };
           }
@@ -1377,7 +1459,8 @@ const EbookViewer = () => {
           ...ebook, 
           cover: { 
             ...ebook.cover, 
-            cover_image_base64: response.data.cover_image_base64 
+            cover_image_id: response.data.cover_image_id,
+            cover_image_url: response.data.cover_image_url
           } 
         });
         setCoverImageGenerated(true);
@@ -1803,12 +1886,12 @@ const EbookViewer = () => {
             <h2 className="text-2xl font-bold text-gray-800 mb-4">📐 Design de Couverture</h2>
             
             {/* Display generated cover image if available */}
-            {ebook.cover.cover_image_base64 && (
+            {ebook.cover.cover_image_url && (
               <div className="mb-6">
                 <h3 className="font-bold text-gray-700 mb-3">🖼️ Image de Couverture</h3>
                 <div className="flex justify-center">
                   <img 
-                    src={`data:image/png;base64,${ebook.cover.cover_image_base64}`}
+                    src={imageSrc(ebook.cover.cover_image_url)}
                     alt="Couverture du livre"
                     className="max-w-md rounded-lg shadow-2xl"
                   />
@@ -2065,10 +2148,10 @@ const EbookViewer = () => {
                       <div key={imgIdx} className="bg-gray-50 rounded-lg p-4">
                         <div className="flex flex-col gap-4">
                           {/* Image Preview */}
-                          {img.image_base64 ? (
+                          {img.image_url ? (
                             <div className="w-full">
                               <img 
-                                src={`data:image/png;base64,${img.image_base64}`}
+                                src={imageSrc(img.image_url)}
                                 alt={img.alt_text}
                                 className="w-full max-w-2xl mx-auto rounded-lg shadow-md"
                               />
@@ -2251,9 +2334,9 @@ const EbookViewer = () => {
                         ?.images?.map((img, imgIdx) => (
                           <div key={imgIdx} className="bg-gray-50 p-4 rounded-lg">
                             {/* Image Display */}
-                            {img.image_base64 && (
+                            {img.image_url && (
                               <img
-                                src={`data:image/png;base64,${img.image_base64}`}
+                                src={imageSrc(img.image_url)}
                                 alt={img.alt_text || 'Illustration'}
                                 className="w-full max-w-2xl mx-auto rounded-lg shadow-md mb-3"
                               />